@@ -10,6 +10,10 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DjangoProject.settings')
 
 django_application = get_asgi_application()
 
+from dashboard import profiling  # noqa: E402 - needs the apps loaded above
+
+profiling.start_refresher()
+
 try:
 	from DjangoProject import routing as project_routing
 except ImportError as exc:  # pragma: no cover
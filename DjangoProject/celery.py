@@ -14,20 +14,26 @@ app.autodiscover_tasks()
 
 @app.on_after_configure.connect  # pragma: no cover - runtime hook
 def setup_periodic_tasks(sender, **kwargs):
+    from django.conf import settings
+
     from dashboard import tasks
 
+    # The fetch intervals adapt per source (see dashboard.polling); beat only
+    # ticks the scheduler, which enqueues whatever is due.
     sender.add_periodic_task(
-        timedelta(seconds=30),
-        tasks.fetch_weather.s(),
-        name='fetch weather',
+        timedelta(seconds=settings.DASHBOARD_POLL_TICK),
+        tasks.schedule_polls.s(),
+        name='schedule polls',
+        expires=settings.DASHBOARD_POLL_TICK,
     )
     sender.add_periodic_task(
-        timedelta(seconds=20),
-        tasks.fetch_finance_quotes.s(),
-        name='fetch finance',
+        timedelta(seconds=settings.DASHBOARD_ALERT_INTERVAL),
+        tasks.evaluate_alerts.s(),
+        name='evaluate alerts',
+        expires=settings.DASHBOARD_ALERT_INTERVAL,
     )
     sender.add_periodic_task(
-        timedelta(seconds=15),
-        tasks.fetch_public_transport_data.s(),
-        name='fetch traffic',
+        timedelta(hours=1),
+        tasks.archive_old_readings.s(),
+        name='archive old readings',
     )
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import json
 import os
 from pathlib import Path
 
@@ -51,6 +52,12 @@ INSTALLED_APPS = [
     'dashboard.apps.DashboardConfig',
 ]
 
+# Celery workers, beat and the stream bridges never serve Dash pages; setting
+# DASHBOARD_HEADLESS=1 skips django-plotly-dash so they do not import dash.
+DASHBOARD_HEADLESS = os.environ.get('DASHBOARD_HEADLESS', '0') == '1'
+if DASHBOARD_HEADLESS:
+    INSTALLED_APPS.remove('django_plotly_dash.apps.DjangoPlotlyDashConfig')
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -83,24 +90,62 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'DjangoProject.wsgi.application'
 ASGI_APPLICATION = 'DjangoProject.asgi.application'
+# Let Daphne take the client address from X-Forwarded-For (serve_asgi). Only
+# enable it when every connection comes through a trusted reverse proxy: on a
+# directly exposed port any client could claim any address.
+ASGI_PROXY_HEADERS = os.environ.get('ASGI_PROXY_HEADERS', '0') == '1'
+
+# Redis instances used by the channel layer. Several comma separated hosts
+# (host:port or redis:// URLs) shard channels and groups across them.
+CHANNEL_REDIS_HOSTS = [
+    host.strip()
+    for host in os.environ.get(
+        'CHANNEL_REDIS_HOSTS',
+        f"{os.environ.get('REDIS_HOST', '127.0.0.1')}:{os.environ.get('REDIS_PORT', 6379)}",
+    ).split(',')
+    if host.strip()
+]
+
+# The replay log (dashboard.replay) needs one sequence counter for every event,
+# so it is not sharded: it lives on this Redis, by default the first channel
+# layer host.
+DASHBOARD_REPLAY_REDIS_URL = os.environ.get('DASHBOARD_REPLAY_REDIS_URL') or (
+    CHANNEL_REDIS_HOSTS[0] if '://' in CHANNEL_REDIS_HOSTS[0] else f'redis://{CHANNEL_REDIS_HOSTS[0]}'
+)
+
+
+def _channel_redis_host(host):
+    if '://' in host:
+        return {'address': host}
+    name, _, port = host.rpartition(':')
+    return (name, int(port)) if name else (host, 6379)
+
 
-if os.environ.get('CHANNEL_LAYER_BACKEND', '').lower() == 'memory':
+CHANNEL_LAYER_BACKEND = os.environ.get('CHANNEL_LAYER_BACKEND', 'redis').lower()
+if CHANNEL_LAYER_BACKEND == 'memory':
     CHANNEL_LAYERS = {
         'default': {
             'BACKEND': 'channels.layers.InMemoryChannelLayer',
         },
     }
+elif CHANNEL_LAYER_BACKEND == 'redis-pubsub':
+    # Group sends become one PUBLISH per shard instead of one message per
+    # member channel, which is what matters with many WebSocket clients.
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+            'CONFIG': {
+                'hosts': [_channel_redis_host(host) for host in CHANNEL_REDIS_HOSTS],
+            },
+        },
+    }
 else:
     CHANNEL_LAYERS = {
         'default': {
             'BACKEND': 'channels_redis.core.RedisChannelLayer',
             'CONFIG': {
-                'hosts': [
-                    (
-                        os.environ.get('REDIS_HOST', '127.0.0.1'),
-                        int(os.environ.get('REDIS_PORT', 6379)),
-                    )
-                ],
+                'hosts': [_channel_redis_host(host) for host in CHANNEL_REDIS_HOSTS],
+                'capacity': int(os.environ.get('CHANNEL_LAYER_CAPACITY', '1000')),
             },
         },
     }
@@ -155,6 +200,23 @@ STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
+# /metrics answers only these addresses or networks, logged-in staff users and
+# requests sending "Authorization: Bearer <DASHBOARD_METRICS_TOKEN>".
+DASHBOARD_METRICS_ALLOWED_IPS = [
+    value.strip()
+    for value in os.environ.get('DASHBOARD_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+    if value.strip()
+]
+DASHBOARD_METRICS_TOKEN = os.environ.get('DASHBOARD_METRICS_TOKEN', '')
+# Reverse proxies whose X-Forwarded-For is believed when the connection comes
+# from them. Leave ASGI_PROXY_HEADERS off and list the proxy here instead:
+# with proxy headers the allowlist above is ignored.
+DASHBOARD_TRUSTED_PROXIES = [
+    value.strip()
+    for value in os.environ.get('DASHBOARD_TRUSTED_PROXIES', '').split(',')
+    if value.strip()
+]
+
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://127.0.0.1:6379/0')
 CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://127.0.0.1:6379/1')
 CELERY_ACCEPT_CONTENT = ['json']
@@ -164,6 +226,89 @@ CELERY_TIMEZONE = TIME_ZONE
 CELERY_ENABLE_UTC = True
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 
+# Latency-critical ingestion and slow external-API polling run in separate
+# lanes so a retrying fetch never delays MQTT/Kafka messages. Start one worker
+# per queue (see run_dashboard.sh / supervisord.conf).
+CELERY_INGEST_QUEUE = 'ingest'
+CELERY_FETCH_QUEUE = 'fetch'
+CELERY_TASK_DEFAULT_QUEUE = 'celery'
+CELERY_TASK_ROUTES = {
+    'dashboard.tasks.ingest_*': {'queue': CELERY_INGEST_QUEUE},
+    'dashboard.tasks.fetch_*': {'queue': CELERY_FETCH_QUEUE},
+    'dashboard.tasks.archive_*': {'queue': CELERY_FETCH_QUEUE},
+    'dashboard.tasks.schedule_*': {'queue': CELERY_FETCH_QUEUE},
+    'dashboard.tasks.evaluate_*': {'queue': CELERY_FETCH_QUEUE},
+}
+# Redis emulates priorities with one list per step; 0 is the highest priority.
+CELERY_TASK_DEFAULT_PRIORITY = 5
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'queue_order_strategy': 'priority',
+    'priority_steps': list(range(10)),
+    'sep': ':',
+}
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.environ.get('CELERY_WORKER_PREFETCH_MULTIPLIER', 1))
+
+# Admission control at the MQTT/Kafka bridges (see dashboard.admission).
+# Priority 0 is the most important and is never shed on queue depth; it is
+# also the Celery message priority. ``rate``/``burst`` are per bridge process.
+DASHBOARD_INGEST_ADMISSION = json.loads(os.environ.get('DASHBOARD_INGEST_ADMISSION', 'null')) or {
+    'sensor': {'priority': 0, 'rate': 2000, 'burst': 4000},
+    'finance': {'priority': 2, 'rate': 1000, 'burst': 2000},
+    'traffic': {'priority': 5, 'rate': 500, 'burst': 1000},
+    'weather': {'priority': 7, 'rate': 200, 'burst': 400},
+}
+# fnmatch patterns that override the source priority; the first match wins.
+DASHBOARD_INGEST_TOPIC_PRIORITIES = json.loads(os.environ.get('DASHBOARD_INGEST_TOPIC_PRIORITIES', 'null')) or []
+DASHBOARD_INGEST_SHED_DEPTH = int(os.environ.get('DASHBOARD_INGEST_SHED_DEPTH', 5000))
+DASHBOARD_INGEST_MAX_DEPTH = int(os.environ.get('DASHBOARD_INGEST_MAX_DEPTH', 50000))
+
+# Sensor alert rules evaluated by dashboard.alerts (JSON list in the env var
+# replaces the defaults). Patterns are fnmatch-style MQTT/Kafka topics.
+DASHBOARD_ALERT_RULES = json.loads(os.environ.get('DASHBOARD_ALERT_RULES', 'null')) or [
+    {'name': 'temperature-high', 'kind': 'threshold', 'pattern': 'sensors/temperature*', 'above': 40, 'severity': 'critical'},
+    {'name': 'sensor-zscore', 'kind': 'zscore', 'pattern': 'sensors/*', 'threshold': 4.0, 'alpha': 0.05, 'min_samples': 30},
+]
+DASHBOARD_ALERTS_PER_MINUTE = int(os.environ.get('DASHBOARD_ALERTS_PER_MINUTE', 60))
+# With a Redis channel layer, beat drains the queued readings this often.
+DASHBOARD_ALERT_INTERVAL = float(os.environ.get('DASHBOARD_ALERT_INTERVAL', 1.0))
+
+# Readings older than this are moved to Parquet files under
+# DASHBOARD_ARCHIVE_DIR by dashboard.tasks.archive_old_readings.
+DASHBOARD_ARCHIVE_DIR = Path(os.environ.get('DASHBOARD_ARCHIVE_DIR', BASE_DIR / 'archive'))
+DASHBOARD_ARCHIVE_AFTER_DAYS = int(os.environ.get('DASHBOARD_ARCHIVE_AFTER_DAYS', 30))
+
+# Profiles requested at runtime (manage.py profile, the admin or SIGUSR2) are
+# written here; see dashboard.profiling.
+DASHBOARD_PROFILE_DIR = Path(os.environ.get('DASHBOARD_PROFILE_DIR', BASE_DIR / 'profiles'))
+
+# Shared state (poll scheduler, viewer counts) kept outside the broker DB.
+DASHBOARD_STATE_REDIS_URL = os.environ.get(
+    'DASHBOARD_STATE_REDIS_URL',
+    f"redis://{os.environ.get('REDIS_HOST', '127.0.0.1')}:{os.environ.get('REDIS_PORT', 6379)}/2",
+)
+
+# Rendered Dash figures are shared by every session of a process (see
+# dashboard.figures). Set DASHBOARD_FIGURE_CACHE_URL (e.g.
+# redis://127.0.0.1:6379/3) to also share them between Daphne processes.
+_figure_cache_url = os.environ.get('DASHBOARD_FIGURE_CACHE_URL')
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'figures': (
+        {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': _figure_cache_url}
+        if _figure_cache_url
+        else {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+    ),
+}
+
+# Polled sources declare their intervals where they are registered (``Source.poll``
+# in dashboard.sources). ``interval`` is the starting point; it moves between
+# ``min`` and ``max`` with how often the data changes, grows on errors and while
+# nobody is watching, and respects rate-limit headers. Entries here override
+# the registered values per source, e.g. {'finance': {'max': 300}}.
+DASHBOARD_POLL_SOURCES = {}
+DASHBOARD_POLL_TICK = float(os.environ.get('DASHBOARD_POLL_TICK', 5))
+DASHBOARD_POLL_IDLE_FACTOR = float(os.environ.get('DASHBOARD_POLL_IDLE_FACTOR', 8))
+
 PLOTLY_COMPONENTS = [
     'dash_core_components',
     'dash_html_components',
@@ -174,6 +319,7 @@ PLOTLY_COMPONENTS = [
 
 PLOTLY_DASH = {
     'serve_locally': True,
+    'stateless_loader': 'dashboard.dash_apps.load_stateless_app',
 }
 
 # Default primary key field type
@@ -14,11 +14,16 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('dashboard.urls')),
-    path('django_plotly_dash/', include('django_plotly_dash.urls')),
 ]
+
+# Headless processes (Celery, bridges) drop django-plotly-dash from
+# INSTALLED_APPS, and its URLconf imports its models.
+if not settings.DASHBOARD_HEADLESS:
+    urlpatterns.append(path('django_plotly_dash/', include('django_plotly_dash.urls')))
@@ -1,31 +1,178 @@
+"""Admin for the reading tables, built to stay fast with tens of millions of rows.
+
+The reading changelists never run an exact ``COUNT(*)`` over the table:
+unfiltered pages show an estimate from the planner statistics (PostgreSQL) or
+the primary key span, and filtered pages count at most ``COUNT_LIMIT`` rows.
+Pages are walked with a ``(created_at, id)`` cursor instead of ``OFFSET``, the
+key search is a range scan on the ``(key, created_at)`` index (exact match or
+prefix, case-sensitive), the date filter is a range on ``created_at`` and the
+``payload`` column is only loaded on the change form, which also shows the
+full raw document when ``rawdocs`` kept one.
+"""
+
+import json
+import os
+from datetime import datetime
+
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Min, Q
+from django.utils.functional import cached_property
+from django.utils import timezone
+from django.utils.html import format_html
 
-from . import models
+from . import models, profiling, rawdocs, sources
 
+COUNT_LIMIT = int(os.environ.get('DASHBOARD_ADMIN_COUNT_LIMIT', '10000'))
+CURSOR_VAR = 'cursor'
 
-@admin.register(models.SensorReading)
-class SensorReadingAdmin(admin.ModelAdmin):
-    list_display = ('source', 'created_at')
-    search_fields = ('source',)
-    ordering = ('-created_at',)
 
+def estimated_count(queryset) -> int:
+    """Row count of ``queryset`` without scanning the whole table."""
+
+    if queryset.query.where:
+        return queryset.order_by()[:COUNT_LIMIT].count()
+    model = queryset.model
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] >= 0:  # -1 until the table has been analyzed
+            return row[0]
+    span = model._default_manager.using(queryset.db).aggregate(first=Min('pk'), last=Max('pk'))
+    if span['first'] is None:
+        return 0
+    return span['last'] - span['first'] + 1
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
+
+
+def encode_cursor(obj) -> str:
+    return f'{obj.created_at.isoformat()}|{obj.pk}'
+
+
+def decode_cursor(value: str):
+    created_at, _, pk = value.rpartition('|')
+    try:
+        return datetime.fromisoformat(created_at), int(pk)
+    except ValueError as exc:
+        raise IncorrectLookupParameters(f'Invalid cursor {value!r}') from exc
+
+
+class KeysetChangeList(ChangeList):
+    """Changelist that pages with ``?cursor=<created_at>|<id>`` instead of offsets."""
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
 
-@admin.register(models.FinancialMetric)
-class FinancialMetricAdmin(admin.ModelAdmin):
-    list_display = ('symbol', 'created_at')
-    search_fields = ('symbol',)
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request).defer('payload')
+        cursor = request.GET.get(CURSOR_VAR)
+        if cursor:
+            created_at, pk = decode_cursor(cursor)
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+        return queryset
+
+    def get_results(self, request):
+        super().get_results(request)
+        rows = list(self.result_list[: self.list_per_page])
+        self.result_list = rows
+        self.next_url = None
+        if len(rows) == self.list_per_page:
+            self.next_url = self.get_query_string({CURSOR_VAR: encode_cursor(rows[-1])}, [PAGE_VAR])
+        self.first_url = self.get_query_string(remove=[CURSOR_VAR, PAGE_VAR]) if CURSOR_VAR in self.params else None
+        self.count_estimated = not self.queryset.query.where
+        self.count_capped = not self.count_estimated and self.result_count >= COUNT_LIMIT
+        # The page links of the default template would page by offset.
+        self.multi_page = False
+
+
+class ReadingAdmin(admin.ModelAdmin):
+    change_list_template = 'admin/dashboard/reading_change_list.html'
+    list_filter = (('created_at', admin.DateFieldListFilter),)
     ordering = ('-created_at',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # Other orderings could not be paged with the (created_at, id) cursor.
+    sortable_by = ()
+    key_field = ''
+    readonly_fields = ('raw_document',)
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    @admin.display(description='Raw document')
+    def raw_document(self, obj):
+        document = rawdocs.load(obj.raw_digest)
+        if document is None:
+            return '-'
+        return format_html('<pre>{}</pre>', json.dumps(document, indent=2, default=str))
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.endswith('*'):
+            prefix = term[:-1]
+            # A range instead of LIKE so the (key, created_at) index is used.
+            lookup = {f'{self.key_field}__gte': prefix, f'{self.key_field}__lt': prefix + '\U0010ffff'}
+        else:
+            lookup = {self.key_field: term}
+        return queryset.filter(**lookup), False
+
 
+def register_source(source: sources.Source) -> None:
+    """Register an admin for a source model that does not have one yet."""
 
-@admin.register(models.TrafficUpdate)
-class TrafficUpdateAdmin(admin.ModelAdmin):
-    list_display = ('region', 'created_at')
-    search_fields = ('region',)
+    if admin.site.is_registered(source.model):
+        return
+    options = {
+        'key_field': source.key_field,
+        'list_display': (source.key_field, 'created_at'),
+        'search_fields': (source.key_field,),
+        'search_help_text': f'Exact {source.key_field}, or a prefix followed by *',
+    }
+    admin_cls = type(f'{source.model.__name__}Admin', (ReadingAdmin,), options)
+    admin.site.register(source.model, admin_cls)
+
+
+for _source in sources.all_sources():
+    register_source(_source)
+
+
+@admin.register(models.AlertEvent)
+class AlertEventAdmin(admin.ModelAdmin):
+    list_display = ('rule', 'severity', 'source', 'value', 'created_at')
+    list_filter = ('severity', 'kind')
+    search_fields = ('rule', 'source')
     ordering = ('-created_at',)
 
 
-@admin.register(models.WeatherSnapshot)
-class WeatherSnapshotAdmin(admin.ModelAdmin):
-    list_display = ('location', 'created_at')
-    search_fields = ('location',)
+@admin.register(models.ProfilingSession)
+class ProfilingSessionAdmin(admin.ModelAdmin):
+    list_display = ('target', 'mode', 'hostname', 'pid', 'created_at', 'until', 'active')
+    list_filter = ('mode',)
     ordering = ('-created_at',)
+    actions = ('stop_sessions',)
+
+    @admin.display(boolean=True)
+    def active(self, obj):
+        return obj.until > timezone.now()
+
+    @admin.action(description='Stop selected sessions and write their profiles')
+    def stop_sessions(self, request, queryset):
+        stopped = queryset.filter(until__gt=timezone.now()).update(until=timezone.now())
+        if stopped:
+            profiling.bump()
+        self.message_user(request, f'Stopped {stopped} session(s); profiles are written to {settings.DASHBOARD_PROFILE_DIR}')
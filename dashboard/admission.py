@@ -0,0 +1,196 @@
+"""Admission control for the MQTT and Kafka bridges.
+
+The bridges ask ``admit`` before enqueueing an ingest task, so an overload
+is absorbed at the edge instead of growing the Celery backlog (and Redis
+memory) without bound. Every message gets a priority from its source in
+``settings.DASHBOARD_INGEST_ADMISSION``, or from the first matching pattern
+in ``DASHBOARD_INGEST_TOPIC_PRIORITIES``. Priority 0 is the most important.
+The priority is also the Celery message priority, so critical streams are
+consumed first.
+
+A message is shed (dropped and counted in ``dashboard_ingest_shed_total``):
+
+* with ``reason="load"`` when the ingest queue is deeper than
+  ``DASHBOARD_INGEST_SHED_DEPTH``. The probability grows linearly with the
+  depth and the priority number. At ``DASHBOARD_INGEST_MAX_DEPTH`` priority 9
+  is always shed, priority 5 about half the time, and priority 0 never.
+* with ``reason="rate"`` when its source's token bucket (``rate`` per
+  second, up to ``burst``) is empty.
+
+The buckets are per bridge process. The queue depth is read from the Redis
+broker at most every ``DEPTH_REFRESH`` seconds. The queue holds batches of
+messages (see ``integrations.batching``), so its length is multiplied by
+the average batch size before it is compared with the thresholds.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import functools
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from . import metrics, sources
+
+logger = logging.getLogger(__name__)
+
+LOWEST_PRIORITY = 9
+DEFAULT_PRIORITY = 5
+DEPTH_REFRESH = 0.5
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, now: float) -> bool:
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class QueueDepth:
+    """Length of the Celery ingest queue (all priority lists) in the Redis broker."""
+
+    def __init__(self, broker_url: str, queue: str, steps: List[int], sep: str):
+        self.enabled = broker_url.startswith(('redis://', 'rediss://'))
+        self.broker_url = broker_url
+        # kombu keeps priority 0 in the queue itself and the others in "<queue><sep><step>".
+        self.keys = [queue if step == 0 else f'{queue}{sep}{step}' for step in steps]
+        self.value = 0
+        self._expires = 0.0
+        self._failing = False
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self, now: float) -> int:
+        if not self.enabled or now < self._expires:
+            return self.value
+        with self._lock:
+            if now >= self._expires:
+                self._expires = now + DEPTH_REFRESH
+                self._refresh()
+        return self.value
+
+    def _refresh(self) -> None:
+        try:
+            if self._client is None:
+                import redis
+
+                self._client = redis.Redis.from_url(self.broker_url, socket_timeout=0.5)
+            pipeline = self._client.pipeline(transaction=False)
+            for key in self.keys:
+                pipeline.llen(key)
+            self.value = sum(pipeline.execute())
+            self._failing = False
+        except Exception:  # noqa: BLE001 - keep the last depth; admission must not stop ingestion
+            if not self._failing:
+                logger.warning('Could not read the ingest queue depth', exc_info=True)
+            self._failing = True
+            return
+        metrics.INGEST_QUEUE_DEPTH.set(self.value)
+
+
+class Admission:
+    def __init__(
+        self,
+        limits: Dict[str, Dict[str, Any]],
+        topic_priorities: List[Dict[str, Any]],
+        depth: QueueDepth,
+        shed_depth: int,
+        max_depth: int,
+        rng: Optional[random.Random] = None,
+        messages_per_task: Callable[[], float] = lambda: 1.0,
+    ):
+        self.limits = limits
+        self.topic_priorities = [(rule['pattern'], int(rule['priority'])) for rule in topic_priorities]
+        self.depth = depth
+        self.shed_depth = shed_depth
+        self.max_depth = max(max_depth, shed_depth + 1)
+        self.rng = rng or random.Random()
+        self.messages_per_task = messages_per_task
+        self.buckets = {
+            name: TokenBucket(float(limit['rate']), float(limit.get('burst', limit['rate'])))
+            for name, limit in limits.items()
+            if limit.get('rate')
+        }
+        self.classify = functools.lru_cache(maxsize=4096)(self._classify)
+
+    def _classify(self, topic: str, stream: Optional[str]) -> Tuple[str, int]:
+        source = sources.get(stream) if stream else None
+        if source is None:
+            source = sources.for_topic(topic)
+        name = source.event_type if source is not None else 'unknown'
+        priority = int(self.limits.get(name, {}).get('priority', DEFAULT_PRIORITY))
+        for pattern, topic_priority in self.topic_priorities:
+            if fnmatch.fnmatchcase(topic, pattern):
+                priority = topic_priority
+                break
+        return name, min(max(priority, 0), LOWEST_PRIORITY)
+
+    def shed_probability(self, priority: int, depth: int) -> float:
+        if depth <= self.shed_depth:
+            return 0.0
+        load = min(1.0, (depth - self.shed_depth) / (self.max_depth - self.shed_depth))
+        return load * priority / LOWEST_PRIORITY
+
+    def admit(self, topic: str, stream: Optional[str] = None) -> Optional[int]:
+        """Celery priority for the message, or None when it is shed."""
+
+        name, priority = self.classify(topic, stream)
+        now = time.monotonic()
+        depth = int(self.depth.get(now) * self.messages_per_task()) if priority else 0
+        if priority and self.rng.random() < self.shed_probability(priority, depth):
+            metrics.INGEST_SHED.labels(source=name, reason='load').inc()
+            return None
+        bucket = self.buckets.get(name)
+        if bucket is not None and not bucket.take(now):
+            metrics.INGEST_SHED.labels(source=name, reason='rate').inc()
+            return None
+        return priority
+
+
+_controller: Optional[Admission] = None
+_controller_lock = threading.Lock()
+
+
+def get_controller() -> Admission:
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                transport = settings.CELERY_BROKER_TRANSPORT_OPTIONS
+                depth = QueueDepth(
+                    settings.CELERY_BROKER_URL,
+                    settings.CELERY_INGEST_QUEUE,
+                    transport.get('priority_steps', [0]),
+                    transport.get('sep', ':'),
+                )
+                from .integrations import batching
+
+                _controller = Admission(
+                    settings.DASHBOARD_INGEST_ADMISSION,
+                    settings.DASHBOARD_INGEST_TOPIC_PRIORITIES,
+                    depth,
+                    settings.DASHBOARD_INGEST_SHED_DEPTH,
+                    settings.DASHBOARD_INGEST_MAX_DEPTH,
+                    messages_per_task=batching.messages_per_task,
+                )
+    return _controller
+
+
+def admit(topic: str, stream: Optional[str] = None) -> Optional[int]:
+    return get_controller().admit(topic, stream)
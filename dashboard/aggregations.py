@@ -0,0 +1,499 @@
+"""Window aggregations that derive metrics from the live streams.
+
+``process`` is called by ``tasks.persist_events`` (and ``persist_event``)
+with the readings one batch stored, after their own broadcasts, and returns
+extra ``DashboardEvent`` objects (``sensor_stats``, ``sensor_minute`` and
+``finance_vwap``) that are broadcast like any other event, so the Dash
+callbacks only have to plot precomputed numbers.
+
+The ingest workers each store a share of the events, so the windows are kept
+in one place instead of per process. The samples of a batch are first
+reduced per key and bucket with NumPy (``partials``: count, sum, weighted
+sum, weight, first and last sample, minimum and maximum), so a batch costs
+one Redis round trip per window kind whatever its size:
+
+* Sliding windows of ``DASHBOARD_AGG_WINDOW_SECONDS`` are split into
+  ``DASHBOARD_AGG_BUCKETS`` buckets. A script adds each partial to its
+  bucket in ``DASHBOARD_STATE_REDIS_URL`` and merges the buckets covering the
+  window of the newest one. Buckets expire shortly after they leave the
+  window; the oldest bucket is counted whole, so the window is exact to one
+  bucket. One event per key and batch reports the window as of its newest
+  reading.
+* Tumbling windows of ``DASHBOARD_AGG_TUMBLING_SECONDS`` keep one running
+  aggregate per key. The first reading of a later window closes the current
+  one, which is reported once (``sensor_minute``); readings for a window that
+  is already closed are dropped.
+
+Memory is bounded per key either way. With the in-memory channel layer (a
+single process) the same aggregates live in this process instead.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .realtime import DashboardEvent
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('DASHBOARD_AGGREGATIONS', '1') == '1'
+SLIDING_SECONDS = float(os.environ.get('DASHBOARD_AGG_WINDOW_SECONDS', '60'))
+BUCKETS = max(int(os.environ.get('DASHBOARD_AGG_BUCKETS', '12')), 1)
+TUMBLING_SECONDS = float(os.environ.get('DASHBOARD_AGG_TUMBLING_SECONDS', '60'))
+MAX_KEYS = int(os.environ.get('DASHBOARD_AGG_MAX_KEYS', '10000'))
+
+BUCKET_SECONDS = SLIDING_SECONDS / BUCKETS
+KEY_PREFIX = 'dashboard:agg'
+
+# KEYS[1] is the bucket of the partial, KEYS[2..] the buckets of its window
+# (KEYS[1] included) or nothing when the window is not needed. Floats go
+# through strings: Lua numbers returned to Redis are truncated to integers
+# and tostring() keeps only 14 digits.
+_SLIDE_SCRIPT = """
+local function str(x) return string.format('%.17g', x) end
+local bucket = KEYS[1]
+redis.call('HINCRBY', bucket, 'n', ARGV[1])
+redis.call('HINCRBYFLOAT', bucket, 's', ARGV[2])
+redis.call('HINCRBYFLOAT', bucket, 'ws', ARGV[3])
+redis.call('HINCRBYFLOAT', bucket, 'w', ARGV[4])
+local first = tonumber(redis.call('HGET', bucket, 't0'))
+if not first or tonumber(ARGV[5]) < first then redis.call('HSET', bucket, 't0', ARGV[5], 'v0', ARGV[6]) end
+local last = tonumber(redis.call('HGET', bucket, 't1'))
+if not last or tonumber(ARGV[7]) >= last then redis.call('HSET', bucket, 't1', ARGV[7], 'v1', ARGV[8]) end
+redis.call('EXPIRE', bucket, ARGV[9])
+if #KEYS == 1 then return {} end
+local n, s, ws, wt = 0, 0, 0, 0
+local ft, fts, fv, lt, lts, lv
+for i = 2, #KEYS do
+  local p = redis.call('HMGET', KEYS[i], 'n', 's', 'ws', 'w', 't0', 'v0', 't1', 'v1')
+  if p[1] then
+    n = n + tonumber(p[1])
+    s = s + tonumber(p[2])
+    ws = ws + tonumber(p[3])
+    wt = wt + tonumber(p[4])
+    local t0, t1 = tonumber(p[5]), tonumber(p[7])
+    if not ft or t0 < ft then ft, fts, fv = t0, p[5], p[6] end
+    if not lt or t1 > lt then lt, lts, lv = t1, p[7], p[8] end
+  end
+end
+return {tostring(n), str(s), str(ws), str(wt), fts, fv, lts, lv}
+"""
+
+# KEYS[1] holds the open tumbling window of one key. Returns the window the
+# partial closes, if any, as {bucket, n, s, lo, hi}.
+_TUMBLE_SCRIPT = """
+local open = redis.call('HMGET', KEYS[1], 'b', 'n', 's', 'lo', 'hi')
+local b = tonumber(ARGV[1])
+local closed = {}
+if open[1] then
+  local current = tonumber(open[1])
+  if b < current then return closed end
+  if b > current then
+    closed = open
+    redis.call('DEL', KEYS[1])
+  end
+end
+redis.call('HSET', KEYS[1], 'b', ARGV[1])
+redis.call('HINCRBY', KEYS[1], 'n', ARGV[2])
+redis.call('HINCRBYFLOAT', KEYS[1], 's', ARGV[3])
+local lo = tonumber(redis.call('HGET', KEYS[1], 'lo'))
+if not lo or tonumber(ARGV[4]) < lo then redis.call('HSET', KEYS[1], 'lo', ARGV[4]) end
+local hi = tonumber(redis.call('HGET', KEYS[1], 'hi'))
+if not hi or tonumber(ARGV[5]) > hi then redis.call('HSET', KEYS[1], 'hi', ARGV[5]) end
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+return closed
+"""
+
+
+class Partial(NamedTuple):
+    """Aggregate of the samples of one key that fall in one bucket."""
+
+    bucket: int
+    count: int
+    sum: float
+    weighted_sum: float
+    weight_sum: float
+    first_time: float
+    first_value: float
+    last_time: float
+    last_value: float
+    min: float
+    max: float
+
+    def merge(self, other: 'Partial') -> 'Partial':
+        first = self if self.first_time <= other.first_time else other
+        last = other if other.last_time >= self.last_time else self
+        return Partial(
+            self.bucket,
+            self.count + other.count,
+            self.sum + other.sum,
+            self.weighted_sum + other.weighted_sum,
+            self.weight_sum + other.weight_sum,
+            first.first_time,
+            first.first_value,
+            last.last_time,
+            last.last_value,
+            min(self.min, other.min),
+            max(self.max, other.max),
+        )
+
+
+class Window(NamedTuple):
+    """Merged partial aggregates of the buckets covering one window."""
+
+    count: int
+    sum: float
+    weighted_sum: float
+    weight_sum: float
+    first_time: float
+    first_value: float
+    last_time: float
+    last_value: float
+
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def weighted_mean(self) -> Optional[float]:
+        return self.weighted_sum / self.weight_sum if self.weight_sum > 0 else None
+
+    def rate(self) -> Optional[float]:
+        """Change per second between the oldest and newest sample."""
+
+        elapsed = self.last_time - self.first_time
+        if self.count < 2 or elapsed <= 0:
+            return None
+        return (self.last_value - self.first_value) / elapsed
+
+
+def partials(
+    times: Sequence[float],
+    values: Sequence[float],
+    weights: Optional[Sequence[float]] = None,
+    width: float = BUCKET_SECONDS,
+) -> List[Partial]:
+    """Reduce the samples of one key to one ``Partial`` per ``width``-second bucket, oldest first."""
+
+    times = np.asarray(times, dtype=np.float64)
+    if not times.size:
+        return []
+    values = np.asarray(values, dtype=np.float64)
+    weights = np.ones_like(values) if weights is None else np.asarray(weights, dtype=np.float64)
+    # Stable, so of two samples with the same time the later one is the last.
+    order = np.argsort(times, kind='stable')
+    times, values, weights = times[order], values[order], weights[order]
+    buckets = np.floor_divide(times, width).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], times.size] - 1
+    columns = (
+        buckets[starts],
+        np.diff(np.r_[starts, times.size]),
+        np.add.reduceat(values, starts),
+        np.add.reduceat(values * weights, starts),
+        np.add.reduceat(weights, starts),
+        times[starts],
+        values[starts],
+        times[ends],
+        values[ends],
+        np.minimum.reduceat(values, starts),
+        np.maximum.reduceat(values, starts),
+    )
+    return [
+        Partial(int(row[0]), int(row[1]), *(float(value) for value in row[2:]))
+        for row in zip(*(column.tolist() for column in columns))
+    ]
+
+
+def _window(merged: Iterable[Partial]) -> Window:
+    merged = list(merged)
+    first = min(merged, key=lambda partial: partial.first_time)
+    last = max(merged, key=lambda partial: partial.last_time)
+    return Window(
+        sum(partial.count for partial in merged),
+        sum(partial.sum for partial in merged),
+        sum(partial.weighted_sum for partial in merged),
+        sum(partial.weight_sum for partial in merged),
+        first.first_time,
+        first.first_value,
+        last.last_time,
+        last.last_value,
+    )
+
+
+class MemoryWindows:
+    """Process-local aggregates with the same semantics as ``RedisWindows``."""
+
+    def __init__(self, max_keys: int = MAX_KEYS):
+        self.max_keys = max_keys
+        self._keys: 'OrderedDict[str, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _state(self, ident: str, factory) -> Any:
+        state = self._keys.get(ident)
+        if state is None:
+            state = self._keys[ident] = factory()
+            if len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+        else:
+            self._keys.move_to_end(ident)
+        return state
+
+    def slide(self, name: str, series: Dict[str, List[Partial]]) -> Dict[str, Window]:
+        """Add each key's partials to its buckets; the window as of the newest one per key."""
+
+        windows = {}
+        with self._lock:
+            for key, added in series.items():
+                buckets: Dict[int, Partial] = self._state(f'{name}:{key}', dict)
+                for partial in added:
+                    current = buckets.get(partial.bucket)
+                    buckets[partial.bucket] = partial if current is None else current.merge(partial)
+                newest = max(partial.bucket for partial in added)
+                # Like the Redis TTL, keep two buckets beyond the window for late events.
+                for stale in [bucket for bucket in buckets if bucket < max(buckets) - BUCKETS - 1]:
+                    del buckets[stale]
+                windows[key] = _window(
+                    buckets[bucket] for bucket in range(newest - BUCKETS + 1, newest + 1) if bucket in buckets
+                )
+        return windows
+
+    def tumble(self, name: str, series: Dict[str, List[Partial]]) -> Dict[str, List[Partial]]:
+        """Add each key's partials to its open window; the windows they closed per key."""
+
+        closed: Dict[str, List[Partial]] = {}
+        with self._lock:
+            for key, added in series.items():
+                state = self._state(f'{name}:{key}:tumbling', lambda: [None])
+                for partial in added:
+                    current = state[0]
+                    if current is not None and partial.bucket < current.bucket:
+                        continue
+                    if current is not None and partial.bucket > current.bucket:
+                        closed.setdefault(key, []).append(current)
+                        current = None
+                    state[0] = partial if current is None else current.merge(partial)
+        return closed
+
+
+class RedisWindows:
+    """Aggregates shared by every ingest worker, one hash per (key, bucket)."""
+
+    def __init__(self, client):
+        self.client = client
+        self.slide_ttl = int(math.ceil(SLIDING_SECONDS + 2 * BUCKET_SECONDS))
+        self.tumble_ttl = int(math.ceil(2 * TUMBLING_SECONDS))
+        self._slide = client.register_script(_SLIDE_SCRIPT)
+        self._tumble = client.register_script(_TUMBLE_SCRIPT)
+
+    def slide(self, name: str, series: Dict[str, List[Partial]]) -> Dict[str, Window]:
+        pipeline = self.client.pipeline(transaction=False)
+        queued = []
+        for key, added in series.items():
+            newest = max(partial.bucket for partial in added)
+            for partial in added:
+                keys = [f'{KEY_PREFIX}:{name}:{key}:{partial.bucket}']
+                if partial.bucket == newest:
+                    keys += [f'{KEY_PREFIX}:{name}:{key}:{bucket}' for bucket in range(newest, newest - BUCKETS, -1)]
+                    queued.append(key)
+                else:
+                    queued.append(None)
+                args = [partial.count, *(repr(value) for value in partial[2:9]), self.slide_ttl]
+                self._slide(keys=keys, args=args, client=pipeline)
+        windows = {}
+        for key, result in zip(queued, pipeline.execute()):
+            if key is not None:
+                count, total, weighted, weights, first_time, first_value, last_time, last_value = result
+                windows[key] = Window(
+                    int(count),
+                    float(total),
+                    float(weighted),
+                    float(weights),
+                    float(first_time),
+                    float(first_value),
+                    float(last_time),
+                    float(last_value),
+                )
+        return windows
+
+    def tumble(self, name: str, series: Dict[str, List[Partial]]) -> Dict[str, List[Partial]]:
+        pipeline = self.client.pipeline(transaction=False)
+        queued = []
+        for key, added in series.items():
+            for partial in added:
+                args = [partial.bucket, partial.count, repr(partial.sum), repr(partial.min), repr(partial.max)]
+                args.append(self.tumble_ttl)
+                self._tumble(keys=[f'{KEY_PREFIX}:{name}:{key}:tumbling'], args=args, client=pipeline)
+                queued.append(key)
+        closed: Dict[str, List[Partial]] = {}
+        for key, result in zip(queued, pipeline.execute()):
+            if result:
+                bucket, count, total, low, high = result
+                total = float(total)
+                # Tumbling windows only keep count, sum and extremes.
+                partial = Partial(int(bucket), int(count), total, total, 0, 0, 0, 0, 0, float(low), float(high))
+                closed.setdefault(key, []).append(partial)
+        return closed
+
+
+_windows = None
+_windows_lock = threading.Lock()
+
+
+def get_windows():
+    global _windows
+    if _windows is None:
+        with _windows_lock:
+            if _windows is None:
+                backend = settings.CHANNEL_LAYERS['default']['BACKEND']
+                if backend.endswith('InMemoryChannelLayer'):
+                    _windows = MemoryWindows()
+                else:
+                    from . import polling
+
+                    _windows = RedisWindows(polling.get_client())
+    return _windows
+
+
+def _to_float(value: Any) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+Sample = Tuple[Dict[str, Any], float]
+
+
+def _series(
+    samples: Iterable[Sample],
+    key_field: str,
+    value_field: str,
+    weight_field: Optional[str] = None,
+    allow_zero: bool = True,
+) -> Dict[str, Tuple[List[float], List[float], List[float]]]:
+    """Times, values and weights of the usable samples, per key."""
+
+    series: Dict[str, Tuple[List[float], List[float], List[float]]] = {}
+    for data, timestamp in samples:
+        value = _to_float(data.get(value_field))
+        key = data.get(key_field)
+        if value is None or not key or (value == 0 and not allow_zero):
+            continue
+        weight = (_to_float(data.get(weight_field)) or 1.0) if weight_field else 1.0
+        times, values, weights = series.setdefault(key, ([], [], []))
+        times.append(timestamp)
+        values.append(value)
+        weights.append(weight)
+    return series
+
+
+class StreamAggregator:
+    def __init__(self, windows=None):
+        self._windows = windows
+        self._failing = False
+
+    @property
+    def windows(self):
+        return self._windows if self._windows is not None else get_windows()
+
+    def process(self, event_type: str, samples: Sequence[Sample]) -> List[DashboardEvent]:
+        handler = getattr(self, f'_on_{event_type}', None)
+        if handler is None or not samples:
+            return []
+        try:
+            derived = handler(samples)
+        except Exception:  # noqa: BLE001 - derived metrics must not fail the ingest task
+            if not self._failing:
+                logger.warning('Window aggregation unavailable; derived events skipped', exc_info=True)
+            self._failing = True
+            return []
+        self._failing = False
+        return derived
+
+    def _on_sensor(self, samples: Sequence[Sample]) -> List[DashboardEvent]:
+        series = _series(samples, 'source', 'value')
+        if not series:
+            return []
+
+        windows = self.windows
+        sliding = windows.slide('sensor', {key: partials(*columns) for key, columns in series.items()})
+        closed = windows.tumble(
+            'sensor_minute',
+            {key: partials(*columns, width=TUMBLING_SECONDS) for key, columns in series.items()},
+        )
+        derived = [
+            DashboardEvent(
+                event_type='sensor_stats',
+                data={
+                    'source': source,
+                    'timestamp': _isoformat(window.last_time),
+                    'mean': window.mean(),
+                    'rate': window.rate(),
+                    'count': window.count,
+                    'window_seconds': SLIDING_SECONDS,
+                },
+            )
+            for source, window in sliding.items()
+        ]
+        for source, windows_closed in closed.items():
+            for window in windows_closed:
+                derived.append(
+                    DashboardEvent(
+                        event_type='sensor_minute',
+                        data={
+                            'source': source,
+                            'timestamp': _isoformat(window.bucket * TUMBLING_SECONDS),
+                            'count': window.count,
+                            'mean': window.sum / window.count,
+                            'min': window.min,
+                            'max': window.max,
+                            'window_seconds': TUMBLING_SECONDS,
+                        },
+                    )
+                )
+        return derived
+
+    def _on_finance(self, samples: Sequence[Sample]) -> List[DashboardEvent]:
+        # A zero price is a missing quote, not a trade.
+        series = _series(samples, 'symbol', 'price', 'volume', allow_zero=False)
+        if not series:
+            return []
+
+        sliding = self.windows.slide('finance', {symbol: partials(*columns) for symbol, columns in series.items()})
+        return [
+            DashboardEvent(
+                event_type='finance_vwap',
+                data={
+                    'symbol': symbol,
+                    'timestamp': _isoformat(window.last_time),
+                    'vwap': window.weighted_mean(),
+                    'rate': window.rate(),
+                    'window_seconds': SLIDING_SECONDS,
+                },
+            )
+            for symbol, window in sliding.items()
+        ]
+
+
+aggregator = StreamAggregator()
+
+
+def process(event_type: str, samples: Sequence[Sample]) -> List[DashboardEvent]:
+    """Derived events for ``samples``, ``(data, timestamp)`` pairs of one batch of ``event_type``."""
+
+    if not ENABLED:
+        return []
+    return aggregator.process(event_type, samples)
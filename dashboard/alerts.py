@@ -0,0 +1,472 @@
+"""Threshold and anomaly alerting on the sensor stream.
+
+Rules come from ``settings.DASHBOARD_ALERT_RULES`` and are compiled into NumPy
+arrays so one batch of readings is checked against every rule at once:
+
+* ``threshold``: fires when the value is above ``above`` or below ``below``.
+* ``zscore``: fires when ``|value - mean| / std`` exceeds ``threshold`` using an
+  exponentially weighted mean/variance (``alpha``) per source.
+* ``ewma``: fires when the value leaves an absolute ``band`` around the
+  exponentially weighted mean.
+
+Alerts are edge-triggered (a rule fires once per source until the condition
+clears), limited by a per-rule ``cooldown`` and a global notifications-per-
+minute budget, stored as ``AlertEvent`` rows and published as ``alert``
+events through ``dashboard.realtime``.
+
+With a Redis channel layer the ingest path only appends each reading to a
+bounded Redis list. ``tasks.evaluate_alerts`` (every
+``DASHBOARD_ALERT_INTERVAL`` seconds from beat) drains it in batches under a
+lock, so one process evaluates at a time; the lock is extended before each
+batch while this worker still holds it. The per-source statistics, trigger
+state and cooldowns are loaded from and saved back to Redis around each
+batch, and the budget is a per-minute Redis counter, so the result does not
+depend on which worker runs the task. With the in-memory layer (a single
+process) readings are evaluated as they arrive and the state stays local.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from fnmatch import fnmatchcase
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from django.conf import settings
+
+from . import metrics, models
+from .realtime import DashboardEvent, broadcast_event
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('threshold', 'zscore', 'ewma')
+MAX_CACHED_SOURCES = 50000
+QUEUE_KEY = 'dashboard:alerts:queue'
+LOCK_KEY = 'dashboard:alerts:lock'
+STATE_PREFIX = 'dashboard:alerts:state'
+BUDGET_PREFIX = 'dashboard:alerts:budget'
+MAX_QUEUE = 100000
+BATCH_SIZE = 5000
+MAX_BATCHES = 20
+STATE_TTL = 24 * 3600
+LOCK_SECONDS = 30
+# Readings per matrix product in _ewm.
+EWM_BLOCK = 16
+
+# Extend or release the drain lock only while it still holds this worker's token.
+_REFRESH_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+@dataclass
+class Alert:
+    rule: str
+    kind: str
+    severity: str
+    source: str
+    value: float
+    detail: Dict[str, Any]
+    timestamp: float
+
+    def to_event(self) -> DashboardEvent:
+        return DashboardEvent(
+            event_type='alert',
+            data={
+                'rule': self.rule,
+                'kind': self.kind,
+                'severity': self.severity,
+                'source': self.source,
+                'value': self.value,
+                'detail': self.detail,
+                'timestamp': datetime.fromtimestamp(self.timestamp, tz=timezone.utc).isoformat(),
+            },
+        )
+
+
+class _SourceState:
+    """Per-source rolling statistics and trigger state, one slot per rule."""
+
+    __slots__ = ('mask', 'mean', 'var', 'count', 'active', 'last_fired')
+
+    def __init__(self, mask: np.ndarray):
+        size = mask.shape[0]
+        self.mask = mask
+        self.mean = np.zeros(size)
+        self.var = np.zeros(size)
+        self.count = np.zeros(size, dtype=np.int64)
+        self.active = np.zeros(size, dtype=bool)
+        self.last_fired = np.full(size, -np.inf)
+
+    def dumps(self) -> str:
+        return json.dumps(
+            [self.mean.tolist(), self.var.tolist(), self.count.tolist(), self.active.tolist(), self.last_fired.tolist()]
+        )
+
+    def loads(self, blob: str) -> None:
+        mean, var, count, active, last_fired = json.loads(blob)
+        if len(mean) != self.mask.shape[0]:
+            return  # saved under other rules
+        self.mean = np.array(mean, dtype=np.float64)
+        self.var = np.array(var, dtype=np.float64)
+        self.count = np.array(count, dtype=np.int64)
+        self.active = np.array(active, dtype=bool)
+        self.last_fired = np.array(last_fired, dtype=np.float64)
+
+
+class TokenBudget:
+    """Notifications-per-minute budget of one process."""
+
+    def __init__(self, max_per_minute: int):
+        self.max_per_minute = max_per_minute
+        self.tokens = float(max_per_minute)
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.max_per_minute, self.tokens + (now - self.updated) * self.max_per_minute / 60.0)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class RedisBudget:
+    """Notifications-per-minute budget shared by every process (fixed minute windows)."""
+
+    def __init__(self, client, max_per_minute: int):
+        self.client = client
+        self.max_per_minute = max_per_minute
+
+    def take(self) -> bool:
+        key = f'{BUDGET_PREFIX}:{int(time.time() // 60)}'
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.incr(key)
+        pipeline.expire(key, 120)
+        used, _ = pipeline.execute()
+        return int(used) <= self.max_per_minute
+
+
+class AlertEngine:
+    def __init__(self, rules: Sequence[Dict[str, Any]], max_per_minute: int = 60, budget=None):
+        rules = [rule for rule in rules if rule.get('kind', 'threshold') in KINDS]
+        self.rules = rules
+        self.names = [rule.get('name') or f'rule-{index}' for index, rule in enumerate(rules)]
+        self.patterns = [rule.get('pattern', '*') for rule in rules]
+        kinds = np.array([KINDS.index(rule.get('kind', 'threshold')) for rule in rules], dtype=np.int8)
+        self.is_threshold = kinds == 0
+        self.is_zscore = kinds == 1
+        self.is_ewma = kinds == 2
+        self.above = np.array([rule.get('above', np.nan) for rule in rules], dtype=np.float64)
+        self.below = np.array([rule.get('below', np.nan) for rule in rules], dtype=np.float64)
+        self.threshold = np.array([rule.get('threshold', 3.0) for rule in rules], dtype=np.float64)
+        self.band = np.array([rule.get('band', np.inf) for rule in rules], dtype=np.float64)
+        self.alpha = np.array([rule.get('alpha', 0.1) for rule in rules], dtype=np.float64)
+        self.min_samples = np.array([rule.get('min_samples', 10) for rule in rules], dtype=np.int64)
+        self.cooldown = np.array([rule.get('cooldown', 60.0) for rule in rules], dtype=np.float64)
+        self.stateful = self.is_zscore | self.is_ewma
+        # _ewm's block matrices: powers[k, j, rule] = decay ** (k - j) for j <= k, else 0.
+        self.decay = 1 - self.alpha
+        lags = np.arange(EWM_BLOCK)
+        exponents = lags[:, None] - lags[None, :]
+        self._powers = np.where((exponents >= 0)[:, :, None], self.decay ** np.maximum(exponents, 0)[:, :, None], 0.0)
+        self._carry = self.decay ** (lags[:, None] + 1)
+        self.budget = budget or TokenBudget(max_per_minute)
+        self.fingerprint = hashlib.blake2b(json.dumps(rules, sort_keys=True, default=str).encode(), digest_size=8).hexdigest()
+        self._sources: 'OrderedDict[str, _SourceState]' = OrderedDict()
+
+    def _state(self, source: str) -> _SourceState:
+        state = self._sources.get(source)
+        if state is None:
+            mask = np.array([fnmatchcase(source, pattern) for pattern in self.patterns], dtype=bool)
+            state = self._sources[source] = _SourceState(mask)
+            if len(self._sources) > MAX_CACHED_SOURCES:
+                self._sources.popitem(last=False)
+        else:
+            self._sources.move_to_end(source)
+        return state
+
+    def _reset(self, source: str) -> _SourceState:
+        state = self._sources[source] = _SourceState(self._state(source).mask)
+        return state
+
+    def load(self, blobs: Dict[str, Optional[str]]) -> None:
+        """Replace the cached state of each source with its saved copy (or a fresh one)."""
+
+        for source, blob in blobs.items():
+            state = self._reset(source)
+            if blob:
+                state.loads(blob)
+
+    def dump(self, sources: Iterable[str]) -> Dict[str, str]:
+        return {source: self._state(source).dumps() for source in sources}
+
+    def evaluate(self, sources: Sequence[str], values: Sequence[float], timestamps: Optional[Sequence[float]] = None) -> List[Alert]:
+        """Check a batch of readings against every rule and return new alerts.
+
+        Readings are grouped by source and each group is checked as one
+        (readings x rules) matrix, the weighted statistics included (``_ewm``).
+        Only the cells where a rule starts firing are then walked in reading
+        order, for the cooldowns and the budget.
+        """
+
+        if not self.rules or not len(sources):
+            return []
+        values = np.asarray(values, dtype=np.float64)
+        if timestamps is None:
+            timestamps = np.full(values.shape[0], time.time())
+        else:
+            timestamps = np.asarray(timestamps, dtype=np.float64)
+        groups: Dict[str, List[int]] = {}
+        for index, source in enumerate(sources):
+            groups.setdefault(source, []).append(index)
+
+        rising: List[tuple] = []
+        for source, indices in groups.items():
+            state = self._state(source)
+            rows = np.asarray(indices)
+            column = values[rows][:, None]
+            with np.errstate(invalid='ignore'):
+                breached = self.is_threshold & ((column > self.above) | (column < self.below))
+            breached &= state.mask
+            means = variances = scores = None
+            applicable = state.mask & self.stateful
+            if applicable.any():
+                means, variances, counts = self._statistics(state, column, applicable)
+                deviation = np.abs(column - means[:-1])
+                warmed = applicable & (counts >= self.min_samples)
+                std = np.sqrt(variances[:-1])
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    scores = np.where(std > 0, deviation / std, 0.0)
+                breached |= warmed & self.is_zscore & (scores > self.threshold)
+                breached |= warmed & self.is_ewma & (deviation > self.band)
+            # A rule rises where it breaches and did not on the previous reading of the source.
+            previous = np.vstack([state.active, breached[:-1]])
+            state.active = breached[-1].copy()
+            for position, rule_index in np.argwhere(breached & ~previous):
+                rising.append((indices[position], rule_index, source, state, position, means, variances, scores))
+
+        rising.sort(key=lambda cell: (cell[0], cell[1]))
+        alerts: List[Alert] = []
+        suppressed = 0
+        for index, rule_index, source, state, position, means, variances, scores in rising:
+            timestamp = timestamps[index]
+            if timestamp - state.last_fired[rule_index] < self.cooldown[rule_index] or not self.budget.take():
+                suppressed += 1
+                continue
+            state.last_fired[rule_index] = timestamp
+            rule = self.rules[rule_index]
+            detail: Dict[str, Any] = {}
+            if self.is_threshold[rule_index]:
+                detail = {key: rule[key] for key in ('above', 'below') if key in rule}
+            else:
+                # The statistics after this reading, as the per-reading loop reported them.
+                detail = {
+                    'mean': float(means[position + 1, rule_index]),
+                    'std': float(np.sqrt(variances[position + 1, rule_index])),
+                }
+                if self.is_zscore[rule_index]:
+                    detail['zscore'] = float(scores[position, rule_index])
+            alerts.append(
+                Alert(
+                    rule=self.names[rule_index],
+                    kind=rule.get('kind', 'threshold'),
+                    severity=rule.get('severity', 'warning'),
+                    source=source,
+                    value=float(values[index]),
+                    detail=detail,
+                    timestamp=float(timestamp),
+                )
+            )
+        if suppressed:
+            metrics.ALERTS_SUPPRESSED.inc(suppressed)
+        return alerts
+
+    def _statistics(self, state: _SourceState, column: np.ndarray, applicable: np.ndarray):
+        """Weighted mean/variance of every rule before and after each reading of one source.
+
+        Returns ``(means, variances, counts)``: row ``k`` of ``means`` and
+        ``variances`` holds the statistics before reading ``k`` and the last
+        row those after the batch, which are saved into ``state``. ``counts``
+        holds the samples seen before each reading. Rules that do not apply
+        keep their state.
+        """
+
+        # A rule's first sample becomes its mean: starting from it gives alpha * x + decay * x == x.
+        start = np.where(state.count == 0, column[0], state.mean)
+        means = self._ewm(start, self.alpha * column)
+        deviation = column - means[:-1]
+        variances = self._ewm(state.var, self.decay * self.alpha * deviation ** 2)
+        counts = state.count + np.arange(column.shape[0])[:, None]
+        means = np.where(applicable, means, state.mean)
+        variances = np.where(applicable, variances, state.var)
+        state.mean = means[-1].copy()
+        state.var = variances[-1].copy()
+        state.count = np.where(applicable, state.count + column.shape[0], state.count)
+        return means, variances, counts
+
+    def _ewm(self, start: np.ndarray, inputs: np.ndarray) -> np.ndarray:
+        """Solve ``y[k + 1] = decay * y[k] + inputs[k]`` with ``y[0] = start`` for every rule.
+
+        Each block of ``EWM_BLOCK`` rows is one product with the lower
+        triangular matrix of ``decay ** (k - j)``; the powers are never
+        negative, so a small ``decay`` cannot overflow.
+        """
+
+        rows = inputs.shape[0]
+        out = np.empty((rows + 1, start.shape[0]))
+        out[0] = start
+        for begin in range(0, rows, EWM_BLOCK):
+            block = inputs[begin:begin + EWM_BLOCK]
+            size = block.shape[0]
+            spread = np.einsum('kjr,jr->kr', self._powers[:size, :size], block)
+            out[begin + 1:begin + 1 + size] = self._carry[:size] * out[begin] + spread
+        return out
+
+
+
+
+def publish(alerts: Sequence[Alert]) -> None:
+    """Store alert history and push the alerts to connected dashboards."""
+
+    if not alerts:
+        return
+    models.AlertEvent.objects.bulk_create(
+        [
+            models.AlertEvent(
+                rule=alert.rule,
+                kind=alert.kind,
+                severity=alert.severity,
+                source=alert.source,
+                value=alert.value,
+                detail=alert.detail,
+            )
+            for alert in alerts
+        ]
+    )
+    for alert in alerts:
+        metrics.ALERTS_FIRED.labels(rule=alert.rule).inc()
+        broadcast_event(alert.to_event())
+
+
+_engine: Optional[AlertEngine] = None
+_shared: Optional[bool] = None
+_failing = False
+
+
+def _use_redis() -> bool:
+    global _shared
+    if _shared is None:
+        _shared = not settings.CHANNEL_LAYERS['default']['BACKEND'].endswith('InMemoryChannelLayer')
+    return _shared
+
+
+def get_engine() -> AlertEngine:
+    global _engine
+    if _engine is None:
+        max_per_minute = getattr(settings, 'DASHBOARD_ALERTS_PER_MINUTE', 60)
+        budget = None
+        if _use_redis():
+            from . import polling
+
+            budget = RedisBudget(polling.get_client(), max_per_minute)
+        _engine = AlertEngine(getattr(settings, 'DASHBOARD_ALERT_RULES', []), max_per_minute=max_per_minute, budget=budget)
+    return _engine
+
+
+def check_reading(source: str, value: Any, timestamp: float) -> None:
+    global _failing
+
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return
+    if not np.isfinite(number) or not get_engine().rules:
+        return
+    if not _use_redis():
+        publish(get_engine().evaluate([source], [number], [timestamp]))
+        return
+
+    from . import polling
+
+    try:
+        pipeline = polling.get_client().pipeline(transaction=False)
+        pipeline.rpush(QUEUE_KEY, json.dumps([source, number, timestamp]))
+        pipeline.ltrim(QUEUE_KEY, -MAX_QUEUE, -1)
+        pipeline.execute()
+    except Exception:  # noqa: BLE001 - alerting must not fail the ingest task
+        if not _failing:
+            logger.warning('Alert queue unavailable; readings are not checked', exc_info=True)
+        _failing = True
+        return
+    _failing = False
+
+
+def _state_key(engine: AlertEngine, source: str) -> str:
+    return f'{STATE_PREFIX}:{engine.fingerprint}:{source}'
+
+
+def evaluate_batch(client, engine: AlertEngine, readings: Sequence[Sequence[Any]]) -> List[Alert]:
+    """Evaluate queued ``[source, value, timestamp]`` readings with the state saved in Redis."""
+
+    sources = [reading[0] for reading in readings]
+    distinct = list(dict.fromkeys(sources))
+    engine.load(dict(zip(distinct, client.mget([_state_key(engine, source) for source in distinct]))))
+    alerts = engine.evaluate(sources, [reading[1] for reading in readings], [reading[2] for reading in readings])
+    pipeline = client.pipeline(transaction=False)
+    for source, blob in engine.dump(distinct).items():
+        pipeline.set(_state_key(engine, source), blob, ex=STATE_TTL)
+    pipeline.execute()
+    return alerts
+
+
+def drain() -> int:
+    """Evaluate the queued readings (``tasks.evaluate_alerts``); returns how many."""
+
+    if not _use_redis():
+        return 0
+    from . import polling
+
+    client = polling.get_client()
+    token = uuid.uuid4().hex
+    if not client.set(LOCK_KEY, token, nx=True, ex=LOCK_SECONDS):
+        return 0  # another worker is draining
+    refresh = client.register_script(_REFRESH_SCRIPT)
+    engine = get_engine()
+    evaluated = 0
+    try:
+        for batch in range(MAX_BATCHES):
+            # Renew the lock for the next batch; once it has expired another worker may be draining.
+            if batch and not refresh(keys=[LOCK_KEY], args=[token, LOCK_SECONDS * 1000]):
+                logger.warning('Alert drain lock expired; leaving the rest of the queue to the next run')
+                break
+            pipeline = client.pipeline(transaction=True)
+            pipeline.lrange(QUEUE_KEY, 0, BATCH_SIZE - 1)
+            pipeline.ltrim(QUEUE_KEY, BATCH_SIZE, -1)
+            readings = [json.loads(item) for item in pipeline.execute()[0]]
+            if not readings:
+                break
+            publish(evaluate_batch(client, engine, readings))
+            evaluated += len(readings)
+            if len(readings) < BATCH_SIZE:
+                break
+    finally:
+        client.register_script(_RELEASE_SCRIPT)(keys=[LOCK_KEY], args=[token])
+    return evaluated
@@ -6,5 +6,6 @@ class DashboardConfig(AppConfig):
     name = 'dashboard'
 
     def ready(self):  # pragma: no cover - side effects only
-        from . import signals  # noqa: F401
-        from .dash_apps import real_time  # noqa: F401
+        from . import profiling, signals  # noqa: F401
+
+        profiling.install_signal_handler()
@@ -0,0 +1,189 @@
+"""Columnar archival of aged-out readings and memory-mapped historical reads.
+
+``archive_model`` moves rows older than the cutoff from the OLTP tables into
+zstd-compressed Parquet files laid out as
+``<DASHBOARD_ARCHIVE_DIR>/<event_type>/day=YYYY-MM-DD/<batch>.parquet``. Each
+file stores the row id, timestamp, key, the typed metrics the source declares
+in ``dashboard.sources`` and the raw payload as JSON text,
+sorted by key and time so row-group statistics make key filters cheap.
+
+``read_archive`` opens the dataset through a memory-mapped filesystem and
+pushes day, time-range and key predicates down to the Parquet reader.
+``latest`` reads the newest archived rows day by day; the startup snapshot
+uses it to fill in history the tables no longer hold.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+from django.conf import settings
+
+from . import sources
+
+logger = logging.getLogger(__name__)
+
+
+def archive_root() -> Path:
+    return Path(getattr(settings, 'DASHBOARD_ARCHIVE_DIR', Path(settings.BASE_DIR) / 'archive'))
+
+
+def _schema(columns: Iterable[str]) -> pa.Schema:
+    fields = [
+        pa.field('id', pa.int64()),
+        pa.field('created_at', pa.timestamp('us', tz='UTC')),
+        pa.field('key', pa.string()),
+    ]
+    fields += [pa.field(column, pa.float64()) for column in columns]
+    fields.append(pa.field('payload', pa.string()))
+    return pa.schema(fields)
+
+
+def _write_day(event_type: str, day: str, rows: List[Dict[str, Any]], columns: Sequence[str], batch: str) -> None:
+    rows.sort(key=lambda row: (row['key'], row['created_at']))
+    table = pa.Table.from_pylist(rows, schema=_schema(columns))
+    directory = archive_root() / event_type / f'day={day}'
+    directory.mkdir(parents=True, exist_ok=True)
+    pq.write_table(table, directory / f'{batch}.parquet', compression='zstd', row_group_size=64_000)
+
+
+def archive_model(event_type: str, cutoff: datetime, chunk_size: int = 50_000) -> int:
+    """Move rows created before ``cutoff`` into Parquet; returns rows archived."""
+
+    source = sources.get(event_type)
+    columns = list(source.metrics)
+    queryset = source.model.objects.filter(created_at__lt=cutoff).order_by('pk')
+    archived = 0
+    last_pk = 0
+    while True:
+        chunk = list(
+            queryset.filter(pk__gt=last_pk).values_list('pk', 'created_at', source.key_field, 'payload')[:chunk_size]
+        )
+        if not chunk:
+            return archived
+
+        by_day: Dict[str, List[Dict[str, Any]]] = {}
+        for pk, created_at, key, payload in chunk:
+            row = {'id': pk, 'created_at': created_at, 'key': key, 'payload': json.dumps(payload, default=str)}
+            row.update(source.extract(payload))
+            by_day.setdefault(created_at.astimezone(timezone.utc).date().isoformat(), []).append(row)
+
+        batch = uuid.uuid4().hex
+        for day, rows in by_day.items():
+            _write_day(event_type, day, rows, columns, batch)
+
+        first_pk, last_pk = chunk[0][0], chunk[-1][0]
+        # Only delete once the files are on disk; a crash in between leaves
+        # duplicates that read_archive() drops by id, never lost rows.
+        queryset.filter(pk__gte=first_pk, pk__lte=last_pk).delete()
+        archived += len(chunk)
+        logger.info('Archived %s %s rows up to id %s', len(chunk), event_type, last_pk)
+
+
+def _dataset(event_type: str) -> Optional[ds.Dataset]:
+    path = archive_root() / event_type
+    if not path.exists():
+        return None
+    filesystem = pafs.LocalFileSystem(use_mmap=True)
+    return ds.dataset(str(path), format='parquet', partitioning='hive', filesystem=filesystem)
+
+
+def _empty(event_type: str, columns: Optional[Sequence[str]] = None) -> pa.Table:
+    table = _schema(sources.get(event_type).metrics).append(pa.field('day', pa.string())).empty_table()
+    return table if columns is None else table.select(list(dict.fromkeys([*columns, 'day'])))
+
+
+def read_archive(
+    event_type: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    keys: Optional[Sequence[str]] = None,
+    columns: Optional[Sequence[str]] = None,
+) -> pa.Table:
+    """Read archived rows in ``[start, end)``, optionally for some keys only.
+
+    ``columns`` limits the result to those columns plus the ``day``
+    partition; by default every column is returned.
+    """
+
+    dataset = _dataset(event_type)
+    if dataset is None:
+        return _empty(event_type, columns)
+
+    expression = None
+    conditions = []
+    if start is not None:
+        start = start.astimezone(timezone.utc)
+        conditions.append(ds.field('day') >= start.date().isoformat())
+        conditions.append(ds.field('created_at') >= pa.scalar(start, type=pa.timestamp('us', tz='UTC')))
+    if end is not None:
+        end = end.astimezone(timezone.utc)
+        conditions.append(ds.field('day') <= end.date().isoformat())
+        conditions.append(ds.field('created_at') < pa.scalar(end, type=pa.timestamp('us', tz='UTC')))
+    if keys:
+        conditions.append(ds.field('key').isin(list(keys)))
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+
+    selected = None
+    if columns is not None:
+        selected = list(dict.fromkeys([*columns, 'day']))
+    # id and created_at are read for deduplication and ordering either way.
+    wanted = None if selected is None else list(dict.fromkeys([*selected, 'id', 'created_at']))
+    table = dataset.to_table(columns=wanted, filter=expression)
+    if table.num_rows:
+        # Drop rows written twice by an interrupted archive run.
+        _, first = np.unique(table['id'].to_numpy(), return_index=True)
+        if len(first) != table.num_rows:
+            table = table.take(pa.array(first))
+        indices = pc.sort_indices(table, sort_keys=[('created_at', 'ascending'), ('id', 'ascending')])
+        table = table.take(indices)
+    return table if selected is None else table.select(selected)
+
+
+def archived_days(event_type: str) -> List[date]:
+    path = archive_root() / event_type
+    if not path.exists():
+        return []
+    return sorted(date.fromisoformat(child.name.split('=', 1)[1]) for child in path.glob('day=*'))
+
+
+def latest(
+    event_type: str,
+    limit: int,
+    before: Optional[datetime] = None,
+    columns: Optional[Sequence[str]] = None,
+) -> pa.Table:
+    """The newest ``limit`` archived rows created before ``before``, oldest first.
+
+    Reads the newest days first and stops as soon as it has enough rows.
+    """
+
+    tables: List[pa.Table] = []
+    found = 0
+    cutoff = None if before is None else before.astimezone(timezone.utc)
+    for day in reversed(archived_days(event_type)):
+        start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+        if cutoff is not None and start >= cutoff:
+            continue
+        end = start + timedelta(days=1)
+        table = read_archive(event_type, start, end if cutoff is None else min(end, cutoff), columns=columns)
+        tables.append(table)
+        found += table.num_rows
+        if found >= limit:
+            break
+    if not tables:
+        return _empty(event_type, columns)
+    table = pa.concat_tables(reversed(tables))
+    return table.slice(max(table.num_rows - limit, 0))
@@ -0,0 +1,122 @@
+"""Per-process background work of the web (Daphne) processes.
+
+The first WebSocket connection of a process starts two tasks on the event
+loop. The heartbeat publishes the process's viewer count
+(``polling.viewers``) in a worker thread, so a slow or unreachable Redis
+never holds up a connection. The listener joins the dashboard group on its
+own channel and records every broadcast reading in the process's hot store,
+so ``snapshot`` can serve the latest rows from memory in the process that
+reads them.
+
+Broadcasts carry the replay ``seq``; ingest workers number events
+concurrently, so they may arrive slightly out of order. A number still
+missing ``LOSS_SECONDS`` after a later one arrived means the listener lost
+events (e.g. the channel was full), and the hot store stops vouching for
+older rows.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from . import hotstore, polling, sources
+from .realtime import DASHBOARD_GROUP
+
+logger = logging.getLogger(__name__)
+
+LOSS_SECONDS = 5.0
+# channels_redis forgets group members after a day unless they rejoin.
+REJOIN_SECONDS = 3600.0
+HEARTBEAT_TICK = 1.0
+
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+def _start(name: str, function, *args) -> None:
+    task = _tasks.get(name)
+    if task is None or task.done():
+        _tasks[name] = asyncio.get_running_loop().create_task(function(*args))
+
+
+def ensure_started(channel_layer) -> None:
+    """Start the heartbeat and the listener on the running loop unless they are running."""
+
+    _start('heartbeat', _heartbeat)
+    if channel_layer is not None:
+        _start('listener', _listen, channel_layer)
+
+
+class SequenceTracker:
+    """Notices sequence numbers that never arrived."""
+
+    def __init__(self):
+        self.highest: Optional[int] = None
+        self.missing: Dict[int, float] = {}
+
+    def see(self, seq: int, now: float) -> bool:
+        """Record ``seq``; returns True when an earlier number is considered lost."""
+
+        if self.highest is None:
+            self.highest = seq
+        elif seq > self.highest:
+            if seq - self.highest > 1000:
+                self.missing.clear()
+                self.highest = seq
+                return True
+            for gap in range(self.highest + 1, seq):
+                self.missing[gap] = now
+            self.highest = seq
+        else:
+            self.missing.pop(seq, None)
+        lost = [gap for gap, since in self.missing.items() if now - since > LOSS_SECONDS]
+        for gap in lost:
+            del self.missing[gap]
+        return bool(lost)
+
+
+def record(event: Dict[str, Any], tracker: SequenceTracker) -> None:
+    seq = event.get('seq')
+    if seq is not None and tracker.see(int(seq), time.time()):
+        hotstore.store.invalidate()
+    source = sources.get(event.get('event_type', ''))
+    data = event.get('data') or {}
+    if source is None or data.get('id') is None:
+        return
+    try:
+        timestamp = datetime.fromisoformat(data['timestamp']).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return
+    hotstore.store.record(source.event_type, data.get(source.key_field), timestamp, data['id'], data)
+
+
+async def _heartbeat() -> None:  # pragma: no cover - runs for the life of the process
+    while True:
+        if polling.viewers.due(time.monotonic()):
+            await asyncio.to_thread(polling.viewers.publish)
+        await asyncio.sleep(HEARTBEAT_TICK)
+
+
+async def _listen(channel_layer) -> None:  # pragma: no cover - runs for the life of the process
+    channel = await channel_layer.new_channel('dashboard-listener.')
+    hotstore.store.start()
+    tracker = SequenceTracker()
+    joined = 0.0
+    while True:
+        try:
+            if time.monotonic() - joined > REJOIN_SECONDS:
+                await channel_layer.group_add(DASHBOARD_GROUP, channel)
+                joined = time.monotonic()
+            message = await channel_layer.receive(channel)
+            if message.get('type') == 'dashboard_update':
+                record(message['data'], tracker)
+        except asyncio.CancelledError:
+            raise
+        except Exception:  # noqa: BLE001 - keep listening; the store falls back to the DB meanwhile
+            logger.warning('Dashboard listener failed; retrying', exc_info=True)
+            hotstore.store.invalidate()
+            joined = 0.0
+            await asyncio.sleep(1.0)
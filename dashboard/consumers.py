@@ -1,21 +1,91 @@
 """WebSocket consumer used by the real-time dashboard."""
 
 import json
-from typing import Any, Dict
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs
 
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+from . import background, metrics, polling, profiling, replay, snapshot, tracing
+
 
 class DashboardConsumer(AsyncWebsocketConsumer):
     group_name = 'dashboard_updates'
+    # Channel name of the consumer that records the delivered hop of traced
+    # events for this process, so the histogram is not multiplied by viewers.
+    tracer: Optional[str] = None
+
+    counted = False
 
+    @profiling.profiled('DashboardConsumer')
     async def connect(self) -> None:
+        background.ensure_started(self.channel_layer)
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
+        metrics.WEBSOCKET_CLIENTS.inc()
+        self.counted = True
+        polling.viewers.change(1)
+        last_seq = self._last_seq()
+        if last_seq is not None:
+            await self.catch_up(last_seq)
 
     async def disconnect(self, close_code: int) -> None:  # pragma: no cover - network cleanup
+        # connect() may have failed before the client was counted.
+        if self.counted:
+            self.counted = False
+            metrics.WEBSOCKET_CLIENTS.dec()
+            polling.viewers.change(-1)
+        if DashboardConsumer.tracer == self.channel_name:
+            DashboardConsumer.tracer = None
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
+    def _last_seq(self) -> Optional[int]:
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        try:
+            return int(query['last_seq'][0])
+        except (KeyError, ValueError):
+            return None
+
+    @staticmethod
+    async def _since(last_seq: int) -> Optional[list]:
+        try:
+            return await sync_to_async(replay.get_log().since)(last_seq)
+        except Exception:  # noqa: BLE001 - fall back to a snapshot if the log is unreachable
+            return None
+
+    async def catch_up(self, last_seq: int) -> None:
+        """Send what the client missed since ``last_seq``, or a full snapshot."""
+
+        events = await self._since(last_seq)
+        if events is None:
+            metrics.WEBSOCKET_RESUMES.labels(outcome='snapshot').inc()
+            await self.send_snapshot()
+        elif events:
+            metrics.WEBSOCKET_RESUMES.labels(outcome='replay').inc()
+            await self.send_json({'type': 'replay', 'events': events})
+        else:
+            metrics.WEBSOCKET_RESUMES.labels(outcome='current').inc()
+
+    async def send_snapshot(self) -> None:
+        """Send a snapshot plus the events broadcast after its ``seq``.
+
+        The shared snapshot can be a few seconds old; the replay since its
+        ``seq`` brings it up to the moment this consumer joined the group (the
+        browser drops what it then receives twice). When the log no longer
+        reaches back that far, a fresh snapshot is taken instead.
+        """
+
+        state = await database_sync_to_async(snapshot.cached_initial_payload)()
+        missed = await self._since(state.get('seq') or 0)
+        if missed is None:
+            state, missed = await database_sync_to_async(snapshot.initial_payload)(), []
+        await self.send_json({'type': 'snapshot', 'data': state})
+        if missed:
+            await self.send_json({'type': 'replay', 'events': missed})
+
+    @profiling.profiled('DashboardConsumer')
     async def receive(self, text_data: str | None = None, bytes_data: bytes | None = None) -> None:
         if not text_data:
             return
@@ -23,8 +93,17 @@ class DashboardConsumer(AsyncWebsocketConsumer):
         if payload.get('type') == 'ping':
             await self.send_json({'type': 'pong'})
 
+    @profiling.profiled('DashboardConsumer')
     async def dashboard_update(self, event: Dict[str, Any]) -> None:
-        await self.send_json(event['data'])
+        data = event['data']
+        trace = data.get('data', {}).get(tracing.TRACE_KEY)
+        if trace is not None:
+            data = tracing.strip(data)
+        await self.send_json(data)
+        metrics.observe_end_to_end(data.get('event_type', ''), data.get('data', {}).get('timestamp'))
+        if trace is not None and DashboardConsumer.tracer in (None, self.channel_name):
+            DashboardConsumer.tracer = self.channel_name
+            tracing.delivered(trace, data.get('event_type', ''))
 
     async def send_json(self, payload: Dict[str, Any]) -> None:
         await self.send(text_data=json.dumps(payload))
@@ -1 +1,16 @@
-"""Dash apps registered with django-plotly-dash."""
\ No newline at end of file
+"""Dash apps registered with django-plotly-dash.
+
+The apps are imported on first lookup (see ``PLOTLY_DASH['stateless_loader']``)
+instead of from ``DashboardConfig.ready`` so Celery workers and management
+commands do not pay for importing plotly, dash and dash_extensions.
+"""
+
+
+def load_stateless_app(name):
+    """django-plotly-dash lookup hook that imports the Dash apps on demand."""
+
+    from django_plotly_dash.dash_wrapper import all_apps
+
+    from . import real_time  # noqa: F401
+
+    return all_apps().get(name)
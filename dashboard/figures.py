@@ -0,0 +1,177 @@
+"""Dash figures built from plain dicts and shared between sessions.
+
+Every open dashboard runs the render callbacks on the same store contents,
+so a figure is cached under ``(event_type, data version)`` and only the first
+session to see a new version builds it. Figures are plotly.js JSON dicts:
+building ``go.Figure`` objects would validate every property on every render
+for no benefit, since Dash serializes the figure to JSON anyway.
+
+The cache has two levels: a small per-process LRU that hands the same dict
+to every session (no copy), and the Django ``figures`` cache, which is Redis
+when ``DASHBOARD_FIGURE_CACHE_URL`` is set so Daphne processes share what
+any of them built. Figures go to Redis without their template, which is the
+bulk of the JSON and the same in every process.
+
+The data version is cheap to compute: the number of entries and the first
+and last row id of the source bucket plus the length and last timestamp of
+each overlay bucket. Buckets are append-only windows of ``MAX_POINTS``
+entries, so those identify their contents.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Sequence, Tuple
+
+from django.core.cache import caches
+
+from . import metrics, sources
+from .snapshot import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'figures'
+CACHE_TTL = int(os.environ.get('DASHBOARD_FIGURE_CACHE_TTL', '300'))
+LOCAL_ENTRIES = 64
+
+_templates: Dict[str, Dict[str, Any]] = {}
+
+
+def template(name: str) -> Dict[str, Any]:
+    """The plotly.js JSON of a named template; plotly.js has no template registry."""
+
+    if name not in _templates:
+        import plotly.io as pio
+
+        _templates[name] = pio.templates[name].to_plotly_json()
+    return _templates[name]
+
+
+def _points(entries: Sequence[Dict[str, Any]], x_field: str, metric: str) -> Tuple[List[Any], List[Any]]:
+    x = [parse_datetime(item.get('timestamp')) if x_field == 'timestamp' else item.get(x_field) for item in entries]
+    return x, [item.get(metric) for item in entries]
+
+
+def build_figure(source: sources.Source, store: Dict[str, Any], with_template: bool = True) -> Dict[str, Any]:
+    """Figure for one source from its chart spec and the entries in the store."""
+
+    chart = source.chart
+    layout = {'title': {'text': chart.title}}
+    if with_template:
+        layout['template'] = template(chart.template)
+    entries = store.get(source.event_type) or []
+    if not entries:
+        return {'data': [], 'layout': layout}
+
+    traces = []
+    for series in chart.series:
+        x, y = _points(entries, chart.x, series.metric)
+        trace = {'type': series.kind, 'x': x, 'y': y, 'name': series.name, **series.style}
+        if series.kind == 'scatter':
+            trace['mode'] = series.mode
+        if series.secondary_y:
+            trace['yaxis'] = 'y2'
+        traces.append(trace)
+    for overlay in chart.overlays:
+        derived = store.get(overlay.event_type) or []
+        if not derived:
+            continue
+        if overlay.latest_per_key:
+            latest = {item.get(source.key_field): item.get(overlay.metric) for item in derived}
+            x, y = list(latest), list(latest.values())
+        else:
+            x, y = _points(derived, 'timestamp', overlay.metric)
+        traces.append({'type': 'scatter', 'mode': overlay.mode, 'x': x, 'y': y, 'name': overlay.name, **overlay.style})
+    return {'data': traces, 'layout': {**layout, **chart.layout}}
+
+
+def data_version(source: sources.Source, store: Dict[str, Any]) -> str:
+    entries = store.get(source.event_type) or []
+    parts: List[Any] = [len(entries)]
+    if entries:
+        first, last = entries[0].get('id'), entries[-1].get('id')
+        if first is None or last is None:
+            # Rows without ids (hand-made stores): fall back to the content.
+            digest = json.dumps(entries, sort_keys=True, default=str).encode()
+            parts.append(hashlib.blake2b(digest, digest_size=12).hexdigest())
+        else:
+            parts += [first, last]
+    for overlay in source.chart.overlays:
+        derived = store.get(overlay.event_type) or []
+        parts += [len(derived), derived[-1].get('timestamp') if derived else '']
+    return ':'.join(str(part) for part in parts)
+
+
+class LocalFigures:
+    """Process-local LRU of finished figures, shared by reference."""
+
+    def __init__(self, size: int = LOCAL_ENTRIES):
+        self.size = size
+        self._figures: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            figure = self._figures.get(key)
+            if figure is not None:
+                self._figures.move_to_end(key)
+            return figure
+
+    def put(self, key: str, figure: Dict[str, Any]) -> None:
+        with self._lock:
+            self._figures[key] = figure
+            self._figures.move_to_end(key)
+            while len(self._figures) > self.size:
+                self._figures.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._figures.clear()
+
+
+local = LocalFigures()
+_LOCAL_HITS = metrics.FIGURE_CACHE.labels(result='local')
+_SHARED_HITS = metrics.FIGURE_CACHE.labels(result='shared')
+_MISSES = metrics.FIGURE_CACHE.labels(result='miss')
+
+
+def _shared_get(key: str):
+    try:
+        return caches[CACHE_ALIAS].get(key)
+    except Exception:  # noqa: BLE001 - e.g. Redis unreachable; rebuild instead
+        logger.warning('Figure cache unavailable', exc_info=True)
+        return None
+
+
+def _shared_set(key: str, figure: Dict[str, Any]) -> None:
+    try:
+        caches[CACHE_ALIAS].set(key, figure, CACHE_TTL)
+    except Exception:  # noqa: BLE001
+        logger.warning('Could not store figure in cache', exc_info=True)
+
+
+def cached_figure(source: sources.Source, store: Dict[str, Any] | None) -> Dict[str, Any]:
+    """``build_figure`` through the local and shared caches."""
+
+    store = store or {}
+    key = f'dashboard:figure:{source.event_type}:{data_version(source, store)}'
+    figure = local.get(key)
+    if figure is not None:
+        _LOCAL_HITS.inc()
+        return figure
+
+    figure = _shared_get(key)
+    if figure is not None:
+        _SHARED_HITS.inc()
+    else:
+        _MISSES.inc()
+        figure = build_figure(source, store, with_template=False)
+        _shared_set(key, figure)
+    figure['layout']['template'] = template(source.chart.template)
+    local.put(key, figure)
+    return figure
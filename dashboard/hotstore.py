@@ -0,0 +1,265 @@
+"""Process-local columnar store for the most recent readings of every source.
+
+Each ``(event_type, key)`` series keeps timestamps, row ids and its numeric
+columns in NumPy ring arrays that start small and double up to
+``HOTSTORE_CAPACITY`` rows. The store holds at most ``HOTSTORE_MAX_KEYS``
+keys per source and ``HOTSTORE_MAX_ROWS`` allocated rows in total; past that
+the least recently updated series is dropped. Rows older than
+``HOTSTORE_RETENTION_SECONDS`` are left out of queries. Range queries are
+served by slicing with ``np.searchsorted`` instead of going through the ORM
+and decoding JSON per row.
+
+The store lives where it is read: each web process fills it from the
+broadcasts it receives (see ``dashboard.background``). A source is only
+complete from the moment the process started listening, and stops being
+complete back to the newest row it had to drop (ring overwrite, eviction or
+a lost broadcast). ``covers(event_type, limit)`` is true only when at least
+``limit`` rows within the retention are newer than that point, so a reader
+either gets the true latest rows or falls back to the database.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.utils.timezone import localtime
+
+from . import sources
+
+RETENTION_SECONDS = float(os.environ.get('HOTSTORE_RETENTION_SECONDS', '900'))
+CAPACITY = int(os.environ.get('HOTSTORE_CAPACITY', '4096'))
+MAX_KEYS = int(os.environ.get('HOTSTORE_MAX_KEYS', '20000'))
+MAX_ROWS = int(os.environ.get('HOTSTORE_MAX_ROWS', '1000000'))
+INITIAL_CAPACITY = 16
+
+
+def schema(event_type: str) -> Optional[Tuple[str, Tuple[str, ...]]]:
+    """``(key field, numeric columns)`` of a registered source."""
+
+    source = sources.get(event_type)
+    return (source.key_field, tuple(source.metrics)) if source else None
+
+
+class Series:
+    """Ring buffer of ``(timestamp, id, columns...)`` rows for one key."""
+
+    __slots__ = ('max_capacity', 'times', 'ids', 'values', 'head', 'size', 'ordered')
+
+    def __init__(self, columns: int, capacity: int = CAPACITY, initial: int = INITIAL_CAPACITY):
+        self.max_capacity = capacity
+        initial = min(initial, capacity)
+        self.times = np.zeros(initial, dtype=np.float64)
+        self.ids = np.zeros(initial, dtype=np.int64)
+        self.values = np.full((initial, columns), np.nan, dtype=np.float64)
+        self.head = 0
+        self.size = 0
+        self.ordered = True
+
+    @property
+    def capacity(self) -> int:
+        return self.times.shape[0]
+
+    def _grow(self) -> None:
+        times, ids, values = self._unrolled(sort=False)
+        capacity = min(self.capacity * 2, self.max_capacity)
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.values = np.full((capacity, values.shape[1]), np.nan, dtype=np.float64)
+        self.times[: self.size], self.ids[: self.size], self.values[: self.size] = times, ids, values
+        self.head = self.size
+
+    def append(self, timestamp: float, row_id: int, values: List[float]) -> Tuple[int, Optional[float]]:
+        """Add a row; returns the rows allocated by the call and the timestamp of the row overwritten, if any."""
+
+        allocated = 0
+        if self.size == self.capacity < self.max_capacity:
+            before = self.capacity
+            self._grow()
+            allocated = self.capacity - before
+        dropped = float(self.times[self.head]) if self.size == self.capacity else None
+        if self.size and timestamp < self.times[(self.head - 1) % self.capacity]:
+            self.ordered = False
+        self.times[self.head] = timestamp
+        self.ids[self.head] = row_id
+        self.values[self.head] = values
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        return allocated, dropped
+
+    def newest(self) -> float:
+        return float(self.times[: self.size].max()) if self.size else -np.inf
+
+    def _unrolled(self, sort: bool = True) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        tail = (self.head - self.size) % self.capacity
+        if tail + self.size <= self.capacity:
+            window = slice(tail, tail + self.size)
+            times, ids, values = self.times[window], self.ids[window], self.values[window]
+        else:
+            order = np.r_[tail:self.capacity, 0:self.head]
+            times, ids, values = self.times[order], self.ids[order], self.values[order]
+        if sort and not self.ordered:
+            order = np.argsort(times, kind='stable')
+            times, ids, values = times[order], ids[order], values[order]
+        return times, ids, values
+
+    def query(self, start: Optional[float] = None, end: Optional[float] = None):
+        times, ids, values = self._unrolled()
+        low = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+        high = len(times) if end is None else int(np.searchsorted(times, end, side='right'))
+        return times[low:high], ids[low:high], values[low:high]
+
+
+class HotStore:
+    def __init__(self, max_rows: int = MAX_ROWS):
+        self.max_rows = max_rows
+        self.rows = 0
+        self._series: Dict[str, Dict[str, Series]] = {}
+        self._lru: 'OrderedDict[Tuple[str, str], Series]' = OrderedDict()
+        # Per source: rows newer than this are all in the store.
+        self._complete_after: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Mark every source complete from now on (the process starts listening)."""
+
+        now = time.time()
+        with self._lock:
+            for event_type in sources.names():
+                self._complete_after.setdefault(event_type, now)
+
+    def invalidate(self) -> None:
+        """Events may have been missed: nothing before now is known to be complete."""
+
+        now = time.time()
+        with self._lock:
+            for event_type in sources.names():
+                self._complete_after[event_type] = now
+
+    def _drop_before(self, event_type: str, timestamp: float) -> None:
+        if timestamp > self._complete_after.get(event_type, np.inf):
+            self._complete_after[event_type] = timestamp
+
+    def covers(self, event_type: str, limit: int) -> bool:
+        """True when the latest ``limit`` rows of ``event_type`` are all in the store."""
+
+        with self._lock:
+            after = self._complete_after.get(event_type)
+            if after is None:
+                return False
+            start = max(after, time.time() - RETENTION_SECONDS)
+            count = 0
+            for series in self._series.get(event_type, {}).values():
+                times = series.times[: series.size]
+                count += int(np.count_nonzero(times > start))
+                if count >= limit:
+                    return True
+        return False
+
+    def record(self, event_type: str, key: str, timestamp: float, row_id: int, data: Dict[str, Any]) -> None:
+        spec = schema(event_type)
+        if spec is None or not key:
+            return
+        values = []
+        for column in spec[1]:
+            try:
+                values.append(float(data.get(column)))
+            except (TypeError, ValueError):
+                values.append(np.nan)
+        with self._lock:
+            series_by_key = self._series.setdefault(event_type, {})
+            series = series_by_key.get(key)
+            if series is None:
+                series = series_by_key[key] = Series(len(spec[1]))
+                self.rows += series.capacity
+                if len(series_by_key) > MAX_KEYS:
+                    self._evict(event_type, next(iter(series_by_key)))
+            self._lru[(event_type, key)] = series
+            self._lru.move_to_end((event_type, key))
+            allocated, dropped = series.append(timestamp, row_id, values)
+            self.rows += allocated
+            if dropped is not None:
+                self._drop_before(event_type, dropped)
+            while self.rows > self.max_rows and len(self._lru) > 1:
+                self._evict(*next(iter(self._lru)))
+
+    def _evict(self, event_type: str, key: str) -> None:
+        series = self._series[event_type].pop(key)
+        self._lru.pop((event_type, key), None)
+        self.rows -= series.capacity
+        self._drop_before(event_type, series.newest())
+
+    def keys(self, event_type: str) -> List[str]:
+        return list(self._series.get(event_type, ()))
+
+    def query(
+        self,
+        event_type: str,
+        key: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> Dict[str, np.ndarray]:
+        """Return the columns of ``event_type`` rows in ``[start, end]``.
+
+        Without ``key`` every key is merged in timestamp order and a ``key``
+        column is added.
+        """
+
+        key_field, columns = schema(event_type)
+        if start is None:
+            start = time.time() - RETENTION_SECONDS
+        with self._lock:
+            series_by_key = self._series.get(event_type, {})
+            selected = [key] if key is not None else list(series_by_key)
+            parts = []
+            for name in selected:
+                series = series_by_key.get(name)
+                if series is not None:
+                    parts.append((name, *series.query(start, end)))
+
+        if not parts:
+            empty = {'timestamp': np.empty(0), 'id': np.empty(0, dtype=np.int64)}
+            empty.update({column: np.empty(0) for column in columns})
+            if key is None:
+                empty[key_field] = np.empty(0, dtype=object)
+            return empty
+
+        times = np.concatenate([part[1] for part in parts])
+        ids = np.concatenate([part[2] for part in parts])
+        values = np.concatenate([part[3] for part in parts])
+        result = {'timestamp': times, 'id': ids}
+        if key is None:
+            names = np.concatenate([np.full(len(part[1]), part[0], dtype=object) for part in parts])
+            order = np.argsort(times, kind='stable')
+            result = {'timestamp': times[order], 'id': ids[order], key_field: names[order]}
+            values = values[order]
+        for index, column in enumerate(columns):
+            result[column] = values[:, index]
+        return result
+
+    def recent_rows(self, event_type: str, limit: int) -> List[Dict[str, Any]]:
+        """Latest ``limit`` rows as the dicts used by the Dash store (local time, like the DB path)."""
+
+        key_field, columns = schema(event_type)
+        frame = self.query(event_type)
+        rows = []
+        for index in range(max(len(frame['id']) - limit, 0), len(frame['id'])):
+            timestamp = datetime.fromtimestamp(frame['timestamp'][index], tz=timezone.utc)
+            row: Dict[str, Any] = {
+                'id': int(frame['id'][index]),
+                key_field: frame[key_field][index],
+                'timestamp': localtime(timestamp).isoformat(),
+            }
+            for column in columns:
+                value = frame[column][index]
+                row[column] = None if np.isnan(value) else float(value)
+            rows.append(row)
+        return rows
+
+
+store = HotStore()
@@ -0,0 +1,130 @@
+"""Groups the messages admitted by the bridges into batched ingest tasks.
+
+A task per message costs a broker round trip, a lookup and a committed
+INSERT per message. The bridges instead buffer admitted messages per Celery
+priority and send one ``tasks.ingest_batch`` once a buffer holds
+``DASHBOARD_INGEST_BATCH_SIZE`` messages or its oldest message has waited
+``DASHBOARD_INGEST_BATCH_MS``. The worker stores a batch with one
+``message_key`` lookup and one INSERT per source (``tasks.persist_events``),
+so a redelivery storm costs one conflict check per batch instead of a
+rejected INSERT per message.
+
+The ingest queue holds batches, so admission control scales its depth by
+the average batch size (``messages_per_task``). With a batch size of 1
+every message is sent as its own task, as before. Messages still buffered
+when the bridge process is killed are lost, like messages the broker never
+received: at most one interval's worth.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .. import metrics, tasks, tracing
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.environ.get('DASHBOARD_INGEST_BATCH_SIZE', '200'))
+BATCH_SECONDS = float(os.environ.get('DASHBOARD_INGEST_BATCH_MS', '50')) / 1000
+
+
+def _send(batch: List[Dict[str, Any]], priority: int) -> None:
+    metrics.INGEST_BATCH_SIZE.observe(len(batch))
+    tasks.ingest_batch.apply_async((batch,), priority=priority)
+
+
+class Batcher:
+    """Per-priority buffers flushed by size from ``add`` and by age from a thread."""
+
+    def __init__(
+        self,
+        send: Callable[[List[Dict[str, Any]], int], None] = _send,
+        size: int = BATCH_SIZE,
+        interval: float = BATCH_SECONDS,
+    ):
+        self.send = send
+        self.size = size
+        self.interval = interval
+        self._pending: Dict[int, List[Dict[str, Any]]] = {}
+        self._since: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        # Moving average of the batch sizes sent.
+        self.average = 1.0
+
+    def add(self, message: Dict[str, Any], priority: int) -> None:
+        with self._lock:
+            batch = self._pending.setdefault(priority, [])
+            if not batch:
+                self._since[priority] = time.monotonic()
+            batch.append(message)
+            full = self._pending.pop(priority) if len(batch) >= self.size else None
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._flush_forever, name='ingest-batcher', daemon=True)
+                self._thread.start()
+        if full:
+            self._send(full, priority)
+
+    def flush(self, older_than: float = 0.0) -> None:
+        """Send every buffer whose oldest message waited at least ``older_than`` seconds."""
+
+        now = time.monotonic()
+        with self._lock:
+            due = [priority for priority in self._pending if now - self._since[priority] >= older_than]
+            batches = [(priority, self._pending.pop(priority)) for priority in due]
+        for priority, batch in batches:
+            self._send(batch, priority)
+
+    def _send(self, batch: List[Dict[str, Any]], priority: int) -> None:
+        self.average += 0.1 * (len(batch) - self.average)
+        self.send(batch, priority)
+
+    def _flush_forever(self) -> None:  # pragma: no cover - runs for the life of the bridge
+        while True:
+            time.sleep(self.interval / 2)
+            try:
+                self.flush(self.interval)
+            except Exception:  # noqa: BLE001 - keep flushing; the broker may come back
+                logger.warning('Could not send an ingest batch', exc_info=True)
+
+
+_batcher = Batcher()
+
+
+def submit(
+    transport: str,
+    topic: str,
+    message: Any,
+    priority: int,
+    message_id: Optional[str] = None,
+) -> None:
+    """Hand one admitted ``mqtt`` or ``kafka`` message to the ingest workers."""
+
+    # Taken here so a retried task hashes the same message_key.
+    received_at = time.time()
+    trace = tracing.start()
+    if BATCH_SIZE <= 1:
+        options: Dict[str, Any] = {'trace': trace, 'received_at': received_at, 'message_id': message_id}
+        if transport == 'kafka':
+            tasks.ingest_kafka_message.apply_async((topic, message), options, priority=priority)
+        else:
+            tasks.ingest_mqtt_message.apply_async((topic, message), options, priority=priority)
+        return
+    item = {'transport': transport, 'topic': topic, 'message': message, 'received_at': received_at}
+    if trace is not None:
+        item['trace'] = trace
+    if message_id is not None:
+        item['message_id'] = message_id
+    _batcher.add(item, priority)
+
+
+def flush() -> None:
+    _batcher.flush()
+
+
+def messages_per_task() -> float:
+    return _batcher.average if BATCH_SIZE > 1 else 1.0
@@ -10,11 +10,24 @@ from typing import Iterable
 
 from kafka import KafkaConsumer
 
-from .. import tasks
+from .. import admission, profiling
+from . import batching
 
 logger = logging.getLogger(__name__)
 
 
+@profiling.profiled('kafka_bridge')
+def _forward(message) -> None:
+    stream = message.value.get('stream') if isinstance(message.value, dict) else None
+    priority = admission.admit(message.topic, stream if isinstance(stream, str) else None)
+    if priority is None:
+        return
+    # Partition and offset identify the record, so a rebalance that
+    # re-reads it does not store it twice.
+    message_id = f'{message.topic}:{message.partition}:{message.offset}'
+    batching.submit('kafka', message.topic, message.value, priority, message_id=message_id)
+
+
 def start_kafka_bridge(topics: Iterable[str] | None = None) -> None:
     bootstrap_servers = os.environ.get('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092')
     group_id = os.environ.get('KAFKA_GROUP_ID', 'dashboard-consumer')
@@ -32,7 +45,7 @@ def start_kafka_bridge(topics: Iterable[str] | None = None) -> None:
     def _consume():  # pragma: no cover - network loop
         logger.info('Kafka consumer listening on %s for topics %s', bootstrap_servers, topics)
         for message in consumer:
-            tasks.ingest_kafka_message.delay(message.topic, message.value)
+            _forward(message)
 
     thread = threading.Thread(target=_consume, daemon=True)
     thread.start()
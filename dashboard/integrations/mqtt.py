@@ -5,14 +5,24 @@ from __future__ import annotations
 import logging
 import os
 import threading
-from typing import Iterable
+import uuid
+from typing import Dict, Iterable
 
 import paho.mqtt.client as mqtt
 
-from .. import tasks
+from .. import admission, profiling
+from . import batching
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_TOPICS = 'sensors/temperature'
+
+
+def subscribed_topics() -> list[str]:
+    """Topic filters the bridge subscribes to (``MQTT_TOPICS``)."""
+
+    return [topic.strip() for topic in os.environ.get('MQTT_TOPICS', DEFAULT_TOPICS).split(',') if topic.strip()]
+
 
 def _on_connect(client: mqtt.Client, userdata, flags, rc):  # pragma: no cover - network callback
     if rc != 0:
@@ -24,9 +34,41 @@ def _on_connect(client: mqtt.Client, userdata, flags, rc):  # pragma: no cover -
         logger.info('Subscribed to topic %s', topic)
 
 
+class Deliveries:
+    """Transport identity of the messages this bridge receives.
+
+    MQTT packet ids (``mid``) are only unique while a QoS 1/2 message is in
+    flight and are reused once acknowledged, so the bridge numbers the
+    deliveries of its session itself. A redelivery (``dup`` set, same
+    ``mid``) gets the number of the first delivery, so it maps to the row
+    that one produced. QoS 0 messages are never redelivered.
+    """
+
+    def __init__(self, session: str | None = None):
+        self.session = session or uuid.uuid4().hex
+        self._count = 0
+        self._by_mid: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def identify(self, msg: mqtt.MQTTMessage) -> str:
+        with self._lock:
+            number = self._by_mid.get(msg.mid) if msg.dup else None
+            if number is None:
+                self._count += 1
+                number = self._count
+                if msg.qos > 0:
+                    # At most 65535 entries: mids are 16-bit.
+                    self._by_mid[msg.mid] = number
+        return f'mqtt:{self.session}:{number}'
+
+
+@profiling.profiled('mqtt_bridge')
 def _on_message(client: mqtt.Client, userdata, msg: mqtt.MQTTMessage):  # pragma: no cover - network callback
+    priority = admission.admit(msg.topic)
+    if priority is None:
+        return
     payload = msg.payload.decode('utf-8') if isinstance(msg.payload, (bytes, bytearray)) else msg.payload
-    tasks.ingest_mqtt_message.delay(msg.topic, payload)
+    batching.submit('mqtt', msg.topic, payload, priority, message_id=userdata['deliveries'].identify(msg))
 
 
 def start_mqtt_bridge(topics: Iterable[str] | None = None) -> None:
@@ -34,10 +76,10 @@ def start_mqtt_bridge(topics: Iterable[str] | None = None) -> None:
 
     host = os.environ.get('MQTT_HOST', '127.0.0.1')
     port = int(os.environ.get('MQTT_PORT', '1883'))
-    topics = list(topics or os.environ.get('MQTT_TOPICS', 'sensors/temperature').split(','))
+    topics = list(topics or subscribed_topics())
 
     client = mqtt.Client()
-    client.user_data_set({'topics': topics})
+    client.user_data_set({'topics': topics, 'deliveries': Deliveries()})
     client.on_connect = _on_connect
     client.on_message = _on_message
 
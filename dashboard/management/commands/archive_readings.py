@@ -0,0 +1,57 @@
+"""Archives aged-out readings to Parquet or summarizes the archive."""
+
+from __future__ import annotations
+
+import time
+
+import pyarrow.compute as pc
+from django.core.management.base import BaseCommand
+
+from ... import archive, sources, tasks
+from ...snapshot import iso_datetime
+
+
+class Command(BaseCommand):
+    help = 'Move readings older than N days into Parquet files, or query the archive with --query.'
+
+    def add_arguments(self, parser):  # pragma: no cover - argument wiring
+        parser.add_argument('--older-than-days', type=int, default=None, help='Defaults to DASHBOARD_ARCHIVE_AFTER_DAYS')
+        parser.add_argument('--query', choices=sorted(sources.names()), help='Summarize archived rows of this type')
+        parser.add_argument('--since', type=iso_datetime, help='ISO start of the query range')
+        parser.add_argument('--until', type=iso_datetime, help='ISO end of the query range')
+        parser.add_argument('--key', action='append', help='Restrict the query to one key of the source')
+
+    def handle(self, *args, **options):
+        if options['query']:
+            self._query(options)
+            return
+
+        started = time.perf_counter()
+        archived = tasks.archive_old_readings.run(options['older_than_days'])
+        elapsed = time.perf_counter() - started
+        total = sum(archived.values())
+        for event_type, count in archived.items():
+            self.stdout.write(f'{event_type}: {count} rows archived')
+        self.stdout.write(self.style.SUCCESS(f'{total} rows archived to {archive.archive_root()} in {elapsed:.1f}s'))
+
+    def _query(self, options):
+        event_type = options['query']
+        started = time.perf_counter()
+        table = archive.read_archive(
+            event_type,
+            start=options['since'],
+            end=options['until'],
+            keys=options['key'],
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{table.num_rows} archived {event_type} rows read in {elapsed * 1000:.1f}ms')
+        if not table.num_rows:
+            return
+        for column in sources.get(event_type).metrics:
+            values = table[column]
+            stats = pc.min_max(values).as_py()
+            self.stdout.write(
+                f'  {column}: min={stats["min"]} mean={pc.mean(values).as_py()} max={stats["max"]}'
+            )
+        first, last = table['created_at'][0].as_py(), table['created_at'][-1].as_py()
+        self.stdout.write(f'  range: {first.isoformat()} .. {last.isoformat()}')
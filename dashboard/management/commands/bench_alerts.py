@@ -0,0 +1,65 @@
+"""Benchmarks alert rule evaluation throughput against the number of rules."""
+
+from __future__ import annotations
+
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from ...alerts import KINDS, AlertEngine
+
+
+def _synthetic_rules(count: int, rng: np.random.Generator):
+    rules = []
+    for index in range(count):
+        kind = KINDS[index % len(KINDS)]
+        rule = {
+            'name': f'bench-{index}',
+            'kind': kind,
+            'pattern': f'sensors/{index % 10}/*' if index % 4 else 'sensors/*',
+            'cooldown': 0,
+        }
+        if kind == 'threshold':
+            rule['above'] = float(rng.uniform(60, 120))
+        elif kind == 'zscore':
+            rule['threshold'] = float(rng.uniform(2.5, 5))
+        else:
+            rule['band'] = float(rng.uniform(5, 20))
+        rules.append(rule)
+    return rules
+
+
+class Command(BaseCommand):
+    help = 'Measure AlertEngine readings/second for increasing rule counts (no DB or broadcast).'
+
+    def add_arguments(self, parser):  # pragma: no cover - argument wiring
+        parser.add_argument('--rules', default='1,10,100,1000', help='Comma separated rule counts')
+        parser.add_argument('--readings', type=int, default=100000, help='Readings evaluated per rule count')
+        parser.add_argument('--batch', type=int, default=500, help='Readings per evaluate() call')
+        parser.add_argument('--sources', type=int, default=1000, help='Distinct sensor topics')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        readings = options['readings']
+        batch = max(options['batch'], 1)
+        topics = [f'sensors/{index % 10}/{index}' for index in range(options['sources'])]
+        source_index = rng.integers(0, len(topics), readings)
+        sources = [topics[index] for index in source_index]
+        values = rng.normal(40, 10, readings)
+        timestamps = time.time() + np.arange(readings) * 0.001
+
+        self.stdout.write(f'{readings} readings, batch={batch}, {len(topics)} sources')
+        for count in [int(value) for value in options['rules'].split(',') if value.strip()]:
+            engine = AlertEngine(_synthetic_rules(count, rng), max_per_minute=10 ** 9)
+            fired = 0
+            started = time.perf_counter()
+            for offset in range(0, readings, batch):
+                end = offset + batch
+                fired += len(engine.evaluate(sources[offset:end], values[offset:end], timestamps[offset:end]))
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'rules={count:>5}: {readings / elapsed:>10.0f} readings/s '
+                f'({readings * count / elapsed:>12.0f} rule checks/s, {fired} alerts)'
+            )
@@ -0,0 +1,139 @@
+"""Benchmarks WebSocket fan-out and connection capacity against the Daphne worker count."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import resource
+import time
+
+from autobahn.asyncio.websocket import WebSocketClientFactory, WebSocketClientProtocol
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ...realtime import DASHBOARD_GROUP
+from .generate_load import _percentile
+from .serve_asgi import bind_socket, spawn_workers, stop_workers
+
+
+class BenchClient(WebSocketClientProtocol):
+    def onMessage(self, payload, is_binary):  # noqa: N802 - autobahn API
+        event = json.loads(payload)
+        if event.get('event_type') == 'bench':
+            self.factory.deliveries.append(time.time() - event['data']['sent'])
+
+
+class Command(BaseCommand):
+    help = 'Measure broadcast deliveries/s and WebSocket connections per Daphne worker count.'
+
+    def add_arguments(self, parser):  # pragma: no cover - argument wiring
+        parser.add_argument('--workers', default='1,2,4', help='Comma separated worker counts to compare')
+        parser.add_argument('--clients', type=int, default=1000, help='WebSocket connections to open')
+        parser.add_argument('--messages', type=int, default=200, help='Broadcasts sent per run')
+        parser.add_argument('--rate', type=float, default=0, help='Broadcasts per second (0 = as fast as possible)')
+        parser.add_argument('--connect-concurrency', type=int, default=200)
+        parser.add_argument('--timeout', type=float, default=60.0, help='Seconds to wait for deliveries')
+
+    def handle(self, *args, **options):
+        if settings.CHANNEL_LAYERS['default']['BACKEND'].endswith('InMemoryChannelLayer'):
+            raise CommandError('The benchmark broadcasts from this process; use CHANNEL_LAYER_BACKEND=redis or redis-pubsub.')
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+        counts = [int(count) for count in options['workers'].split(',') if count.strip()]
+        self.stdout.write(
+            f"{settings.CHANNEL_LAYERS['default']['BACKEND']} over {len(settings.CHANNEL_REDIS_HOSTS)} Redis host(s), "
+            f"{options['clients']} clients, {options['messages']} broadcasts"
+        )
+        self.stdout.write('workers  connected  conn/s  sent/s  deliveries/s  lost  p50 ms  p99 ms')
+        for workers in counts:
+            listener = bind_socket('127.0.0.1', 0)
+            processes = spawn_workers(listener, workers, quiet=True)
+            try:
+                result = asyncio.run(self._run(listener.getsockname()[1], options))
+            finally:
+                stop_workers(processes)
+                listener.close()
+            self.stdout.write(
+                f"{workers:>7}  {result['connected']:>9}  {result['connect_rate']:>6.0f}  {result['send_rate']:>6.0f}  "
+                f"{result['delivery_rate']:>12.0f}  {result['lost']:>4}  {result['p50']:>6.1f}  {result['p99']:>6.1f}"
+            )
+
+    async def _run(self, port: int, options) -> dict:
+        loop = asyncio.get_running_loop()
+        factory = WebSocketClientFactory(f'ws://127.0.0.1:{port}/ws/dashboard/')
+        factory.protocol = BenchClient
+        factory.deliveries = []
+        await self._wait_until_listening(loop, factory, port)
+
+        semaphore = asyncio.Semaphore(options['connect_concurrency'])
+        clients = []
+
+        async def connect():
+            async with semaphore:
+                try:
+                    _, protocol = await loop.create_connection(factory, '127.0.0.1', port)
+                    await asyncio.wait_for(protocol.is_open, 10)
+                except (OSError, asyncio.TimeoutError):
+                    return
+                clients.append(protocol)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(connect() for _ in range(options['clients'])))
+        connect_elapsed = time.perf_counter() - started
+        # group_add runs right after the handshake; give the last ones a moment.
+        await asyncio.sleep(1.0)
+
+        layer = get_channel_layer()
+        interval = 1.0 / options['rate'] if options['rate'] > 0 else 0
+        started = time.perf_counter()
+        for index in range(options['messages']):
+            message = {'type': 'dashboard_update', 'data': {'event_type': 'bench', 'data': {'n': index, 'sent': time.time()}}}
+            await layer.group_send(DASHBOARD_GROUP, message)
+            if interval:
+                await asyncio.sleep(max(started + (index + 1) * interval - time.perf_counter(), 0))
+        send_elapsed = time.perf_counter() - started
+
+        expected = len(clients) * options['messages']
+        deadline = time.perf_counter() + options['timeout']
+        while len(factory.deliveries) < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        delivery_elapsed = time.perf_counter() - started
+
+        for client in clients:
+            client.sendClose()
+        await asyncio.sleep(0.5)
+
+        latencies = sorted(factory.deliveries)
+        return {
+            'connected': len(clients),
+            'connect_rate': len(clients) / connect_elapsed if connect_elapsed else math.nan,
+            'send_rate': options['messages'] / send_elapsed if send_elapsed else math.nan,
+            'delivery_rate': len(latencies) / delivery_elapsed if delivery_elapsed else math.nan,
+            'lost': expected - len(latencies),
+            'p50': _percentile(latencies, 0.50) * 1000,
+            'p99': _percentile(latencies, 0.99) * 1000,
+        }
+
+    @staticmethod
+    async def _wait_until_listening(loop, factory, port: int, timeout: float = 30.0) -> None:
+        """Wait until the Daphne workers have loaded Django and accept handshakes."""
+
+        started = time.perf_counter()
+        deadline = started + timeout
+        while time.perf_counter() < deadline:
+            try:
+                _, protocol = await loop.create_connection(factory, '127.0.0.1', port)
+                await asyncio.wait_for(protocol.is_open, 5)
+            except (OSError, asyncio.TimeoutError):
+                await asyncio.sleep(0.2)
+                continue
+            protocol.sendClose()
+            # Workers start together; give the slower ones as long again so
+            # connections are not all accepted by the first one ready.
+            await asyncio.sleep(time.perf_counter() - started)
+            return
+        raise CommandError('Daphne workers did not start in time.')
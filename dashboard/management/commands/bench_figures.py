@@ -0,0 +1,84 @@
+"""Benchmarks Dash figure rendering cost per event against the number of viewers."""
+
+from __future__ import annotations
+
+import random
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+from ... import figures, sources
+from ...snapshot import MAX_POINTS, default_state
+
+MODES = ('graph_objects', 'dicts', 'cached')
+
+
+def _row(source: sources.Source, index: int, rng: random.Random) -> dict:
+    key = f'{source.event_type}-{index % 5}'
+    payload = {
+        'value': rng.uniform(0, 100),
+        '05. price': rng.uniform(10, 400),
+        '06. volume': rng.randint(100, 50000),
+        'congestion_index': rng.random(),
+        'main': {'temp': rng.uniform(10, 35), 'humidity': rng.randint(30, 95)},
+    }
+    return source.row(index, key, datetime.now(tz=timezone.utc).isoformat(), payload)
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the server-side render cost of one store update as the number of viewers grows: '
+        'validated graph objects, plain dicts and the shared figure cache.'
+    )
+
+    def add_arguments(self, parser):  # pragma: no cover - argument wiring
+        parser.add_argument('--viewers', default='1,10,50,100', help='Comma separated viewer counts')
+        parser.add_argument('--events', type=int, default=50, help='Store updates per viewer count')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--serialize',
+            action='store_true',
+            help='Also time the JSON encoding Dash does for every response (the same for all modes)',
+        )
+
+    def handle(self, *args, **options):
+        import plotly.graph_objects as go
+        from plotly.io.json import to_json_plotly
+
+        charted = [source for source in sources.all_sources() if source.chart is not None]
+        cache = caches[figures.CACHE_ALIAS]
+        renderers = {
+            'graph_objects': lambda source, store: go.Figure(figures.build_figure(source, store)),
+            'dicts': figures.build_figure,
+            'cached': figures.cached_figure,
+        }
+
+        encode = to_json_plotly if options['serialize'] else (lambda figure: figure)
+        self.stdout.write(f'{len(charted)} charts, {MAX_POINTS} points per series, {options["events"]} events')
+        self.stdout.write('viewers  ' + '  '.join(f'{mode + " ms/event":>22}' for mode in MODES))
+        for viewers in [int(value) for value in options['viewers'].split(',') if value.strip()]:
+            timings = {}
+            for mode in MODES:
+                rng = random.Random(options['seed'])
+                store = default_state()
+                # Start from full windows, as a dashboard that has been open for a while.
+                for source in charted:
+                    store[source.event_type] = [_row(source, -index, rng) for index in range(MAX_POINTS, 0, -1)]
+                cache.clear()
+                figures.local.clear()
+                elapsed = 0.0
+                for index in range(options['events']):
+                    source = rng.choice(charted)
+                    bucket = store[source.event_type]
+                    bucket.append(_row(source, index, rng))
+                    store[source.event_type] = bucket[-MAX_POINTS:]
+                    # Every viewer's callbacks run for each chart on every store update.
+                    started = time.perf_counter()
+                    for _ in range(viewers):
+                        for chart_source in charted:
+                            encode(renderers[mode](chart_source, store))
+                    elapsed += time.perf_counter() - started
+                timings[mode] = elapsed / options['events'] * 1000
+            self.stdout.write(f'{viewers:>7}  ' + '  '.join(f'{timings[mode]:>22.1f}' for mode in MODES))
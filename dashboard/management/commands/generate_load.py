@@ -0,0 +1,302 @@
+"""Generates synthetic event streams and reports ingest throughput."""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import random
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+from prometheus_client import REGISTRY
+
+from ... import sources, tasks
+
+STREAMS = ('sensor', 'finance', 'traffic', 'weather')
+SYMBOLS = ('AAPL', 'MSFT', 'GOOGL', 'AMZN', 'PETR4.SA', 'VALE3.SA')
+REGIONS = ('SP-01', 'SP-02', 'SP-03', 'RJ-01')
+LOCATIONS = ('Sao Paulo,BR', 'Rio de Janeiro,BR', 'Curitiba,BR')
+
+Event = Tuple[str, str, Dict[str, Any]]
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return math.nan
+    index = min(int(round(fraction * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+class EventFactory:
+    """Random-walk generators producing payloads shaped like the real sources."""
+
+    def __init__(self, run_id: str, sensors: int, seed: Optional[int] = None):
+        self.run_id = run_id
+        self.random = random.Random(seed)
+        self.sensor_values = {f'sensors/load/{index}': 20.0 for index in range(sensors)}
+        self.prices = {symbol: self.random.uniform(10, 400) for symbol in SYMBOLS}
+        self.congestion = {region: 0.3 for region in REGIONS}
+        self.temperature = {location: 22.0 for location in LOCATIONS}
+
+    def _walk(self, value: float, step: float, low: float, high: float) -> float:
+        return min(max(value + self.random.gauss(0, step), low), high)
+
+    def sensor(self) -> Event:
+        topic = self.random.choice(list(self.sensor_values))
+        value = self._walk(self.sensor_values[topic], 0.5, -40, 120)
+        self.sensor_values[topic] = value
+        return 'sensor', topic, {'value': round(value, 3), 'unit': 'C'}
+
+    def finance(self) -> Event:
+        symbol = self.random.choice(SYMBOLS)
+        price = self._walk(self.prices[symbol], self.prices[symbol] * 0.002, 0.01, 1e6)
+        self.prices[symbol] = price
+        quote = {
+            '01. symbol': symbol,
+            '05. price': f'{price:.4f}',
+            '06. volume': str(self.random.randint(100, 50000)),
+            '07. latest trading day': time.strftime('%Y-%m-%d'),
+        }
+        return 'finance', symbol, quote
+
+    def traffic(self) -> Event:
+        region = self.random.choice(REGIONS)
+        congestion = self._walk(self.congestion[region], 0.02, 0, 1)
+        self.congestion[region] = congestion
+        return 'traffic', region, {'congestion_index': round(congestion, 4)}
+
+    def weather(self) -> Event:
+        location = self.random.choice(LOCATIONS)
+        temperature = self._walk(self.temperature[location], 0.1, -10, 45)
+        self.temperature[location] = temperature
+        main = {'temp': round(temperature, 2), 'humidity': self.random.randint(30, 95)}
+        return 'weather', location, {'name': location, 'main': main}
+
+    def stream(self, streams: List[str]) -> Iterator[Event]:
+        generators: List[Callable[[], Event]] = [getattr(self, name) for name in streams]
+        while True:
+            stream, key, payload = self.random.choice(generators)()
+            payload['run_id'] = self.run_id
+            payload['sent_at'] = time.time()
+            yield stream, key, payload
+
+
+class DirectSink:
+    """Calls the ingest path in-process, bypassing the broker."""
+
+    def send(self, stream: str, key: str, payload: Dict[str, Any]) -> None:
+        if stream == 'sensor':
+            tasks.ingest_mqtt_message(key, json.dumps(payload))
+            return
+        tasks.persist_event(sources.get(stream), key, payload)
+
+    def close(self) -> None:
+        pass
+
+
+class MqttSink:
+    def __init__(self):
+        import paho.mqtt.client as mqtt
+
+        from ...integrations.mqtt import subscribed_topics
+
+        self.subscriptions = subscribed_topics()
+        self.client = mqtt.Client()
+        username = os.environ.get('MQTT_USERNAME')
+        password = os.environ.get('MQTT_PASSWORD')
+        if username and password:
+            self.client.username_pw_set(username, password)
+        self.client.connect(os.environ.get('MQTT_HOST', '127.0.0.1'), int(os.environ.get('MQTT_PORT', '1883')))
+        self.client.loop_start()
+
+    @staticmethod
+    def topic(stream: str, key: str) -> str:
+        return key if stream == 'sensor' else f'{stream}/{key}'
+
+    def unsubscribed(self, events: List[Event]) -> List[str]:
+        """Topics of ``events`` that the bridge's ``MQTT_TOPICS`` do not match."""
+
+        from paho.mqtt.client import topic_matches_sub
+
+        topics = {self.topic(stream, key) for stream, key, _ in events}
+        return sorted(
+            topic for topic in topics if not any(topic_matches_sub(sub, topic) for sub in self.subscriptions)
+        )
+
+    def send(self, stream: str, key: str, payload: Dict[str, Any]) -> None:
+        self.client.publish(self.topic(stream, key), json.dumps(payload), qos=0)
+
+    def close(self) -> None:
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+class KafkaSink:
+    def __init__(self):
+        from kafka import KafkaProducer
+
+        self.topic = os.environ.get('KAFKA_TOPICS', 'dashboard-events').split(',')[0]
+        self.producer = KafkaProducer(
+            bootstrap_servers=os.environ.get('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092'),
+            value_serializer=lambda value: json.dumps(value).encode('utf-8'),
+            linger_ms=5,
+        )
+
+    def send(self, stream: str, key: str, payload: Dict[str, Any]) -> None:
+        self.producer.send(self.topic, {'stream': stream, 'key': key, **payload})
+
+    def close(self) -> None:
+        self.producer.flush()
+        self.producer.close()
+
+
+SINKS = {'direct': DirectSink, 'mqtt': MqttSink, 'kafka': KafkaSink}
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic sensor/finance/traffic/weather events and report ingest throughput and latency.'
+
+    def add_arguments(self, parser):  # pragma: no cover - argument wiring
+        parser.add_argument('--target', choices=sorted(SINKS), default='direct', help='Where to send events')
+        parser.add_argument('--rate', type=float, default=200.0, help='Events per second (0 = as fast as possible)')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds to generate events for')
+        parser.add_argument('--streams', default=','.join(STREAMS), help='Comma separated subset of %s' % ', '.join(STREAMS))
+        parser.add_argument('--sensors', type=int, default=50, help='Number of distinct sensor topics')
+        parser.add_argument('--drain', type=float, default=5.0, help='Seconds to wait for workers before measuring (mqtt/kafka)')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible streams')
+
+    def handle(self, *args, **options):
+        streams = [name.strip() for name in options['streams'].split(',') if name.strip()]
+        unknown = set(streams) - set(STREAMS)
+        if unknown:
+            raise CommandError(f'Unknown streams: {", ".join(sorted(unknown))}')
+
+        target = options['target']
+        try:
+            sink = SINKS[target]()
+        except ImportError as exc:
+            raise CommandError(f'Client library for {target} is not installed: {exc}') from exc
+        except Exception as exc:
+            raise CommandError(f'Unable to connect to {target}: {exc}') from exc
+
+        run_id = uuid.uuid4().hex
+        factory = EventFactory(run_id, options['sensors'], options['seed'])
+        if isinstance(sink, MqttSink):
+            self._check_subscriptions(sink, factory, streams)
+        rate = options['rate']
+        interval = 1.0 / rate if rate > 0 else 0.0
+        duration = options['duration']
+
+        rows_before = self._row_count()
+        broadcasts_before = self._broadcast_count()
+        send_latencies: List[float] = []
+        self.stdout.write(self.style.NOTICE(f'Run {run_id}: sending to {target} for {duration:.0f}s at {rate or "max"} ev/s'))
+
+        started = time.perf_counter()
+        deadline = started + duration
+        sent = 0
+        events = factory.stream(streams)
+        try:
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                if interval:
+                    due = started + sent * interval
+                    if due > now:
+                        time.sleep(due - now)
+                stream, key, payload = next(events)
+                call_started = time.perf_counter()
+                sink.send(stream, key, payload)
+                send_latencies.append(time.perf_counter() - call_started)
+                sent += 1
+        finally:
+            sink.close()
+        elapsed = time.perf_counter() - started
+
+        if target != 'direct' and options['drain'] > 0:
+            self.stdout.write(f'Waiting {options["drain"]:.1f}s for workers to drain...')
+            time.sleep(options['drain'])
+        measured = time.perf_counter() - started
+
+        rows_written = self._row_count() - rows_before
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} events in {elapsed:.2f}s ({sent / elapsed:.1f} ev/s)'))
+        self.stdout.write(f'DB writes: {rows_written} rows ({rows_written / measured:.1f} rows/s)')
+
+        if target == 'direct':
+            broadcasts = self._broadcast_count() - broadcasts_before
+            self.stdout.write(f'Broadcasts: {broadcasts:.0f} ({broadcasts / elapsed:.1f}/s)')
+            self._report_percentiles('Ingest call latency', send_latencies)
+        else:
+            self.stdout.write('Broadcasts: happen in the Celery workers; see dashboard_broadcast_seconds on /metrics')
+            self._report_percentiles('Publish call latency', send_latencies)
+            self._report_percentiles('Publish-to-DB latency', self._end_to_end_latencies(run_id))
+            if sent and not rows_written:
+                self.stderr.write(
+                    self.style.ERROR(
+                        'No rows were stored: check that the bridge and the Celery workers are running'
+                        + (' and that MQTT_TOPICS covers the generated topics' if target == 'mqtt' else '')
+                    )
+                )
+
+    def _check_subscriptions(self, sink: MqttSink, factory: EventFactory, streams: List[str]) -> None:
+        # MQTT_TOPICS is read from this command's environment, which should match the bridge's.
+        samples = [(stream, key, {}) for stream in streams for key in self._keys(factory, stream)]
+        missing = sink.unsubscribed(samples)
+        if missing:
+            shown = ', '.join(missing[:5]) + (', ...' if len(missing) > 5 else '')
+            self.stderr.write(
+                self.style.WARNING(
+                    f'{len(missing)} generated topic(s) are not covered by MQTT_TOPICS={",".join(sink.subscriptions)} '
+                    f'({shown}); the bridge will not receive them. Run the bridge with '
+                    'MQTT_TOPICS=sensors/#,finance/#,traffic/#,weather/#'
+                )
+            )
+
+    @staticmethod
+    def _keys(factory: EventFactory, stream: str) -> List[str]:
+        return {
+            'sensor': list(factory.sensor_values),
+            'finance': list(factory.prices),
+            'traffic': list(factory.congestion),
+            'weather': list(factory.temperature),
+        }[stream]
+
+    @staticmethod
+    def _row_count() -> int:
+        return sum(source.model.objects.count() for source in sources.all_sources())
+
+    @staticmethod
+    def _broadcast_count() -> float:
+        total = 0.0
+        for metric in REGISTRY.collect():
+            if metric.name != 'dashboard_broadcast_seconds':
+                continue
+            for sample in metric.samples:
+                if sample.name.endswith('_count'):
+                    total += sample.value
+        return total
+
+    @staticmethod
+    def _end_to_end_latencies(run_id: str) -> List[float]:
+        latencies = []
+        for source in sources.all_sources():
+            rows = source.model.objects.filter(payload__run_id=run_id).values_list('created_at', 'payload')
+            for created_at, payload in rows.iterator(chunk_size=2000):
+                sent_at = payload.get('sent_at') if isinstance(payload, dict) else None
+                if sent_at is not None:
+                    latencies.append(max(created_at.timestamp() - float(sent_at), 0.0))
+        return latencies
+
+    def _report_percentiles(self, label: str, values: List[float]) -> None:
+        if not values:
+            self.stdout.write(f'{label}: no samples')
+            return
+        values = sorted(values)
+        p50, p95, p99 = (_percentile(values, q) * 1000 for q in (0.5, 0.95, 0.99))
+        self.stdout.write(
+            f'{label} (n={len(values)}): p50={p50:.2f}ms p95={p95:.2f}ms p99={p99:.2f}ms max={values[-1] * 1000:.2f}ms'
+        )
@@ -0,0 +1,74 @@
+"""Measures process startup cost for web and headless (Celery) processes."""
+
+from __future__ import annotations
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+HEAVY_MODULES = ('dash', 'plotly', 'plotly.graph_objects', 'dash_extensions')
+
+PROBE = """
+import json, os, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter() - started
+dash_app = None
+if os.environ.get('PROBE_LOAD_DASH') == '1':
+    from django_plotly_dash.dash_wrapper import get_local_stateless_by_name
+    loaded = time.perf_counter()
+    get_local_stateless_by_name('RealTimeDashboard')
+    dash_app = time.perf_counter() - loaded
+heavy = [name for name in json.loads(os.environ['PROBE_HEAVY']) if name in sys.modules]
+print(json.dumps({'setup': setup, 'dash_app': dash_app, 'heavy': heavy}))
+"""
+
+SCENARIOS = (
+    ('celery worker (DASHBOARD_HEADLESS=1)', {'DASHBOARD_HEADLESS': '1'}),
+    ('web process, before first page', {'DASHBOARD_HEADLESS': '0'}),
+    ('web process, first Dash lookup', {'DASHBOARD_HEADLESS': '0', 'PROBE_LOAD_DASH': '1'}),
+)
+
+
+class Command(BaseCommand):
+    help = 'Measure django.setup() time and heavy imports for headless and web processes in fresh interpreters.'
+
+    def add_arguments(self, parser):  # pragma: no cover - argument wiring
+        parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per scenario')
+
+    def handle(self, *args, **options):
+        repeat = max(options['repeat'], 1)
+        for label, overrides in SCENARIOS:
+            runs = [self._probe(overrides) for _ in range(repeat)]
+            setup = statistics.median(run['setup'] for run in runs) * 1000
+            line = f'{label}: django.setup() median {setup:.0f}ms'
+            dash_times = [run['dash_app'] for run in runs if run['dash_app'] is not None]
+            if dash_times:
+                line += f', Dash app load median {statistics.median(dash_times) * 1000:.0f}ms'
+            heavy = runs[-1]['heavy']
+            line += f'; heavy modules loaded: {", ".join(heavy) if heavy else "none"}'
+            self.stdout.write(line)
+
+    @staticmethod
+    def _probe(overrides):
+        env = dict(os.environ)
+        env.pop('PROBE_LOAD_DASH', None)
+        env.update(overrides)
+        env['PROBE_HEAVY'] = json.dumps(HEAVY_MODULES)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'DjangoProject.settings')
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f'Startup probe failed:\n{result.stderr}')
+        return json.loads(result.stdout.strip().splitlines()[-1])
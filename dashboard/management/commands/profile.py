@@ -0,0 +1,91 @@
+"""Starts, stops and lists on-demand profiling sessions (see dashboard.profiling)."""
+
+from __future__ import annotations
+
+import os
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ... import profiling
+from ...models import ProfilingSession
+
+
+class Command(BaseCommand):
+    help = (
+        'Profile a task, signal handler, bridge or consumer in the running processes, '
+        'or sample a whole process with SIGUSR2.'
+    )
+
+    def add_arguments(self, parser):  # pragma: no cover - argument wiring
+        actions = parser.add_subparsers(dest='action', required=True)
+
+        start = actions.add_parser('start', help='Profile a target for a while')
+        start.add_argument('target', help='Task name, push_dashboard_update, DashboardConsumer, mqtt_bridge, kafka_bridge or *')
+        start.add_argument('--mode', choices=profiling.MODES, default='sample')
+        start.add_argument('--duration', type=int, default=30, help='Seconds')
+        start.add_argument('--interval-ms', type=int, default=5, help='Sampling interval')
+        start.add_argument('--host', default='', help='Only processes on this host')
+        start.add_argument('--pid', type=int, help='Only this process')
+
+        stop = actions.add_parser('stop', help='End active sessions now and write their profiles')
+        stop.add_argument('target', nargs='?', help='Only sessions for this target')
+
+        actions.add_parser('list', help='Show active sessions and written profiles')
+
+        process = actions.add_parser('signal', help='Sample every thread of a local process (SIGUSR2)')
+        process.add_argument('pid', type=int)
+
+    def handle(self, *args, **options):
+        getattr(self, f'_{options["action"]}')(options)
+
+    def _start(self, options):
+        if options['duration'] <= 0 or options['interval_ms'] <= 0:
+            raise CommandError('--duration and --interval-ms must be positive')
+        session = ProfilingSession.objects.create(
+            target=options['target'],
+            mode=options['mode'],
+            duration=options['duration'],
+            interval_ms=options['interval_ms'],
+            hostname=options['host'],
+            pid=options['pid'],
+        )
+        until = timezone.localtime(session.until)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Profiling {session.target} ({session.mode}) until {until:%H:%M:%S}; '
+                f'profiles go to {profiling.profile_dir()} on each host'
+            )
+        )
+
+    def _stop(self, options):
+        queryset = ProfilingSession.objects.filter(until__gt=timezone.now())
+        if options['target']:
+            queryset = queryset.filter(target=options['target'])
+        stopped = queryset.update(until=timezone.now())
+        if stopped:
+            profiling.bump()
+        self.stdout.write(f'{stopped} session(s) stopped')
+
+    def _list(self, options):
+        for session in ProfilingSession.objects.filter(until__gt=timezone.now()):
+            where = f"{session.hostname or '*'}:{session.pid or '*'}"
+            until = timezone.localtime(session.until)
+            self.stdout.write(f'active  {session.target} ({session.mode}) on {where} until {until:%H:%M:%S}')
+        directory = profiling.profile_dir()
+        if directory.is_dir():
+            for path in sorted(directory.iterdir(), key=lambda path: path.stat().st_mtime):
+                self.stdout.write(f'written {path} ({path.stat().st_size} bytes)')
+
+    def _signal(self, options):
+        if not hasattr(signal, 'SIGUSR2'):
+            raise CommandError('SIGUSR2 is not available on this platform')
+        try:
+            os.kill(options['pid'], signal.SIGUSR2)
+        except OSError as exc:
+            raise CommandError(f'Could not signal {options["pid"]}: {exc}') from exc
+        self.stdout.write(
+            f'Sampling {options["pid"]} for {profiling.SIGNAL_SECONDS:g}s (signal it again to stop early); '
+            f'the profile goes to {profiling.profile_dir()}'
+        )
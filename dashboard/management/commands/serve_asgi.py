@@ -0,0 +1,105 @@
+"""Runs several Daphne processes that accept connections on one shared port."""
+
+from __future__ import annotations
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    listener = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(backlog)
+    listener.set_inheritable(True)
+    return listener
+
+
+def spawn_workers(
+    listener: socket.socket,
+    workers: int,
+    extra_env=None,
+    quiet: bool = False,
+    proxy_headers: bool = False,
+):
+    """Start ``workers`` Daphne processes that all accept on ``listener``.
+
+    ``proxy_headers`` makes Daphne trust ``X-Forwarded-For``; only use it
+    behind a reverse proxy that every connection goes through.
+    """
+
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'DjangoProject.settings')
+    env.update(extra_env or {})
+    fd = listener.fileno()
+    module, _, attribute = settings.ASGI_APPLICATION.rpartition('.')
+    command = [sys.executable, '-m', 'daphne', '--fd', str(fd)]
+    if proxy_headers:
+        command.append('--proxy-headers')
+    command.append(f'{module}:{attribute}')
+    output = subprocess.DEVNULL if quiet else None
+    return [
+        subprocess.Popen(command, cwd=settings.BASE_DIR, env=env, pass_fds=(fd,), stdout=output, stderr=output)
+        for _ in range(workers)
+    ]
+
+
+def stop_workers(processes, timeout: float = 10.0) -> None:
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    deadline = time.monotonic() + timeout
+    for process in processes:
+        try:
+            process.wait(max(deadline - time.monotonic(), 0))
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+class Command(BaseCommand):
+    help = 'Serve the ASGI app with several Daphne worker processes sharing one listening socket.'
+
+    def add_arguments(self, parser):  # pragma: no cover - argument wiring
+        parser.add_argument('--workers', type=int, default=int(os.environ.get('ASGI_WORKERS', os.cpu_count() or 1)))
+        parser.add_argument('--host', default='0.0.0.0')
+        parser.add_argument('--port', type=int, default=8000)
+        parser.add_argument(
+            '--proxy-headers',
+            action='store_true',
+            default=settings.ASGI_PROXY_HEADERS,
+            help='Trust X-Forwarded-For (only behind a trusted reverse proxy; default ASGI_PROXY_HEADERS)',
+        )
+
+    def handle(self, *args, **options):
+        if settings.CHANNEL_LAYERS['default']['BACKEND'].endswith('InMemoryChannelLayer') and options['workers'] > 1:
+            raise CommandError('Several workers need a shared channel layer; use CHANNEL_LAYER_BACKEND=redis or redis-pubsub.')
+
+        listener = bind_socket(options['host'], options['port'])
+        processes = spawn_workers(listener, max(options['workers'], 1), proxy_headers=options['proxy_headers'])
+        self.stdout.write(f'Serving on {options["host"]}:{options["port"]} with {len(processes)} Daphne workers')
+
+        stopping = False
+
+        def request_stop(signum, frame):  # pragma: no cover - signal handler
+            nonlocal stopping
+            stopping = True
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+        try:
+            while not stopping:
+                # A dead worker stops the whole group so the supervisor restarts it
+                # instead of silently running with less capacity.
+                if any(process.poll() is not None for process in processes):
+                    raise CommandError('A Daphne worker exited; stopping the others.')
+                time.sleep(0.5)
+        finally:
+            stop_workers(processes)
+            listener.close()
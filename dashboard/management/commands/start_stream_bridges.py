@@ -7,6 +7,8 @@ import time
 
 from django.core.management.base import BaseCommand
 
+from ... import profiling
+
 logger = logging.getLogger(__name__)
 
 
@@ -20,6 +22,7 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         skip_mqtt = options['skip_mqtt']
         skip_kafka = options['skip_kafka']
+        profiling.start_refresher()
 
         if not skip_mqtt:
             self.stdout.write(self.style.NOTICE('Starting MQTT bridge...'))
@@ -51,3 +54,6 @@ class Command(BaseCommand):
                 time.sleep(1)
         except KeyboardInterrupt:  # pragma: no cover - manual exit
             self.stdout.write(self.style.WARNING('Stopping bridges.'))
+            from ...integrations import batching
+
+            batching.flush()
@@ -0,0 +1,183 @@
+"""Prometheus metrics covering the ingest-to-browser pipeline."""
+
+from __future__ import annotations
+
+import functools
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+MESSAGES_INGESTED = Counter(
+    'dashboard_messages_ingested_total',
+    'Messages accepted by the ingest and fetch tasks.',
+    ['source'],
+)
+DUPLICATES_DROPPED = Counter(
+    'dashboard_duplicates_dropped_total',
+    'Redelivered messages whose message_key was already stored.',
+    ['source'],
+)
+INGEST_SHED = Counter(
+    'dashboard_ingest_shed_total',
+    'Messages the bridges dropped before enqueueing them (reason: load or rate).',
+    ['source', 'reason'],
+)
+INGEST_BATCH_SIZE = Histogram(
+    'dashboard_ingest_batch_size',
+    'Messages per ingest_batch task sent by the bridges.',
+    buckets=(1, 5, 10, 25, 50, 100, 200, 500, 1000),
+)
+INGEST_QUEUE_DEPTH = Gauge(
+    'dashboard_ingest_queue_depth',
+    'Tasks (a batch counts once) waiting in the Celery ingest queue, as last seen by a bridge.',
+    multiprocess_mode='mostrecent',
+)
+PERSIST_SECONDS = Histogram(
+    'dashboard_persist_seconds',
+    'Time spent writing an event to the database, including post_save handlers.',
+    ['model'],
+    buckets=LATENCY_BUCKETS,
+)
+BROADCAST_SECONDS = Histogram(
+    'dashboard_broadcast_seconds',
+    'Time spent handing an event to the channel layer.',
+    ['event_type'],
+    buckets=LATENCY_BUCKETS,
+)
+BROADCAST_FAILURES = Counter(
+    'dashboard_broadcast_failures_total',
+    'Events that could not be handed to the channel layer right away (buffered or dropped).',
+    ['event_type'],
+)
+BROADCAST_RETRIES = Counter(
+    'dashboard_broadcast_retries_total',
+    'Failed attempts to replay a buffered event to the channel layer.',
+    ['event_type'],
+)
+BROADCAST_BUFFERED = Gauge(
+    'dashboard_broadcast_buffered',
+    'Events waiting in the local outbound buffer for the channel layer.',
+    multiprocess_mode='livesum',
+)
+BROADCAST_DROPPED = Counter(
+    'dashboard_broadcast_dropped_total',
+    'Events evicted from the full outbound buffer before they could be sent.',
+)
+BROADCAST_CIRCUIT_OPEN = Gauge(
+    'dashboard_broadcast_circuit_open',
+    '1 while the channel-layer circuit breaker is open.',
+    multiprocess_mode='max',
+)
+POLL_DELAY_SECONDS = Gauge(
+    'dashboard_poll_delay_seconds',
+    'Current adaptive delay between polls of an external API.',
+    ['source'],
+    multiprocess_mode='mostrecent',
+)
+POLLS_SCHEDULED = Counter(
+    'dashboard_polls_scheduled_total',
+    'Fetch tasks enqueued by the adaptive poll scheduler.',
+    ['source'],
+)
+WEBSOCKET_RESUMES = Counter(
+    'dashboard_websocket_resumes_total',
+    'WebSocket connections that sent last_seq, by how they were caught up.',
+    ['outcome'],
+)
+WEBSOCKET_CLIENTS = Gauge(
+    'dashboard_websocket_clients',
+    'WebSocket clients currently connected to the dashboard.',
+    multiprocess_mode='livesum',
+)
+DASH_CALLBACK_SECONDS = Histogram(
+    'dashboard_dash_callback_seconds',
+    'Execution time of the Dash callbacks.',
+    ['callback'],
+    buckets=LATENCY_BUCKETS,
+)
+FIGURE_CACHE = Counter(
+    'dashboard_figure_cache_total',
+    'Dash figure lookups by where the figure came from (local, shared or miss).',
+    ['result'],
+)
+END_TO_END_SECONDS = Histogram(
+    'dashboard_end_to_end_latency_seconds',
+    'Delay between the event timestamp and the WebSocket send.',
+    ['event_type'],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_LATENCY_SECONDS = Histogram(
+    'dashboard_stage_latency_seconds',
+    'Per-hop latency of traced events (see dashboard.tracing).',
+    ['stage'],
+    buckets=LATENCY_BUCKETS,
+)
+ALERTS_FIRED = Counter(
+    'dashboard_alerts_fired_total',
+    'Alerts stored and published, per rule.',
+    ['rule'],
+)
+ALERTS_SUPPRESSED = Counter(
+    'dashboard_alerts_suppressed_total',
+    'Alert notifications dropped by cooldown or the per-minute budget.',
+)
+
+
+def observe_end_to_end(event_type: str, timestamp: Optional[str]) -> None:
+    """Record how old an event is at the moment it is written to a socket."""
+
+    if not timestamp:
+        return
+    try:
+        created = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return
+    if created.tzinfo is None:
+        return
+    END_TO_END_SECONDS.labels(event_type=event_type).observe(max(time.time() - created.timestamp(), 0.0))
+
+
+def timed_callback(name: str) -> Callable:
+    """Decorate a Dash callback so its duration lands in ``DASH_CALLBACK_SECONDS``."""
+
+    histogram = DASH_CALLBACK_SECONDS.labels(callback=name)
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with histogram.time():
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def render_latest() -> Tuple[bytes, str]:
+    """Serialize the current metrics in the Prometheus text format.
+
+    When ``PROMETHEUS_MULTIPROC_DIR`` is set the values written by every
+    Daphne and Celery process are aggregated; otherwise only this process is
+    reported.
+    """
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
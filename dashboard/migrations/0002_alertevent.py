@@ -0,0 +1,30 @@
+# Generated by Django 4.2.25 on 2026-10-19 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('rule', models.CharField(max_length=128)),
+                ('kind', models.CharField(max_length=16)),
+                ('severity', models.CharField(default='warning', max_length=16)),
+                ('source', models.CharField(max_length=128)),
+                ('value', models.FloatField()),
+                ('detail', models.JSONField(default=dict)),
+            ],
+            options={
+                'ordering': ('-created_at',),
+                'abstract': False,
+            },
+        ),
+    ]
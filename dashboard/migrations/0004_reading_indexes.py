@@ -0,0 +1,45 @@
+# Generated by Django 4.2.25 on 2026-10-19 05:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='financialmetric',
+            index=models.Index(fields=['created_at'], name='financialmet_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='financialmetric',
+            index=models.Index(fields=['symbol', 'created_at'], name='financialmet_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensorreading',
+            index=models.Index(fields=['created_at'], name='sensorreadin_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensorreading',
+            index=models.Index(fields=['source', 'created_at'], name='sensorreadin_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trafficupdate',
+            index=models.Index(fields=['created_at'], name='trafficupdat_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trafficupdate',
+            index=models.Index(fields=['region', 'created_at'], name='trafficupdat_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weathersnapshot',
+            index=models.Index(fields=['created_at'], name='weathersnaps_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weathersnapshot',
+            index=models.Index(fields=['location', 'created_at'], name='weathersnaps_key_idx'),
+        ),
+    ]
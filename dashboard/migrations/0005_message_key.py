@@ -0,0 +1,49 @@
+# Generated by Django 4.2.25 on 2026-10-19 05:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_reading_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='financialmetric',
+            name='message_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='sensorreading',
+            name='message_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='trafficupdate',
+            name='message_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='weathersnapshot',
+            name='message_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='financialmetric',
+            constraint=models.UniqueConstraint(fields=('message_key',), name='financialmet_message_key_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='sensorreading',
+            constraint=models.UniqueConstraint(fields=('message_key',), name='sensorreadin_message_key_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='trafficupdate',
+            constraint=models.UniqueConstraint(fields=('message_key',), name='trafficupdat_message_key_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='weathersnapshot',
+            constraint=models.UniqueConstraint(fields=('message_key',), name='weathersnaps_message_key_uniq'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.25 on 2026-10-19 05:42
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0005_message_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RawDocument',
+            fields=[
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('body', models.BinaryField()),
+                ('size', models.PositiveIntegerField(help_text='Uncompressed size in bytes')),
+            ],
+            options={
+                'ordering': ('-created_at',),
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='financialmetric',
+            name='raw_digest',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='sensorreading',
+            name='raw_digest',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='trafficupdate',
+            name='raw_digest',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='weathersnapshot',
+            name='raw_digest',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.25 on 2026-10-19 06:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_raw_documents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfilingSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('target', models.CharField(help_text='Task name, push_dashboard_update, DashboardConsumer, mqtt_bridge, kafka_bridge or *', max_length=128)),
+                ('mode', models.CharField(choices=[('sample', 'Sampling (folded stacks)'), ('cprofile', 'cProfile (pstats)')], default='sample', max_length=16)),
+                ('duration', models.PositiveIntegerField(default=30, help_text='Seconds')),
+                ('interval_ms', models.PositiveIntegerField(default=5, help_text='Sampling interval in milliseconds')),
+                ('hostname', models.CharField(blank=True, help_text='Only this host (blank for all)', max_length=128)),
+                ('pid', models.PositiveIntegerField(blank=True, help_text='Only this process (blank for all)', null=True)),
+                ('until', models.DateTimeField(db_index=True, editable=False)),
+            ],
+            options={
+                'ordering': ('-created_at',),
+                'abstract': False,
+            },
+        ),
+    ]
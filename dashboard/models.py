@@ -1,10 +1,17 @@
+from datetime import timedelta
+
 from django.db import models
+from django.utils import timezone
 
 
 class TimeStampedModel(models.Model):
-    """Abstract base model with created timestamp."""
+    """Abstract base model with created timestamp.
+
+    ``created_at`` defaults to now but can be set explicitly so backfills keep
+    the original reading time.
+    """
 
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         abstract = True
@@ -14,6 +21,15 @@ class TimeStampedModel(models.Model):
 class SensorReading(TimeStampedModel):
     source = models.CharField(max_length=128)
     payload = models.JSONField()
+    message_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    raw_digest = models.CharField(max_length=64, null=True, blank=True, editable=False, db_index=True)
+
+    class Meta(TimeStampedModel.Meta):
+        indexes = [
+            models.Index(fields=['created_at'], name='sensorreadin_created_idx'),
+            models.Index(fields=['source', 'created_at'], name='sensorreadin_key_idx'),
+        ]
+        constraints = [models.UniqueConstraint(fields=['message_key'], name='sensorreadin_message_key_uniq')]
 
     def __str__(self):
         return f"{self.source} @ {self.created_at:%Y-%m-%d %H:%M:%S}"
@@ -22,6 +38,15 @@ class SensorReading(TimeStampedModel):
 class FinancialMetric(TimeStampedModel):
     symbol = models.CharField(max_length=32)
     payload = models.JSONField()
+    message_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    raw_digest = models.CharField(max_length=64, null=True, blank=True, editable=False, db_index=True)
+
+    class Meta(TimeStampedModel.Meta):
+        indexes = [
+            models.Index(fields=['created_at'], name='financialmet_created_idx'),
+            models.Index(fields=['symbol', 'created_at'], name='financialmet_key_idx'),
+        ]
+        constraints = [models.UniqueConstraint(fields=['message_key'], name='financialmet_message_key_uniq')]
 
     def __str__(self):
         return f"{self.symbol} @ {self.created_at:%Y-%m-%d %H:%M:%S}"
@@ -30,6 +55,15 @@ class FinancialMetric(TimeStampedModel):
 class TrafficUpdate(TimeStampedModel):
     region = models.CharField(max_length=128)
     payload = models.JSONField()
+    message_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    raw_digest = models.CharField(max_length=64, null=True, blank=True, editable=False, db_index=True)
+
+    class Meta(TimeStampedModel.Meta):
+        indexes = [
+            models.Index(fields=['created_at'], name='trafficupdat_created_idx'),
+            models.Index(fields=['region', 'created_at'], name='trafficupdat_key_idx'),
+        ]
+        constraints = [models.UniqueConstraint(fields=['message_key'], name='trafficupdat_message_key_uniq')]
 
     def __str__(self):
         return f"{self.region} @ {self.created_at:%Y-%m-%d %H:%M:%S}"
@@ -38,6 +72,62 @@ class TrafficUpdate(TimeStampedModel):
 class WeatherSnapshot(TimeStampedModel):
     location = models.CharField(max_length=128)
     payload = models.JSONField()
+    message_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    raw_digest = models.CharField(max_length=64, null=True, blank=True, editable=False, db_index=True)
+
+    class Meta(TimeStampedModel.Meta):
+        indexes = [
+            models.Index(fields=['created_at'], name='weathersnaps_created_idx'),
+            models.Index(fields=['location', 'created_at'], name='weathersnaps_key_idx'),
+        ]
+        constraints = [models.UniqueConstraint(fields=['message_key'], name='weathersnaps_message_key_uniq')]
 
     def __str__(self):
         return f"{self.location} @ {self.created_at:%Y-%m-%d %H:%M:%S}"
+
+
+class RawDocument(TimeStampedModel):
+    """A full source document, zlib-compressed and stored once per content hash."""
+
+    digest = models.CharField(max_length=64, primary_key=True)
+    body = models.BinaryField()
+    size = models.PositiveIntegerField(help_text='Uncompressed size in bytes')
+
+    def __str__(self):
+        return f"{self.digest} ({self.size} bytes)"
+
+
+class AlertEvent(TimeStampedModel):
+    rule = models.CharField(max_length=128)
+    kind = models.CharField(max_length=16)
+    severity = models.CharField(max_length=16, default='warning')
+    source = models.CharField(max_length=128)
+    value = models.FloatField()
+    detail = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"{self.rule} [{self.source}] @ {self.created_at:%Y-%m-%d %H:%M:%S}"
+
+
+class ProfilingSession(TimeStampedModel):
+    """A request to profile a target in the running processes (see ``dashboard.profiling``)."""
+
+    MODES = (('sample', 'Sampling (folded stacks)'), ('cprofile', 'cProfile (pstats)'))
+
+    target = models.CharField(
+        max_length=128,
+        help_text='Task name, push_dashboard_update, DashboardConsumer, mqtt_bridge, kafka_bridge or *',
+    )
+    mode = models.CharField(max_length=16, choices=MODES, default='sample')
+    duration = models.PositiveIntegerField(default=30, help_text='Seconds')
+    interval_ms = models.PositiveIntegerField(default=5, help_text='Sampling interval in milliseconds')
+    hostname = models.CharField(max_length=128, blank=True, help_text='Only this host (blank for all)')
+    pid = models.PositiveIntegerField(null=True, blank=True, help_text='Only this process (blank for all)')
+    until = models.DateTimeField(editable=False, db_index=True)
+
+    def save(self, *args, **kwargs):
+        self.until = self.created_at + timedelta(seconds=self.duration)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.target} ({self.mode}) @ {self.created_at:%Y-%m-%d %H:%M:%S}"
@@ -0,0 +1,280 @@
+"""Adaptive polling of the external APIs.
+
+Every registered source with a ``fetch`` function is polled, with the
+``poll`` intervals it was registered with; ``settings.DASHBOARD_POLL_SOURCES``
+only overrides them per source.
+
+Celery beat runs ``tasks.schedule_polls`` every ``DASHBOARD_POLL_TICK``
+seconds; it enqueues each fetch task whose next run is due. The delay before
+the next run starts from the source's adaptive ``interval`` and is:
+
+* shortened after a run that brought changed data, lengthened after one that
+  did not (bounded by ``min``/``max``);
+* doubled per consecutive error;
+* multiplied by ``DASHBOARD_POLL_IDLE_FACTOR`` while no dashboard is connected;
+* never shorter than the spacing the upstream rate-limit headers allow, and
+  never before ``Retry-After`` / the rate-limit reset when the quota is spent.
+
+Per-source state and the viewer counts reported by the WebSocket consumers
+live in Redis (``DASHBOARD_STATE_REDIS_URL``) so beat, workers and Daphne
+processes share them.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Mapping, Optional
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+SPEEDUP = 0.7
+SLOWDOWN = 1.25
+MAX_ERROR_DOUBLINGS = 6
+DEFAULT_POLL = {'interval': 30, 'min': 10, 'max': 600}
+VIEWER_TTL = 120
+VIEWER_REFRESH = 30
+# After a failed publish the web processes leave Redis alone for this long.
+VIEWER_RETRY = 10
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import redis
+
+                _client = redis.Redis.from_url(
+                    settings.DASHBOARD_STATE_REDIS_URL,
+                    socket_timeout=1.0,
+                    socket_connect_timeout=0.5,
+                    decode_responses=True,
+                )
+    return _client
+
+
+def _state_key(source: str) -> str:
+    return f'dashboard:poll:{source}'
+
+
+def fingerprint(data: Any) -> str:
+    return hashlib.blake2b(json.dumps(data, sort_keys=True, default=str).encode(), digest_size=12).hexdigest()
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def rate_limit(headers: Mapping[str, str], now: float) -> Dict[str, float]:
+    """Translate ``Retry-After`` / ``X-RateLimit-*`` headers into scheduling hints."""
+
+    hints: Dict[str, float] = {}
+    retry_after = headers.get('Retry-After')
+    if retry_after:
+        seconds = _number(retry_after)
+        if seconds is None:
+            try:
+                seconds = parsedate_to_datetime(retry_after).timestamp() - now
+            except (TypeError, ValueError):
+                seconds = None
+        if seconds is not None:
+            hints['blocked_until'] = now + max(seconds, 0)
+
+    remaining = _number(headers.get('X-RateLimit-Remaining') or headers.get('RateLimit-Remaining'))
+    reset = _number(headers.get('X-RateLimit-Reset') or headers.get('RateLimit-Reset'))
+    if reset is not None and reset < 1e9:
+        reset = now + reset  # delta seconds rather than an epoch timestamp
+    if remaining is not None and reset is not None and reset > now:
+        if remaining < 1:
+            hints['blocked_until'] = max(hints.get('blocked_until', 0), reset)
+        else:
+            hints['spacing'] = (reset - now) / remaining
+    return hints
+
+
+class AdaptiveScheduler:
+    def __init__(self, sources: Dict[str, Dict[str, Any]], client=None, idle_factor: float = 8.0):
+        self.sources = sources
+        self._client = client
+        self.idle_factor = idle_factor
+
+    @property
+    def client(self):
+        return self._client or get_client()
+
+    def state(self, source: str) -> Dict[str, float]:
+        config = self.sources[source]
+        raw = self.client.hgetall(_state_key(source))
+        return {
+            'interval': float(raw.get('interval', config['interval'])),
+            'last_run': float(raw.get('last_run', 0)),
+            'errors': int(raw.get('errors', 0)),
+            'blocked_until': float(raw.get('blocked_until', 0)),
+            'spacing': float(raw.get('spacing', 0)),
+            'ok': raw.get('ok') == '1',
+            'changed': raw.get('changed') == '1',
+        }
+
+    def viewers(self) -> int:
+        keys = list(self.client.scan_iter('dashboard:viewers:*', count=1000))
+        if not keys:
+            return 0
+        return sum(int(value) for value in self.client.mget(keys) if value)
+
+    def delay(self, source: str, state: Dict[str, float], viewers: int) -> float:
+        config = self.sources[source]
+        delay = state['interval']
+        if state['errors']:
+            delay *= 2 ** min(state['errors'], MAX_ERROR_DOUBLINGS)
+        if viewers == 0:
+            delay *= self.idle_factor
+        delay = min(delay, config['max'])
+        return max(delay, state['spacing'])
+
+    def due(self, now: Optional[float] = None) -> List[str]:
+        """Claim and return the sources whose next poll is due."""
+
+        now = time.time() if now is None else now
+        viewers = self.viewers()
+        claimed = []
+        for source, config in self.sources.items():
+            state = self.state(source)
+            delay = self.delay(source, state, viewers)
+            metrics.POLL_DELAY_SECONDS.labels(source=source).set(delay)
+            if now < max(state['last_run'] + delay, state['blocked_until']):
+                continue
+            # Several overlapping ticks must not enqueue the same source twice.
+            if not self.client.set(f'{_state_key(source)}:claim', '1', nx=True, ex=max(int(config['min']), 1)):
+                continue
+            interval = state['interval']
+            if state['ok']:
+                interval *= SPEEDUP if state['changed'] else SLOWDOWN
+            interval = min(max(interval, config['min']), config['max'])
+            self.client.hset(
+                _state_key(source),
+                mapping={'interval': interval, 'last_run': now, 'ok': 0, 'changed': 0},
+            )
+            claimed.append(source)
+        return claimed
+
+    def observe(self, source: str, data: Any = None, key: str = '', headers: Optional[Mapping[str, str]] = None) -> None:
+        """Record a successful fetch and whether ``data`` differs from the last one."""
+
+        now = time.time()
+        updates: Dict[str, Any] = {'ok': 1, 'errors': 0, 'spacing': 0}
+        updates.update(rate_limit(headers or {}, now))
+        if data is not None:
+            digest = fingerprint(data)
+            field = f'fp:{key}'
+            if self.client.hget(_state_key(source), field) != digest:
+                updates['changed'] = 1
+                updates[field] = digest
+        self.client.hset(_state_key(source), mapping=updates)
+
+    def observe_error(self, source: str, headers: Optional[Mapping[str, str]] = None) -> None:
+        self.client.hincrby(_state_key(source), 'errors', 1)
+        self.client.hset(_state_key(source), mapping={'ok': 0, **rate_limit(headers or {}, time.time())})
+
+
+_scheduler: Optional[AdaptiveScheduler] = None
+
+
+def poll_sources() -> Dict[str, Dict[str, Any]]:
+    """Poll intervals of every source with a ``fetch``, with the settings overrides applied."""
+
+    from . import sources
+
+    overrides = getattr(settings, 'DASHBOARD_POLL_SOURCES', {})
+    return {
+        source.event_type: {**DEFAULT_POLL, **(source.poll or {}), **overrides.get(source.event_type, {})}
+        for source in sources.all_sources()
+        if source.fetch is not None
+    }
+
+
+def get_scheduler() -> AdaptiveScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = AdaptiveScheduler(
+            poll_sources(),
+            idle_factor=getattr(settings, 'DASHBOARD_POLL_IDLE_FACTOR', 8.0),
+        )
+    return _scheduler
+
+
+def observe(source: str, data: Any = None, key: str = '', headers: Optional[Mapping[str, str]] = None) -> None:
+    """Best-effort wrapper for the fetch tasks: scheduling must not fail a fetch."""
+
+    try:
+        get_scheduler().observe(source, data=data, key=key, headers=headers)
+    except Exception:  # noqa: BLE001
+        logger.warning('Could not record poll result for %s', source, exc_info=True)
+
+
+def observe_error(source: str, headers: Optional[Mapping[str, str]] = None) -> None:
+    try:
+        get_scheduler().observe_error(source, headers=headers)
+    except Exception:  # noqa: BLE001
+        logger.warning('Could not record poll error for %s', source, exc_info=True)
+
+
+class ViewerCounter:
+    """Per-process WebSocket client count published to Redis with a TTL.
+
+    ``change`` only updates the count in memory; the heartbeat of
+    ``dashboard.background`` publishes it, off the event loop, when it changed
+    and every ``VIEWER_REFRESH`` seconds. The key expires if the process
+    dies, so crashed Daphne workers stop counting after ``VIEWER_TTL``
+    seconds. After a failure nothing is sent for ``VIEWER_RETRY`` seconds.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.published_count: Optional[int] = None
+        self.published = 0.0
+        self.retry_at = 0.0
+        self._failing = False
+
+    def change(self, delta: int) -> None:
+        self.count = max(self.count + delta, 0)
+
+    def due(self, now: float) -> bool:
+        if now < self.retry_at:
+            return False
+        return self.count != self.published_count or now - self.published >= VIEWER_REFRESH
+
+    def publish(self) -> None:
+        now = time.monotonic()
+        count = self.count
+        try:
+            key = f'dashboard:viewers:{socket.gethostname()}:{os.getpid()}'
+            get_client().set(key, count, ex=VIEWER_TTL)
+        except Exception:  # noqa: BLE001 - the scheduler then assumes nobody is watching
+            if not self._failing:
+                logger.warning('Could not publish viewer count', exc_info=True)
+            self._failing = True
+            self.retry_at = now + VIEWER_RETRY
+            return
+        self._failing = False
+        self.published = now
+        self.published_count = count
+
+
+viewers = ViewerCounter()
@@ -0,0 +1,446 @@
+"""On-demand profiling of tasks, signal handlers, bridges and consumers.
+
+Profiling is switched on at runtime, without a redeploy, in two ways:
+
+* A ``ProfilingSession`` row (``manage.py profile start`` or the admin) names a
+  target and, optionally, a host and pid. Targets are Celery task names (full
+  or short, e.g. ``ingest_mqtt_message``), ``push_dashboard_update``,
+  ``DashboardConsumer``, ``mqtt_bridge``, ``kafka_bridge`` or ``*``. Creating,
+  stopping or deleting a session bumps a version number in Redis
+  (``VERSION_KEY`` on ``DASHBOARD_STATE_REDIS_URL``). A background thread in
+  each ASGI server, Celery worker and bridge process (``start_refresher``,
+  called where those start; other commands such as ``migrate`` never touch
+  the sessions) reads that number every ``REFRESH_SECONDS`` and only queries
+  the database when it changed or an active session ends; while Redis is
+  unreachable it queries every ``FALLBACK_SECONDS`` instead. The
+  instrumented calls only look at an in-memory dict, which is empty while
+  nothing is being profiled.
+* ``SIGUSR2`` samples every thread of the receiving process for
+  ``SIGNAL_SECONDS``; a second signal stops early.
+
+``sample`` sessions record the stacks of the threads inside a profiled call
+every ``interval_ms`` and write them as folded stacks (``.folded``, one
+``frame;frame;frame count`` line per stack) that flamegraph.pl, inferno and
+speedscope read as they are. ``cprofile`` sessions run every call under
+cProfile and write the merged ``pstats`` (``.prof``). Files are written to
+``DASHBOARD_PROFILE_DIR`` when the session ends.
+
+Consumer methods are coroutines: while one awaits, the event loop runs
+whatever else is ready on the same thread, and that ends up in its profile.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import functools
+import inspect
+import logging
+import os
+import pstats
+import signal
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from celery.signals import task_postrun, task_prerun, worker_init, worker_process_init
+
+logger = logging.getLogger(__name__)
+
+ALL = '*'
+MODES = ('sample', 'cprofile')
+REFRESH_SECONDS = float(os.environ.get('DASHBOARD_PROFILE_REFRESH', '2'))
+SIGNAL_ENABLED = os.environ.get('DASHBOARD_PROFILE_SIGNAL', '1') == '1'
+SIGNAL_SECONDS = float(os.environ.get('DASHBOARD_PROFILE_SIGNAL_SECONDS', '30'))
+SIGNAL_INTERVAL_MS = 5
+MAX_DEPTH = 128
+FALLBACK_SECONDS = 30.0
+VERSION_KEY = 'dashboard:profiling:version'
+
+
+def profile_dir() -> Path:
+    from django.conf import settings
+
+    return Path(settings.DASHBOARD_PROFILE_DIR)
+
+
+def _fold(frame) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        code = frame.f_code
+        # co_qualname is new in Python 3.11.
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Collector:
+    """Profile data of one session in this process."""
+
+    suffix = ''
+
+    def __init__(self, name: str, until: float):
+        self.name = name
+        self.until = until
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def enter(self) -> Any:
+        raise NotImplementedError
+
+    def exit(self, token: Any) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        raise NotImplementedError
+
+    def _path(self) -> Path:
+        directory = profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / f'{self.name}{self.suffix}'
+
+
+class SamplingCollector(Collector):
+    """Samples the stacks of the threads inside profiled calls (or all threads)."""
+
+    suffix = '.folded'
+
+    def __init__(self, name: str, until: float, interval: float, all_threads: bool = False):
+        super().__init__(name, until)
+        self.interval = interval
+        self.all_threads = all_threads
+        self._threads: Dict[int, int] = {}
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'profiler-{name}', daemon=True)
+        self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def enter(self) -> int:
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] = self._threads.get(ident, 0) + 1
+            self.calls += 1
+        return ident
+
+    def exit(self, token: int) -> None:
+        with self._lock:
+            depth = self._threads.pop(token, 0) - 1
+            if depth > 0:
+                self._threads[token] = depth
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval) and time.time() < self.until:
+            with self._lock:
+                threads = None if self.all_threads else set(self._threads)
+            if threads is not None and not threads:
+                continue
+            for ident, frame in sys._current_frames().items():
+                if ident != own and (threads is None or ident in threads):
+                    self._stacks[_fold(frame)] += 1
+        self._write()
+
+    def _write(self) -> None:
+        if not self._stacks:
+            logger.info('Profile %s ended without samples', self.name)
+            return
+        try:
+            path = self._path()
+            with path.open('w') as handle:
+                for stack, count in self._stacks.most_common():
+                    handle.write(f'{stack} {count}\n')
+        except OSError:
+            logger.warning('Could not write profile %s', self.name, exc_info=True)
+            return
+        logger.info('Wrote %s samples to %s', sum(self._stacks.values()), path)
+
+    def close(self) -> None:
+        self._stop.set()
+
+
+class CProfileCollector(Collector):
+    """Runs each profiled call under cProfile and merges the statistics."""
+
+    suffix = '.prof'
+
+    def __init__(self, name: str, until: float):
+        super().__init__(name, until)
+        self._stats: Optional[pstats.Stats] = None
+        self._local = threading.local()
+
+    def enter(self) -> Optional[cProfile.Profile]:
+        # cProfile allows one active profiler per thread; calls nested in (or,
+        # for coroutines, interleaved with) a profiled call are part of it.
+        if getattr(self._local, 'profile', None) is not None:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # another profiler owns the thread
+            return None
+        self._local.profile = profile
+        return profile
+
+    def exit(self, token: Optional[cProfile.Profile]) -> None:
+        if token is None:
+            return
+        token.disable()
+        self._local.profile = None
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(token)
+            else:
+                self._stats.add(token)
+            self.calls += 1
+
+    def close(self) -> None:
+        with self._lock:
+            stats, self._stats = self._stats, None
+        if stats is None:
+            logger.info('Profile %s ended without calls', self.name)
+            return
+        try:
+            path = self._path()
+            stats.dump_stats(str(path))
+        except OSError:
+            logger.warning('Could not write profile %s', self.name, exc_info=True)
+            return
+        logger.info('Wrote %s profiled calls to %s', self.calls, path)
+
+
+# target -> collector, replaced as a whole by the refresher thread.
+_active: Dict[str, Collector] = {}
+_sessions: Dict[int, Collector] = {}
+_refresher_started = False
+_process: Optional[SamplingCollector] = None
+_start_lock = threading.Lock()
+
+
+def _load_sessions():
+    from django.db.models import Q
+    from django.utils import timezone
+
+    from .models import ProfilingSession
+
+    return list(
+        ProfilingSession.objects.filter(until__gt=timezone.now())
+        .filter(Q(hostname='') | Q(hostname=socket.gethostname()))
+        .filter(Q(pid__isnull=True) | Q(pid=os.getpid()))
+        .order_by('created_at')
+    )
+
+
+def _collector(session) -> Collector:
+    name = f"{session.target.replace('.', '_').replace('*', 'all')}-{socket.gethostname()}-{os.getpid()}-{session.pk}"
+    until = session.until.timestamp()
+    if session.mode == 'cprofile':
+        return CProfileCollector(name, until)
+    return SamplingCollector(name, until, session.interval_ms / 1000)
+
+
+def _apply(sessions) -> None:
+    global _active
+
+    now = time.time()
+    wanted = {session.pk: session for session in sessions}
+    for pk in list(_sessions):
+        if pk not in wanted or _sessions[pk].until <= now:
+            _sessions.pop(pk).close()
+    active = {}
+    for pk, session in wanted.items():
+        if pk not in _sessions and session.until.timestamp() > now:
+            _sessions[pk] = _collector(session)
+            logger.info('Profiling %s (%s) until %s', session.target, session.mode, session.until.isoformat())
+        if pk in _sessions:
+            active[session.target] = _sessions[pk]
+    _active = active
+
+
+def bump() -> None:
+    """Tell every process that the sessions changed."""
+
+    from . import polling
+
+    try:
+        polling.get_client().incr(VERSION_KEY)
+    except Exception:  # noqa: BLE001 - processes fall back to polling the database
+        logger.warning('Could not announce the profiling session change; it applies within %ss', FALLBACK_SECONDS)
+
+
+def _version() -> Optional[str]:
+    """The sessions version in Redis, or None when Redis is unreachable."""
+
+    from . import polling
+
+    try:
+        return polling.get_client().get(VERSION_KEY) or '0'
+    except Exception:  # noqa: BLE001
+        return None
+
+
+def _refresh_loop() -> None:
+    from django.db import connection
+
+    failing = False
+    loaded: Optional[str] = None
+    reload_at = 0.0
+    while True:
+        version = _version()
+        now = time.time()
+        if (version is not None and version != loaded) or now >= reload_at:
+            try:
+                _apply(_load_sessions())
+            except Exception:  # noqa: BLE001 - e.g. database down or not migrated; keep the last state
+                if not failing:
+                    logger.warning('Could not read profiling sessions', exc_info=True)
+                failing = True
+                connection.close()
+                reload_at = now + FALLBACK_SECONDS
+            else:
+                failing = False
+                loaded = version
+                # The next session to end has to be closed and written.
+                reload_at = min((collector.until for collector in _sessions.values()), default=float('inf'))
+                if version is None:
+                    reload_at = min(reload_at, now + FALLBACK_SECONDS)
+        time.sleep(REFRESH_SECONDS)
+
+
+def start_refresher() -> None:
+    """Follow the profiling sessions from this process (once per process)."""
+
+    global _refresher_started
+
+    with _start_lock:
+        if _refresher_started:
+            return
+        _refresher_started = True
+        threading.Thread(target=_refresh_loop, name='profiling-sessions', daemon=True).start()
+
+
+def _after_fork() -> None:
+    # Threads do not survive fork (Celery prefork children, for instance).
+    global _active, _sessions, _process, _refresher_started, _start_lock
+
+    _active, _sessions, _process, _refresher_started = {}, {}, None, False
+    _start_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def collector_for(*targets: str) -> Optional[Collector]:
+    """The collector profiling any of ``targets`` in this process, if any."""
+
+    if not _active:
+        return None
+    for target in targets:
+        collector = _active.get(target)
+        if collector is not None:
+            return collector
+    return _active.get(ALL)
+
+
+def start(*targets: str) -> Optional[Tuple[Collector, Any]]:
+    collector = collector_for(*targets)
+    if collector is None:
+        return None
+    return collector, collector.enter()
+
+
+def stop(handle: Optional[Tuple[Collector, Any]]) -> None:
+    if handle is not None:
+        collector, token = handle
+        collector.exit(token)
+
+
+def profiled(target: str) -> Callable:
+    """Decorator that profiles the function, or coroutine function, as ``target``."""
+
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not _active:
+                    return await func(*args, **kwargs)
+                handle = start(target)
+                if handle is None:
+                    return await func(*args, **kwargs)
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    stop(handle)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # Inlined fast path: this is all a call costs while nothing is profiled.
+            if not _active:
+                return func(*args, **kwargs)
+            handle = start(target)
+            if handle is None:
+                return func(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stop(handle)
+
+        return wrapper
+
+    return decorator
+
+
+_running_tasks: Dict[str, Tuple[Collector, Any]] = {}
+
+
+@worker_init.connect
+@worker_process_init.connect
+def _worker_started(**kwargs):
+    # worker_init runs in the main worker process (solo and thread pools);
+    # prefork children lose the thread at fork and start their own.
+    start_refresher()
+
+
+@task_prerun.connect
+def _task_started(task_id=None, task=None, **kwargs):
+    handle = start(task.name, task.name.rsplit('.', 1)[-1])
+    if handle is not None:
+        _running_tasks[task_id] = handle
+
+
+@task_postrun.connect
+def _task_finished(task_id=None, **kwargs):
+    stop(_running_tasks.pop(task_id, None))
+
+
+def _on_signal(signum, frame) -> None:
+    # Runs between two bytecodes of the main thread: no logging or file I/O
+    # here, the sampler thread does both.
+    global _process
+
+    if _process is not None and _process.running:
+        _process.close()
+        return
+    name = f'process-{socket.gethostname()}-{os.getpid()}-{int(time.time())}'
+    _process = SamplingCollector(name, time.time() + SIGNAL_SECONDS, SIGNAL_INTERVAL_MS / 1000, all_threads=True)
+
+
+def install_signal_handler() -> None:
+    """Sample the whole process on ``SIGUSR2`` unless something else handles it."""
+
+    if not SIGNAL_ENABLED or not hasattr(signal, 'SIGUSR2'):
+        return
+    if threading.current_thread() is not threading.main_thread():
+        return
+    if signal.getsignal(signal.SIGUSR2) not in (signal.SIG_DFL, None):
+        return
+    signal.signal(signal.SIGUSR2, _on_signal)
@@ -0,0 +1,64 @@
+"""Optional side table with the full documents returned by the sources.
+
+Reading rows only keep the fields their source projects (``Source.keep``).
+With ``DASHBOARD_KEEP_RAW=1`` the complete document is also stored,
+zlib-compressed, in ``RawDocument`` under its content hash and the row points
+at it through ``raw_digest``. A weather or traffic poll that returns the same
+document as before therefore adds nothing but the small projected row.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import zlib
+from datetime import datetime
+from typing import Any, Optional
+
+from django.db.models import Exists, OuterRef
+
+from . import models, sources
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('DASHBOARD_KEEP_RAW', '0') == '1'
+COMPRESSION_LEVEL = 6
+
+
+def digest(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=20).hexdigest()
+
+
+def store(payload: Any) -> str:
+    """Store ``payload`` once per content hash and return the hash."""
+
+    body = json.dumps(payload, sort_keys=True, default=str, separators=(',', ':')).encode()
+    key = digest(body)
+    models.RawDocument.objects.bulk_create(
+        [models.RawDocument(digest=key, body=zlib.compress(body, COMPRESSION_LEVEL), size=len(body))],
+        ignore_conflicts=True,
+    )
+    return key
+
+
+def load(key: Optional[str]) -> Any:
+    """The stored document, or None when it was not kept."""
+
+    if not key:
+        return None
+    body = models.RawDocument.objects.filter(digest=key).values_list('body', flat=True).first()
+    return json.loads(zlib.decompress(body)) if body is not None else None
+
+
+def prune(cutoff: datetime) -> int:
+    """Delete documents older than ``cutoff`` that no reading refers to any more."""
+
+    queryset = models.RawDocument.objects.filter(created_at__lt=cutoff)
+    for source in sources.all_sources():
+        queryset = queryset.exclude(Exists(source.model.objects.filter(raw_digest=OuterRef('digest'))))
+    deleted, _ = queryset.delete()
+    if deleted:
+        logger.info('Pruned %s raw documents older than %s', deleted, cutoff.isoformat())
+    return deleted
@@ -1,18 +1,48 @@
-"""Helpers for broadcasting real-time updates through Django Channels."""
+"""Helpers for broadcasting real-time updates through Django Channels.
+
+``broadcast_event`` never raises into the caller (the post_save signal inside
+an ingest task). Each ``group_send`` is bounded by
+``DASHBOARD_BROADCAST_TIMEOUT``; after ``DASHBOARD_BREAKER_THRESHOLD``
+consecutive failures a circuit breaker opens and events go straight into a
+bounded local buffer (``DASHBOARD_BROADCAST_BUFFER``, oldest dropped first).
+A background thread retries with exponential backoff and replays the buffer
+in order once the channel layer answers again.
+
+Events are buffered the same way while ``get_channel_layer()`` returns
+nothing (e.g. the layer is misconfigured at startup); the flusher keeps
+asking for it. A full buffer drops its oldest event, but never the one the
+flusher is sending at that moment.
+
+Each event is numbered by ``dashboard.replay`` right before its first send
+attempt, so buffered events keep their place in the sequence.
+"""
 
 from __future__ import annotations
 
+import asyncio
 import logging
+import os
+import threading
+import time
+from collections import deque
 from dataclasses import asdict, dataclass
-from typing import Any, Dict
+from typing import Any, Deque, Dict, Optional, Tuple
 
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 
+from . import metrics, replay, tracing
+
 logger = logging.getLogger(__name__)
 
 DASHBOARD_GROUP = 'dashboard_updates'
 
+BUFFER_SIZE = int(os.environ.get('DASHBOARD_BROADCAST_BUFFER', '10000'))
+SEND_TIMEOUT = float(os.environ.get('DASHBOARD_BROADCAST_TIMEOUT', '1.0'))
+BREAKER_THRESHOLD = int(os.environ.get('DASHBOARD_BREAKER_THRESHOLD', '3'))
+BACKOFF_INITIAL = float(os.environ.get('DASHBOARD_BREAKER_BACKOFF', '0.5'))
+BACKOFF_MAX = float(os.environ.get('DASHBOARD_BREAKER_BACKOFF_MAX', '30'))
+
 
 @dataclass
 class DashboardEvent:
@@ -23,10 +53,139 @@ class DashboardEvent:
         return {'type': 'dashboard_update', 'data': asdict(self)}
 
 
+class ResilientBroadcaster:
+    """Circuit breaker plus bounded replay buffer in front of ``group_send``."""
+
+    def __init__(self, buffer_size: int = BUFFER_SIZE):
+        self.buffer: Deque[Tuple[str, Dict[str, Any]]] = deque()
+        self.buffer_size = buffer_size
+        self.failures = 0
+        self.open_until = 0.0
+        self.backoff = BACKOFF_INITIAL
+        self._in_flight: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    @staticmethod
+    def _send(channel_layer, message: Dict[str, Any]) -> None:
+        event = message['data']
+        if 'seq' not in event:
+            event['seq'] = replay.get_log().append(tracing.strip(event))
+
+        async def send() -> None:
+            await asyncio.wait_for(channel_layer.group_send(DASHBOARD_GROUP, message), SEND_TIMEOUT)
+
+        async_to_sync(send)()
+
+    def _record_success(self) -> None:
+        with self._lock:
+            if self.failures:
+                logger.info('Channel layer reachable again; replaying %s buffered events', len(self.buffer))
+            self.failures = 0
+            self.backoff = BACKOFF_INITIAL
+            self.open_until = 0.0
+        metrics.BROADCAST_CIRCUIT_OPEN.set(0)
+
+    def _record_failure(self, exc: Exception, force_open: bool = False) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.failures < BREAKER_THRESHOLD and not force_open:
+                return
+            if not self.open_until:
+                logger.warning('Channel layer failing (%s); buffering broadcasts', exc)
+            self.open_until = max(self.open_until, time.monotonic() + self.backoff)
+            self.backoff = min(self.backoff * 2, BACKOFF_MAX)
+        metrics.BROADCAST_CIRCUIT_OPEN.set(1)
+
+    def _enqueue(self, event_type: str, message: Dict[str, Any]) -> None:
+        with self._lock:
+            if len(self.buffer) >= self.buffer_size:
+                metrics.BROADCAST_DROPPED.inc()
+                # Never drop the event the flusher is sending right now.
+                if self._in_flight is None or self.buffer[0][1] is not self._in_flight:
+                    self.buffer.popleft()
+                elif len(self.buffer) > 1:
+                    del self.buffer[1]
+                else:
+                    return
+            else:
+                metrics.BROADCAST_BUFFERED.inc()
+            self.buffer.append((event_type, message))
+        self._ensure_flusher()
+        self._wakeup.set()
+
+    def _ensure_flusher(self) -> None:
+        # Celery prefork children inherit the parent's object but not its threads.
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._flush_forever, name='broadcast-replay', daemon=True)
+        self._thread.start()
+
+    def send(self, event_type: str, channel_layer, message: Dict[str, Any]) -> None:
+        # BROADCAST_FAILURES counts each event once, here, when it cannot be
+        # sent right away; failed replays of it count as BROADCAST_RETRIES.
+        if channel_layer is None or self.buffer or time.monotonic() < self.open_until:
+            metrics.BROADCAST_FAILURES.labels(event_type=event_type).inc()
+            self._enqueue(event_type, message)
+            return
+        try:
+            with metrics.BROADCAST_SECONDS.labels(event_type=event_type).time():
+                self._send(channel_layer, message)
+        except Exception as exc:  # noqa: BLE001 - any layer error must not reach the ingest task
+            metrics.BROADCAST_FAILURES.labels(event_type=event_type).inc()
+            self._record_failure(exc)
+            self._enqueue(event_type, message)
+        else:
+            self._record_success()
+
+    def _flush_forever(self) -> None:  # pragma: no cover - background thread
+        while True:
+            self._wakeup.wait(timeout=1.0)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Send buffered events in order until the buffer empties or a send fails."""
+
+        sent = 0
+        while self.buffer:
+            wait = self.open_until - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            channel_layer = get_channel_layer()
+            with self._lock:
+                if not self.buffer:
+                    break
+                event_type, message = self.buffer[0]
+                self._in_flight = message
+            try:
+                if channel_layer is None:
+                    raise RuntimeError('no channel layer configured')
+                with metrics.BROADCAST_SECONDS.labels(event_type=event_type).time():
+                    self._send(channel_layer, message)
+            except Exception as exc:  # noqa: BLE001
+                metrics.BROADCAST_RETRIES.labels(event_type=event_type).inc()
+                self._record_failure(exc, force_open=True)
+                continue
+            finally:
+                with self._lock:
+                    self._in_flight = None
+            with self._lock:
+                if self.buffer and self.buffer[0][1] is message:
+                    self.buffer.popleft()
+                    metrics.BROADCAST_BUFFERED.dec()
+            self._record_success()
+            sent += 1
+        return sent
+
+
+broadcaster = ResilientBroadcaster()
+
+
 def broadcast_event(event: DashboardEvent) -> None:
     channel_layer = get_channel_layer()
-    if channel_layer is None:
-        logger.warning('Channel layer unavailable; skipping broadcast')
-        return
-
-    async_to_sync(channel_layer.group_send)(DASHBOARD_GROUP, event.to_message())
+    tracing.record(tracing.stamp(event.data.get(tracing.TRACE_KEY), 'broadcast'), event.event_type)
+    broadcaster.send(event.event_type, channel_layer, event.to_message())
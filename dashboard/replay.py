@@ -0,0 +1,131 @@
+"""Sequence numbers and a bounded replay log for dashboard broadcasts.
+
+Every event sent through ``realtime.broadcast_event`` gets a monotonically
+increasing ``seq`` and is kept in a log of the last ``DASHBOARD_REPLAY_BUFFER``
+events. A browser that reconnects with ``?last_seq=N`` receives only the
+events after ``N``; when they are no longer in the log (or the sequence was
+reset) the consumer sends a fresh snapshot instead.
+
+With a Redis channel layer the counter and the log live on
+``DASHBOARD_REPLAY_REDIS_URL`` (by default the first host of
+``CHANNEL_REDIS_HOSTS``; they are not sharded), so every ingest worker shares
+one sequence and every Daphne process can replay it. The in-memory layer only works inside one
+process, so the log is process-local there.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SIZE = int(os.environ.get('DASHBOARD_REPLAY_BUFFER', '5000'))
+SEQ_KEY = 'dashboard:replay:seq'
+LOG_KEY = 'dashboard:replay:log'
+
+# INCR and append in one round trip so the order in the log matches the seq.
+_APPEND_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('ZADD', KEYS[2], seq, seq .. '|' .. ARGV[1])
+redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -(tonumber(ARGV[2]) + 1))
+return seq
+"""
+
+
+class MemoryReplayLog:
+    def __init__(self, size: int = BUFFER_SIZE):
+        self._events: Deque[Tuple[int, Dict[str, Any]]] = deque(maxlen=size)
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def append(self, event: Dict[str, Any]) -> int:
+        with self._lock:
+            self._seq += 1
+            self._events.append((self._seq, event))
+            return self._seq
+
+    def current(self) -> int:
+        return self._seq
+
+    def since(self, last_seq: int) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            if last_seq > self._seq:
+                return None
+            if last_seq == self._seq:
+                return []
+            if not self._events or self._events[0][0] > last_seq + 1:
+                return None
+            return [{**event, 'seq': seq} for seq, event in self._events if seq > last_seq]
+
+
+class RedisReplayLog:
+    def __init__(self, client, size: int = BUFFER_SIZE):
+        self.client = client
+        self.size = size
+        self._append = client.register_script(_APPEND_SCRIPT)
+
+    def append(self, event: Dict[str, Any]) -> int:
+        return int(self._append(keys=[SEQ_KEY, LOG_KEY], args=[json.dumps(event, default=str), self.size]))
+
+    def current(self) -> int:
+        return int(self.client.get(SEQ_KEY) or 0)
+
+    def since(self, last_seq: int) -> Optional[List[Dict[str, Any]]]:
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.get(SEQ_KEY)
+        pipeline.zrange(LOG_KEY, 0, 0, withscores=True)
+        pipeline.zrangebyscore(LOG_KEY, f'({last_seq}', '+inf')
+        current, oldest, members = pipeline.execute()
+        current = int(current or 0)
+        if last_seq > current:
+            return None
+        if last_seq == current:
+            return []
+        if not oldest or int(oldest[0][1]) > last_seq + 1:
+            return None
+        events = []
+        for member in members:
+            seq, _, body = member.decode().partition('|')
+            events.append({**json.loads(body), 'seq': int(seq)})
+        return events
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_log():
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                backend = settings.CHANNEL_LAYERS['default']['BACKEND']
+                if backend.endswith('InMemoryChannelLayer'):
+                    _log = MemoryReplayLog()
+                else:
+                    import redis
+
+                    _log = RedisReplayLog(
+                        redis.Redis.from_url(
+                            settings.DASHBOARD_REPLAY_REDIS_URL,
+                            socket_timeout=float(os.environ.get('DASHBOARD_BROADCAST_TIMEOUT', '1.0')),
+                        )
+                    )
+    return _log
+
+
+def current_seq() -> int:
+    """Latest sequence number, or 0 when the log cannot be reached."""
+
+    try:
+        return get_log().current()
+    except Exception:  # noqa: BLE001 - a page load must not fail on the replay log
+        logger.warning('Replay log unavailable; snapshot sent without a sequence', exc_info=True)
+        return 0
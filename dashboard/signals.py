@@ -2,65 +2,51 @@
 
 from __future__ import annotations
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-from . import models
+from . import alerts, profiling, sources, tracing
+from .models import ProfilingSession
 from .realtime import DashboardEvent, broadcast_event
 
-MODEL_EVENT = {
-    models.SensorReading: 'sensor',
-    models.FinancialMetric: 'finance',
-    models.TrafficUpdate: 'traffic',
-    models.WeatherSnapshot: 'weather',
-}
 
-
-@receiver(post_save, sender=models.SensorReading)
-@receiver(post_save, sender=models.FinancialMetric)
-@receiver(post_save, sender=models.TrafficUpdate)
-@receiver(post_save, sender=models.WeatherSnapshot)
+@profiling.profiled('push_dashboard_update')
 def push_dashboard_update(sender, instance, created, **kwargs):
     if not created:
         return
+    source = sources.for_model(sender)
+    if source is None:
+        return
 
-    event_type = MODEL_EVENT[sender]
+    event_type = source.event_type
+    key = getattr(instance, source.key_field)
     payload = {
         'id': instance.pk,
+        source.key_field: key,
         'payload': instance.payload,
         'timestamp': instance.created_at.isoformat(),
+        **source.extract(instance.payload),
     }
-    if hasattr(instance, 'source') and instance.source:
-        payload['source'] = instance.source
-    if hasattr(instance, 'symbol') and instance.symbol:
-        payload['symbol'] = instance.symbol
-    if hasattr(instance, 'region') and instance.region:
-        payload['region'] = instance.region
-    if hasattr(instance, 'location') and instance.location:
-        payload['location'] = instance.location
 
-    if isinstance(instance.payload, dict):
-        if 'value' in instance.payload:
-            payload['value'] = instance.payload.get('value')
-        if '05. price' in instance.payload:
-            try:
-                payload['price'] = float(instance.payload.get('05. price') or 0)
-            except (TypeError, ValueError):
-                payload['price'] = 0
-        main = instance.payload.get('main', {})
-        if isinstance(main, dict):
-            try:
-                payload['temperature'] = float(main.get('temp') or 0)
-            except (TypeError, ValueError):
-                payload['temperature'] = 0
-            try:
-                payload['humidity'] = float(main.get('humidity') or 0)
-            except (TypeError, ValueError):
-                payload['humidity'] = 0
-        if 'congestion_index' in instance.payload:
-            try:
-                payload['congestion_index'] = float(instance.payload.get('congestion_index') or 0)
-            except (TypeError, ValueError):
-                payload['congestion_index'] = 0
+    trace = tracing.stamp(getattr(instance, '_trace', None), 'saved')
+    if trace is not None:
+        payload[tracing.TRACE_KEY] = trace
 
+    timestamp = instance.created_at.timestamp()
     broadcast_event(DashboardEvent(event_type=event_type, data=payload))
+    if event_type == 'sensor' and payload.get('value') is not None:
+        alerts.check_reading(key, payload['value'], timestamp)
+
+
+@sources.on_register
+def connect_source(source):
+    post_save.connect(
+        push_dashboard_update,
+        sender=source.model,
+        dispatch_uid=f'push_dashboard_update:{source.event_type}',
+    )
+
+
+@receiver((post_save, post_delete), sender=ProfilingSession)
+def announce_profiling_change(sender, **kwargs):
+    profiling.bump()
@@ -0,0 +1,156 @@
+"""Snapshot of the latest readings used to seed the dashboard store.
+
+Shared by the Dash layout (first page load) and the WebSocket consumer, which
+sends it when a reconnecting client is too far behind for the replay log.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+
+from django.db import OperationalError, ProgrammingError
+from django.utils.timezone import is_aware, localtime, make_aware
+
+from . import hotstore, replay, sources
+
+MAX_POINTS = 50
+# Sequence numbers applied ahead of a gap that a store remembers before
+# giving the gap up as lost.
+SEEN_WINDOW = 256
+# django-plotly-dash evaluates the layout function for every request it serves
+# (including callback dispatch), so the DB snapshot is shared for a short while.
+INITIAL_PAYLOAD_TTL = float(os.environ.get('DASH_INITIAL_PAYLOAD_TTL', '5'))
+
+_payload_cache: Dict[str, Any] = {'expires': 0.0, 'state': None}
+
+
+def parse_datetime(value: datetime | str | None) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    return localtime(value).isoformat()
+
+
+def iso_datetime(value: str | None) -> datetime | None:
+    """Parse an ISO date/time; naive values are in the current time zone.
+
+    Raises ``ValueError``, so it also works as an argparse ``type``.
+    """
+
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed if is_aware(parsed) else make_aware(parsed)
+
+
+def _archived(source: sources.Source, limit: int, before: datetime | None) -> List[Dict[str, Any]]:
+    """The newest ``limit`` rows moved to the Parquet archive before ``before``."""
+
+    from . import archive  # pyarrow is only needed once a table runs short
+
+    if not archive.archived_days(source.event_type):
+        return []
+    table = archive.latest(source.event_type, limit, before, columns=['id', 'created_at', 'key', *source.metrics])
+    return [
+        {
+            'id': row['id'],
+            source.key_field: row['key'],
+            'timestamp': parse_datetime(row['created_at']),
+            **{metric: row[metric] for metric in source.metrics},
+        }
+        for row in table.to_pylist()
+    ]
+
+
+def _recent(source: sources.Source):
+    """Latest rows from the DB unless the in-process hot store holds all of them.
+
+    Once rows older than the archive cutoff left the table, a table with fewer
+    than ``MAX_POINTS`` rows is completed from the archive.
+    """
+
+    if hotstore.store.covers(source.event_type, MAX_POINTS):
+        return hotstore.store.recent_rows(source.event_type, MAX_POINTS)
+    readings = source.model.objects.order_by('-created_at').values_list('pk', source.key_field, 'created_at', 'payload')
+    readings = list(readings[:MAX_POINTS])
+    rows = [source.row(pk, key, parse_datetime(created_at), payload) for pk, key, created_at, payload in readings]
+    rows.reverse()
+    if len(rows) < MAX_POINTS:
+        oldest = readings[-1][2] if readings else None
+        rows = _archived(source, MAX_POINTS - len(rows), oldest) + rows
+    return rows
+
+
+def initial_payload() -> Dict[str, Any]:
+    # Read the sequence first: anything broadcast while the queries run is
+    # replayed to the browser instead of being missed.
+    seq = replay.current_seq()
+    state: Dict[str, Any] = default_state()
+    try:
+        for source in sources.all_sources():
+            state[source.event_type] = _recent(source)
+    except (OperationalError, ProgrammingError):  # Database not ready yet.
+        return default_state()
+    state['seq'] = seq
+    return state
+
+
+def default_state() -> Dict[str, Any]:
+    return {name: [] for name in sources.names()}
+
+
+def merge_events(store: Dict[str, Any], events: Iterable[Dict[str, Any]]) -> bool:
+    """Apply broadcast events to a Dash store in place; returns whether it changed.
+
+    Ingest workers number events concurrently, so they can arrive slightly out
+    of order. ``store['seq']`` is the number up to which every event has been
+    applied (what a reconnect asks to replay from) and ``store['seen']`` the
+    numbers already applied past a gap. A gap still open once ``seen`` holds
+    ``SEEN_WINDOW`` numbers is given up as lost. Rows already in the bucket
+    (same ``id``, e.g. from the snapshot) are not added twice.
+    """
+
+    last = store.get('seq') or 0
+    seen = set(store.get('seen') or ())
+    before = (last, len(seen))
+    changed = False
+    for item in events:
+        event_type = item.get('event_type')
+        if not event_type:
+            continue
+        seq = item.get('seq')
+        if seq is not None:
+            if seq <= last or seq in seen:
+                continue
+            seen.add(seq)
+        data = item.get('data', {})
+        bucket = store.setdefault(event_type, [])
+        row_id = data.get('id')
+        if row_id is not None and any(row.get('id') == row_id for row in bucket):
+            continue
+        bucket.append(data)
+        store[event_type] = bucket[-MAX_POINTS:]
+        changed = True
+    while seen:
+        if last + 1 in seen:
+            last += 1
+            seen.discard(last)
+        elif len(seen) > SEEN_WINDOW:
+            last = min(seen) - 1
+        else:
+            break
+    store['seq'] = last
+    store['seen'] = sorted(seen)
+    return changed or (last, len(seen)) != before
+
+
+def cached_initial_payload() -> Dict[str, Any]:
+    now = time.monotonic()
+    if _payload_cache['state'] is None or now >= _payload_cache['expires']:
+        _payload_cache['state'] = initial_payload()
+        _payload_cache['expires'] = now + INITIAL_PAYLOAD_TTL
+    return _payload_cache['state']
@@ -0,0 +1,419 @@
+"""Registry of the data sources shown on the dashboard.
+
+A ``Source`` declares everything the pipeline needs to know about one stream:
+the model it is stored in and its key field, the numeric metrics extracted
+from the JSON payload, which payload fields are worth keeping in the row,
+which MQTT/Kafka topics it receives, how to poll it when it comes from an
+external API (``fetch`` plus the ``poll`` intervals of the adaptive
+scheduler), which payload fields identify a reading (``upstream_id``) and
+how its chart looks. The generic code
+paths (``tasks.persist_event``, ``signals.push_dashboard_update``, the hot
+store, the archive, the startup snapshot and the Dash charts) all read the
+registry, so adding a stream means registering one more ``Source``::
+
+    sources.register(Source(event_type='air', model=AirQuality, key_field='station',
+                            metrics={'pm25': field('pm25')}, topics=('air/*',),
+                            chart=Chart('Air quality', series=(Series('pm25', 'PM2.5'),))))
+
+Registration can happen from any app's ``AppConfig.ready``. Chart styles and
+layouts are plain plotly.js JSON (nested dicts, no ``xaxis_title`` magic
+underscores) so worker processes never import Plotly and ``figures`` can
+build figures without graph objects.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field as dataclass_field
+from fnmatch import fnmatchcase
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+import requests
+
+from . import models, polling
+
+logger = logging.getLogger(__name__)
+
+Extractor = Callable[[Dict[str, Any]], Optional[float]]
+# Payload field a producer can set to give a message its own identity.
+MESSAGE_ID_FIELD = 'message_id'
+# Kept by every projection: message identity and the load generator's probes.
+ALWAYS_KEPT = ((MESSAGE_ID_FIELD,), ('run_id',), ('sent_at',))
+# For sources with ``content_hash``: identical content hashed within one such
+# window is the same message.
+DEDUP_WINDOW_SECONDS = float(os.environ.get('DASHBOARD_DEDUP_WINDOW_SECONDS', '10'))
+Fetcher = Callable[..., Iterator[Tuple[str, Dict[str, Any]]]]
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _lookup(payload: Any, path: Tuple[str, ...]) -> Any:
+    value: Any = payload
+    for name in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(name)
+    return value
+
+
+def field(*path: str) -> Extractor:
+    """Extract a number found at ``path`` inside the payload."""
+
+    def extract(payload: Dict[str, Any]) -> Optional[float]:
+        return _number(_lookup(payload, path))
+
+    return extract
+
+
+@dataclass(frozen=True)
+class Series:
+    metric: str
+    name: str
+    kind: str = 'scatter'  # or 'bar'
+    mode: str = 'lines+markers'
+    style: Mapping[str, Any] = dataclass_field(default_factory=dict)
+    secondary_y: bool = False
+
+
+@dataclass(frozen=True)
+class Overlay:
+    """A series drawn from a derived event bucket (see ``aggregations``)."""
+
+    event_type: str
+    metric: str
+    name: str
+    mode: str = 'lines'
+    style: Mapping[str, Any] = dataclass_field(default_factory=dict)
+    latest_per_key: bool = False
+
+
+@dataclass(frozen=True)
+class Chart:
+    title: str
+    series: Tuple[Series, ...]
+    x: str = 'timestamp'  # or the source key field for categorical charts
+    template: str = 'plotly_dark'
+    layout: Mapping[str, Any] = dataclass_field(default_factory=dict)
+    overlays: Tuple[Overlay, ...] = ()
+
+
+@dataclass(frozen=True)
+class Source:
+    event_type: str
+    model: Any
+    key_field: str
+    metrics: Mapping[str, Extractor] = dataclass_field(default_factory=dict)
+    topics: Tuple[str, ...] = ()
+    fetch: Optional[Fetcher] = None
+    # Adaptive polling of ``fetch`` (see ``polling``): ``interval``, ``min`` and
+    # ``max`` seconds; missing values use ``polling.DEFAULT_POLL``.
+    poll: Optional[Mapping[str, float]] = None
+    chart: Optional[Chart] = None
+    # Payload paths kept in the row; None keeps the whole document.
+    keep: Optional[Tuple[Tuple[str, ...], ...]] = None
+    # Payload paths that identify one upstream reading, usually the time the
+    # API published it: polling the same reading twice stores it once.
+    upstream_id: Tuple[Tuple[str, ...], ...] = ()
+    # Last resort for messages without any identity: identical content within
+    # DEDUP_WINDOW_SECONDS is one message. Off by default, since it also drops
+    # genuinely repeated readings.
+    content_hash: bool = False
+
+    def key_from_topic(self, topic: str) -> str:
+        """``finance/AAPL`` -> ``AAPL`` for prefixed topics, else the topic itself."""
+
+        for pattern in self.topics:
+            prefix = pattern[:-1] if pattern.endswith('/*') else None
+            if prefix and topic.startswith(prefix):
+                return topic[len(prefix):] or topic
+        return topic
+
+    def project(self, payload: Any) -> Any:
+        """The part of ``payload`` stored in the row (see ``keep``)."""
+
+        if self.keep is None or not isinstance(payload, dict):
+            return payload
+        projected: Dict[str, Any] = {}
+        for path in (*self.keep, *ALWAYS_KEPT):
+            value: Any = payload
+            for name in path:
+                if not isinstance(value, dict) or name not in value:
+                    break
+                value = value[name]
+            else:
+                target = projected
+                for name in path[:-1]:
+                    target = target.setdefault(name, {})
+                target[path[-1]] = value
+        return projected
+
+    def extract(self, payload: Any) -> Dict[str, Optional[float]]:
+        data = payload if isinstance(payload, dict) else {}
+        return {name: extract(data) for name, extract in self.metrics.items()}
+
+    def row(self, pk: int, key: str, timestamp: str, payload: Any) -> Dict[str, Any]:
+        """The dict kept in the Dash store for one reading."""
+
+        return {'id': pk, self.key_field: key, 'timestamp': timestamp, **self.extract(payload)}
+
+
+_registry: Dict[str, Source] = {}
+_by_model: Dict[Any, Source] = {}
+_listeners: List[Callable[[Source], None]] = []
+
+
+def register(source: Source) -> Source:
+    _registry[source.event_type] = source
+    _by_model[source.model] = source
+    for listener in _listeners:
+        listener(source)
+    return source
+
+
+def on_register(listener: Callable[[Source], None]) -> Callable[[Source], None]:
+    """Call ``listener`` with every source, registered already or later."""
+
+    _listeners.append(listener)
+    for source in list(_registry.values()):
+        listener(source)
+    return listener
+
+
+def get(event_type: str) -> Optional[Source]:
+    return _registry.get(event_type)
+
+
+def for_model(model_cls) -> Optional[Source]:
+    return _by_model.get(model_cls)
+
+
+def all_sources() -> List[Source]:
+    return list(_registry.values())
+
+
+def names() -> List[str]:
+    return list(_registry)
+
+
+def for_topic(topic: str) -> Optional[Source]:
+    """Source for an MQTT/Kafka topic; specific patterns win over ``*``."""
+
+    fallback = None
+    for source in _registry.values():
+        for pattern in source.topics:
+            if pattern == '*':
+                fallback = fallback or source
+            elif fnmatchcase(topic, pattern):
+                return source
+    return fallback
+
+
+def message_key(
+    source: Source,
+    key: str,
+    payload: Any,
+    message_id: Optional[str] = None,
+    received_at: Optional[float] = None,
+) -> Optional[str]:
+    """Identity of one message, stored in the unique ``message_key`` column.
+
+    The first of: the payload's ``message_id`` set by the producer; the
+    source's ``upstream_id`` fields (e.g. the observation time of a polled
+    API); ``message_id`` from the transport (the Kafka topic, partition and
+    offset, or the MQTT bridge's session and delivery number). Sources with
+    ``content_hash`` then hash the content together with the
+    ``DEDUP_WINDOW_SECONDS`` window of ``received_at``, taken at the edge so
+    Celery retries hash identically. Otherwise the message has no key
+    (NULL) and is always stored.
+    """
+
+    explicit = payload.get(MESSAGE_ID_FIELD) if isinstance(payload, dict) else None
+    upstream = [_lookup(payload, path) for path in source.upstream_id]
+    if explicit is not None:
+        identity = f'{source.event_type}|id|{explicit}'
+    elif any(value is not None for value in upstream):
+        identity = f'{source.event_type}|{key}|upstream|{json.dumps(upstream, default=str)}'
+    elif message_id is not None:
+        identity = f'{source.event_type}|id|{message_id}'
+    elif source.content_hash:
+        window = int((time.time() if received_at is None else received_at) // DEDUP_WINDOW_SECONDS)
+        identity = f'{source.event_type}|{key}|{window}|{json.dumps(payload, sort_keys=True, default=str)}'
+    else:
+        return None
+    return hashlib.blake2b(identity.encode(), digest_size=16).hexdigest()
+
+
+def get_json(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    timeout: int = 10,
+    source: Optional[str] = None,
+    key: str = '',
+) -> Dict[str, Any]:
+    """GET ``url`` and, for a polled ``source``, report the outcome to the scheduler."""
+
+    try:
+        response = requests.get(url, params=params, timeout=timeout)
+        response.raise_for_status()
+    except requests.RequestException as exc:
+        if source:
+            polling.observe_error(source, getattr(exc.response, 'headers', None))
+        raise
+    data = response.json()
+    if source:
+        polling.observe(source, data=data, key=key, headers=response.headers)
+    return data
+
+
+def fetch_weather(location: str = 'Sao Paulo,BR') -> Iterator[Tuple[str, Dict[str, Any]]]:
+    api_key = os.environ.get('OPENWEATHER_API_KEY')
+    if not api_key:
+        logger.warning('OPENWEATHER_API_KEY not configured; skipping weather fetch')
+        return
+
+    params = {'q': location, 'appid': api_key, 'units': 'metric'}
+    try:
+        data = get_json('https://api.openweathermap.org/data/2.5/weather', params, source='weather', key=location)
+    except requests.RequestException as exc:
+        logger.exception('Weather request failed: %s', exc)
+        raise
+    yield location, data
+
+
+def fetch_finance_quotes(symbols: Iterable[str] | None = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    symbols = list(symbols or os.environ.get('FINANCE_SYMBOLS', 'AAPL,MSFT,GOOG').split(','))
+    api_key = os.environ.get('ALPHAVANTAGE_API_KEY')
+    if not api_key:
+        logger.warning('ALPHAVANTAGE_API_KEY not configured; skipping finance fetch')
+        return
+
+    for symbol in symbols:
+        params = {
+            'function': 'GLOBAL_QUOTE',
+            'symbol': symbol.strip(),
+            'apikey': api_key,
+        }
+        try:
+            data = get_json('https://www.alphavantage.co/query', params, source='finance', key=symbol)
+        except requests.RequestException as exc:
+            logger.exception('Finance request failed for %s: %s', symbol, exc)
+            continue
+        if 'Note' in data or 'Information' in data:
+            # Alpha Vantage answers 200 with a note once the quota is spent.
+            logger.warning('Alpha Vantage limit reached: %s', data.get('Note') or data.get('Information'))
+            polling.observe_error('finance')
+            return
+        yield symbol, data.get('Global Quote') or {}
+
+
+def fetch_public_transport_data(city_code: str | None = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    api_token = os.environ.get('TRANSPORT_API_TOKEN')
+    if not api_token:
+        logger.info('TRANSPORT_API_TOKEN not configured; using synthetic traffic data')
+        region = city_code or 'SP-01'
+        polling.observe('traffic', data=0.35, key=region)
+        yield region, {'congestion_index': 0.35, 'updated_at': time.time()}
+        return
+
+    params = {'city': city_code or 'Sao Paulo', 'token': api_token}
+    try:
+        data = get_json('https://api.citybik.es/v2/networks', params, source='traffic', key=city_code or '')
+    except requests.RequestException as exc:
+        logger.exception('Traffic request failed: %s', exc)
+        return
+    yield city_code or 'Sao Paulo', data
+
+
+SENSOR = register(
+    Source(
+        event_type='sensor',
+        model=models.SensorReading,
+        key_field='source',
+        metrics={'value': field('value')},
+        # Anything not claimed by a more specific pattern is a sensor reading.
+        topics=('*',),
+        chart=Chart(
+            title='Sensor Streams',
+            series=(Series('value', 'Value'),),
+            layout={'xaxis': {'title': {'text': 'Time'}}, 'yaxis': {'title': {'text': 'Value'}}},
+            overlays=(Overlay('sensor_stats', 'mean', 'Rolling mean', style={'line': {'dash': 'dot'}}),),
+        ),
+    )
+)
+FINANCE = register(
+    Source(
+        event_type='finance',
+        model=models.FinancialMetric,
+        key_field='symbol',
+        metrics={'price': field('05. price'), 'volume': field('06. volume')},
+        topics=('finance/*',),
+        keep=(('01. symbol',), ('05. price',), ('06. volume',), ('07. latest trading day',), ('10. change percent',)),
+        # GLOBAL_QUOTE only carries the day; the cumulative volume moves with
+        # every trade, so together they version the quote.
+        upstream_id=(('07. latest trading day',), ('06. volume',)),
+        fetch=fetch_finance_quotes,
+        poll={'interval': 20, 'min': 12, 'max': 900},
+        chart=Chart(
+            title='Financial Quotes',
+            series=(Series('price', 'Price', kind='bar', style={'marker': {'color': '#2ca02c'}}),),
+            x='symbol',
+            template='plotly',
+            layout={'yaxis': {'title': {'text': 'Price (USD)'}}},
+            overlays=(
+                Overlay('finance_vwap', 'vwap', 'VWAP', mode='markers', style={'marker': {'symbol': 'diamond'}}, latest_per_key=True),
+            ),
+        ),
+    )
+)
+TRAFFIC = register(
+    Source(
+        event_type='traffic',
+        model=models.TrafficUpdate,
+        key_field='region',
+        metrics={'congestion_index': field('congestion_index')},
+        topics=('traffic/*',),
+        keep=(('congestion_index',), ('updated_at',)),
+        upstream_id=(('updated_at',),),
+        fetch=fetch_public_transport_data,
+        poll={'interval': 15, 'min': 5, 'max': 300},
+        chart=Chart(
+            title='Traffic Congestion',
+            series=(Series('congestion_index', 'Congestion', mode='lines', style={'line': {'color': '#ff7f0e'}}),),
+            layout={'yaxis': {'range': [0, 1]}},
+        ),
+    )
+)
+WEATHER = register(
+    Source(
+        event_type='weather',
+        model=models.WeatherSnapshot,
+        key_field='location',
+        metrics={'temperature': field('main', 'temp'), 'humidity': field('main', 'humidity')},
+        topics=('weather/*',),
+        keep=(('name',), ('dt',), ('main', 'temp'), ('main', 'humidity'), ('main', 'pressure'), ('wind', 'speed')),
+        upstream_id=(('dt',),),
+        fetch=fetch_weather,
+        poll={'interval': 30, 'min': 10, 'max': 600},
+        chart=Chart(
+            title='Weather - Temperature & Humidity',
+            series=(
+                Series('temperature', 'Temperature (°C)', style={'line': {'color': '#1f77b4'}}),
+                Series('humidity', 'Humidity (%)', style={'line': {'color': '#17becf'}}, secondary_y=True),
+            ),
+            template='plotly',
+            layout={
+                'yaxis': {'title': {'text': 'Temperature (°C)'}},
+                'yaxis2': {'title': {'text': 'Humidity (%)'}, 'overlaying': 'y', 'side': 'right'},
+            },
+        ),
+    )
+)
@@ -3,124 +3,325 @@
 from __future__ import annotations
 
 import json
-import os
-from decimal import Decimal
-from typing import Any, Dict, Iterable, Optional
+import time
+from contextlib import nullcontext
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
 
 import requests
 from celery import shared_task
 from celery.utils.log import get_task_logger
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models.signals import post_save
 
-from . import models
+from . import aggregations, metrics, polling, rawdocs, sources, tracing
+from .realtime import broadcast_event
 
 logger = get_task_logger(__name__)
 
+# Options shared by the broker-fed ingest tasks: acknowledge only after the
+# row is written so a crashed worker hands the message to another one.
+INGEST_TASK_OPTIONS = {
+    'bind': True,
+    'acks_late': True,
+    'reject_on_worker_lost': True,
+    'priority': 0,
+}
+FETCH_TASK_OPTIONS = {
+    'bind': True,
+    'autoretry_for': (requests.RequestException,),
+    'retry_backoff': True,
+    'retry_kwargs': {'max_retries': 5},
+}
 
-def persist_event(model_cls, *, payload: Dict[str, Any]) -> None:
-    model_cls.objects.create(**payload)
 
+class Incoming(NamedTuple):
+    """One event to store with ``persist_events``."""
 
-def _get_json(url: str, params: Optional[Dict[str, Any]] = None, timeout: int = 10) -> Dict[str, Any]:
-    response = requests.get(url, params=params, timeout=timeout)
-    response.raise_for_status()
-    return response.json()
+    key: str
+    payload: Any
+    trace: Optional[tracing.Trace] = None
+    message_id: Optional[str] = None
+    received_at: Optional[float] = None
 
 
-@shared_task(bind=True, autoretry_for=(requests.RequestException,), retry_backoff=True, retry_kwargs={'max_retries': 5})
-def fetch_weather(self, location: str = 'Sao Paulo,BR') -> None:
-    api_key = os.environ.get('OPENWEATHER_API_KEY')
-    if not api_key:
-        logger.warning('OPENWEATHER_API_KEY not configured; skipping weather fetch')
-        return
+def _instance(source: sources.Source, event: Incoming):
+    stored = source.project(event.payload)
+    instance = source.model(payload=stored, **{source.key_field: event.key})
+    instance.message_key = sources.message_key(source, event.key, event.payload, event.message_id, event.received_at)
+    if rawdocs.ENABLED and stored is not event.payload:
+        instance.raw_digest = rawdocs.store(event.payload)
+    # Picked up by signals.push_dashboard_update so the trace follows the row.
+    instance._trace = event.trace
+    return instance
 
-    params = {'q': location, 'appid': api_key, 'units': 'metric'}
+
+def _is_duplicate(exc: IntegrityError) -> bool:
+    """True when ``exc`` comes from the unique ``message_key`` constraint."""
+
+    # PostgreSQL and MySQL name the constraint, SQLite the column.
+    message = str(exc)
+    return '_message_key_uniq' in message or '.message_key' in message
+
+
+def _save(source: sources.Source, instance) -> bool:
+    database = router.db_for_write(source.model)
+    # Inside a transaction, a savepoint keeps it usable after a rejected INSERT.
+    # In autocommit the INSERT stands alone, and post_save (the broadcast) must
+    # not run while a transaction holds the write lock.
+    in_transaction = transaction.get_connection(database).in_atomic_block
     try:
-        data = _get_json('https://api.openweathermap.org/data/2.5/weather', params)
-    except requests.RequestException as exc:
-        logger.exception('Weather request failed: %s', exc)
-        raise
+        with transaction.atomic(using=database) if in_transaction else nullcontext():
+            instance.save(force_insert=True)
+    except IntegrityError as exc:
+        if not _is_duplicate(exc):
+            raise
+        # A redelivery: post_save never fires, so nothing is broadcast twice.
+        metrics.DUPLICATES_DROPPED.labels(source=source.event_type).inc()
+        return False
+    return True
 
-    payload = {
-        'location': location,
-        'payload': data,
-    }
-    persist_event(models.WeatherSnapshot, payload=payload)
 
+def _aggregate(source: sources.Source, instances: List[Any]) -> None:
+    """Broadcast the window aggregates of newly stored rows, once per batch."""
 
-@shared_task(bind=True)
-def fetch_finance_quotes(self, symbols: Iterable[str] | None = None) -> None:
-    symbols = list(symbols or os.environ.get('FINANCE_SYMBOLS', 'AAPL,MSFT,GOOG').split(','))
-    api_key = os.environ.get('ALPHAVANTAGE_API_KEY')
-    if not api_key:
-        logger.warning('ALPHAVANTAGE_API_KEY not configured; skipping finance fetch')
-        return
-
-    for symbol in symbols:
-        params = {
-            'function': 'GLOBAL_QUOTE',
-            'symbol': symbol.strip(),
-            'apikey': api_key,
-        }
+    samples = [
+        (
+            {source.key_field: getattr(instance, source.key_field), **source.extract(instance.payload)},
+            instance.created_at.timestamp(),
+        )
+        for instance in instances
+    ]
+    for derived in aggregations.process(source.event_type, samples):
+        broadcast_event(derived)
+
+
+def persist_event(
+    source: sources.Source,
+    key: str,
+    payload: Any,
+    trace: Optional[tracing.Trace] = None,
+    message_id: Optional[str] = None,
+    received_at: Optional[float] = None,
+) -> bool:
+    """Store one event; returns False when its message_key was already stored."""
+
+    instance = _instance(source, Incoming(key, payload, trace, message_id, received_at))
+    with metrics.PERSIST_SECONDS.labels(model=source.model.__name__).time():
+        saved = _save(source, instance)
+    if saved:
+        _aggregate(source, [instance])
+    return saved
+
+
+def persist_events(source: sources.Source, events: Iterable[Incoming]) -> int:
+    """Store several events of one source in a single INSERT; returns how many were new.
+
+    Message keys already stored, or repeated within ``events``, are skipped
+    after one lookup; events without a key are always stored. ``bulk_create`` does not send ``post_save``, so it is
+    sent here for every new row and they are broadcast like single saves,
+    followed by the window aggregates of the whole batch. If another writer
+    stores one of the keys in the meantime, the batch is written row by row
+    instead.
+    """
+
+    events = list(events)
+    model = source.model
+    database = router.db_for_write(model)
+    if not connections[database].features.can_return_rows_from_bulk_insert:
+        return sum(persist_event(source, *event) for event in events)
+
+    instances: Dict[str, Any] = {}
+    unkeyed = []
+    for event in events:
+        instance = _instance(source, event)
+        if instance.message_key is None:
+            unkeyed.append(instance)
+        else:
+            instances.setdefault(instance.message_key, instance)
+    if not instances and not unkeyed:
+        return 0
+    with metrics.PERSIST_SECONDS.labels(model=model.__name__).time():
+        existing = set()
+        if instances:
+            existing = set(
+                model.objects.using(database)
+                .filter(message_key__in=list(instances))
+                .values_list('message_key', flat=True)
+            )
+        new = [instance for message_key, instance in instances.items() if message_key not in existing] + unkeyed
+        if len(events) > len(new):
+            metrics.DUPLICATES_DROPPED.labels(source=source.event_type).inc(len(events) - len(new))
         try:
-            data = _get_json('https://www.alphavantage.co/query', params)
-        except requests.RequestException as exc:
-            logger.exception('Finance request failed for %s: %s', symbol, exc)
-            continue
+            with transaction.atomic(using=database):
+                model.objects.using(database).bulk_create(new)
+        except IntegrityError as exc:
+            if not _is_duplicate(exc):
+                raise
+            new = [instance for instance in new if _save(source, instance)]
+        else:
+            for instance in new:
+                post_save.send(
+                    sender=model, instance=instance, created=True, raw=False, using=database, update_fields=None
+                )
+    _aggregate(source, new)
+    return len(new)
 
-        quote = data.get('Global Quote') or {}
-        payload = {
-            'symbol': symbol,
-            'payload': quote,
-        }
-        persist_event(models.FinancialMetric, payload=payload)
 
+def _fetch(event_type: str, **options: Any) -> int:
+    source = sources.get(event_type)
+    if source is None or source.fetch is None:
+        raise ValueError(f'{event_type!r} is not a polled source')
+    events = []
+    for key, payload in source.fetch(**options):
+        metrics.MESSAGES_INGESTED.labels(source=event_type).inc()
+        events.append(Incoming(key, payload, tracing.start('task_started'), received_at=time.time()))
+    return persist_events(source, events)
+
+
+@shared_task(**FETCH_TASK_OPTIONS)
+def fetch_source(self, event_type: str, **options: Any) -> int:
+    """Poll one registered source and store what it returns."""
+
+    return _fetch(event_type, **options)
+
+
+@shared_task(**FETCH_TASK_OPTIONS)
+def fetch_weather(self, location: str = 'Sao Paulo,BR') -> int:
+    return _fetch('weather', location=location)
+
+
+@shared_task(**FETCH_TASK_OPTIONS)
+def fetch_finance_quotes(self, symbols: Iterable[str] | None = None) -> int:
+    return _fetch('finance', symbols=symbols)
+
+
+@shared_task(**FETCH_TASK_OPTIONS)
+def fetch_public_transport_data(self, city_code: str | None = None) -> int:
+    return _fetch('traffic', city_code=city_code)
+
+
+@shared_task(bind=True, ignore_result=True)
+def schedule_polls(self) -> list:
+    """Enqueue the external-API fetches that the adaptive scheduler says are due."""
 
-@shared_task(bind=True)
-def fetch_public_transport_data(self, city_code: str | None = None) -> None:
-    api_token = os.environ.get('TRANSPORT_API_TOKEN')
-    if not api_token:
-        logger.info('TRANSPORT_API_TOKEN not configured; using synthetic traffic data')
-        fake_payload = {
-            'region': city_code or 'SP-01',
-            'payload': {
-                'congestion_index': Decimal('0.35'),
-                'updated_at': self.request.id,
-            },
-        }
-        persist_event(models.TrafficUpdate, payload=fake_payload)
-        return
-
-    params = {'city': city_code or 'Sao Paulo', 'token': api_token}
     try:
-        data = _get_json('https://api.citybik.es/v2/networks', params)
-    except requests.RequestException as exc:
-        logger.exception('Traffic request failed: %s', exc)
-        return
+        due = polling.get_scheduler().due()
+    except Exception as exc:  # noqa: BLE001 - try again on the next tick
+        logger.warning('Poll scheduler unavailable: %s', exc)
+        return []
+    for event_type in due:
+        fetch_source.delay(event_type)
+        metrics.POLLS_SCHEDULED.labels(source=event_type).inc()
+    return due
 
-    payload = {
-        'region': city_code or 'Sao Paulo',
-        'payload': data,
-    }
-    persist_event(models.TrafficUpdate, payload=payload)
 
+def _route(topic: str, stream: Optional[str] = None) -> Optional[sources.Source]:
+    source = sources.get(stream) if stream else None
+    if source is None:
+        source = sources.for_topic(topic)
+    if source is None:
+        logger.warning('No source registered for topic %s; message dropped', topic)
+    return source
 
-@shared_task(bind=True)
-def ingest_mqtt_message(self, topic: str, message: str) -> None:
+
+def _mqtt_payload(topic: str, message: str) -> Any:
     try:
-        payload = json.loads(message)
+        return json.loads(message)
     except json.JSONDecodeError:
         logger.warning('Invalid JSON from MQTT topic %s: %s', topic, message)
-        payload = {'raw': message}
+        return {'raw': message}
+
+
+def _kafka_payload(message: Any) -> Tuple[Any, Optional[str], Optional[str]]:
+    """``(payload, stream, key)``; producers may name the source instead of relying on the topic."""
+
+    if isinstance(message, dict) and sources.get(message.get('stream') or ''):
+        message = dict(message)
+        return message, message.pop('stream'), message.pop('key', None)
+    return message, None, None
+
+
+@shared_task(**INGEST_TASK_OPTIONS)
+def ingest_mqtt_message(
+    self,
+    topic: str,
+    message: str,
+    trace: Optional[tracing.Trace] = None,
+    received_at: Optional[float] = None,
+    message_id: Optional[str] = None,
+) -> None:
+    trace = tracing.stamp(trace, 'task_started')
+    payload = _mqtt_payload(topic, message)
+    metrics.MESSAGES_INGESTED.labels(source='mqtt').inc()
+    source = _route(topic)
+    if source is not None:
+        key = source.key_from_topic(topic)
+        persist_event(source, key, payload, trace=trace, message_id=message_id, received_at=received_at)
 
-    persist_event(
-        models.SensorReading,
-        payload={'source': topic, 'payload': payload},
-    )
+
+@shared_task(**INGEST_TASK_OPTIONS)
+def ingest_kafka_message(
+    self,
+    topic: str,
+    message: Dict[str, Any],
+    trace: Optional[tracing.Trace] = None,
+    message_id: Optional[str] = None,
+    received_at: Optional[float] = None,
+) -> None:
+    trace = tracing.stamp(trace, 'task_started')
+    metrics.MESSAGES_INGESTED.labels(source='kafka').inc()
+    payload, stream, key = _kafka_payload(message)
+    source = _route(topic, stream)
+    if source is not None:
+        key = key or source.key_from_topic(topic)
+        persist_event(source, key, payload, trace=trace, message_id=message_id, received_at=received_at)
+
+
+@shared_task(**INGEST_TASK_OPTIONS)
+def ingest_batch(self, messages: List[Dict[str, Any]]) -> int:
+    """Store the messages a bridge buffered (see ``integrations.batching``); returns how many were new."""
+
+    events: Dict[str, List[Incoming]] = {}
+    for message in messages:
+        trace = tracing.stamp(message.get('trace'), 'task_started')
+        topic, transport = message['topic'], message['transport']
+        metrics.MESSAGES_INGESTED.labels(source=transport).inc()
+        if transport == 'mqtt':
+            payload, stream, key = _mqtt_payload(topic, message['message']), None, None
+        else:
+            payload, stream, key = _kafka_payload(message['message'])
+        source = _route(topic, stream)
+        if source is None:
+            continue
+        event = Incoming(
+            key or source.key_from_topic(topic),
+            payload,
+            trace,
+            message.get('message_id'),
+            message.get('received_at'),
+        )
+        events.setdefault(source.event_type, []).append(event)
+    return sum(persist_events(sources.get(event_type), batch) for event_type, batch in events.items())
 
 
 @shared_task(bind=True)
-def ingest_kafka_message(self, topic: str, message: Dict[str, Any]) -> None:
-    persist_event(
-        models.SensorReading,
-        payload={'source': topic, 'payload': message},
-    )
+def evaluate_alerts(self) -> int:
+    from . import alerts
+
+    return alerts.drain()
+
+
+@shared_task(bind=True)
+def archive_old_readings(self, older_than_days: int | None = None) -> Dict[str, int]:
+    from django.conf import settings
+    from django.utils import timezone
+
+    from . import archive
+
+    days = older_than_days if older_than_days is not None else settings.DASHBOARD_ARCHIVE_AFTER_DAYS
+    cutoff = timezone.now() - timedelta(days=days)
+    archived = {event_type: archive.archive_model(event_type, cutoff) for event_type in sources.names()}
+    rawdocs.prune(cutoff)
+    logger.info('Archived readings older than %s: %s', cutoff.isoformat(), archived)
+    return archived
@@ -0,0 +1,19 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.test import SimpleTestCase
+
+from .. import admin
+
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        created_at = datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+        cursor = admin.encode_cursor(SimpleNamespace(created_at=created_at, pk=42))
+        self.assertEqual(admin.decode_cursor(cursor), (created_at, 42))
+
+    def test_invalid_cursor(self):
+        for value in ('', 'garbage', '2024-05-01T12:30:15|x', 'not-a-date|3'):
+            with self.subTest(value=value), self.assertRaises(IncorrectLookupParameters):
+                admin.decode_cursor(value)
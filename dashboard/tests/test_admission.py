@@ -0,0 +1,28 @@
+from django.test import SimpleTestCase
+
+from .. import admission
+
+
+class AdmissionTests(SimpleTestCase):
+    def controller(self):
+        depth = admission.QueueDepth('memory://', 'ingest', [0], ':')
+        return admission.Admission({}, [], depth, shed_depth=100, max_depth=200)
+
+    def test_shed_probability_grows_with_depth_and_priority(self):
+        controller = self.controller()
+        self.assertEqual(controller.shed_probability(9, 100), 0.0)
+        self.assertEqual(controller.shed_probability(9, 150), 0.5)
+        self.assertEqual(controller.shed_probability(9, 500), 1.0)
+        self.assertEqual(controller.shed_probability(0, 500), 0.0)
+        self.assertAlmostEqual(controller.shed_probability(3, 200), 3 / 9)
+
+    def test_token_bucket_refills_at_its_rate(self):
+        bucket = admission.TokenBucket(rate=2, burst=2)
+        now = bucket.updated
+        self.assertTrue(bucket.take(now))
+        self.assertTrue(bucket.take(now))
+        self.assertFalse(bucket.take(now))
+        self.assertTrue(bucket.take(now + 0.5))
+        self.assertFalse(bucket.take(now + 0.5))
+        self.assertTrue(bucket.take(now + 10))
+        self.assertAlmostEqual(bucket.tokens, 1.0)
@@ -0,0 +1,110 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .. import aggregations, sources, tasks
+from .test_dedup import MEMORY_LAYER
+
+
+class PartialsTests(SimpleTestCase):
+    def test_samples_are_reduced_per_bucket_in_time_order(self):
+        first, second, third = aggregations.partials([25, 3, 1, 12], [4.0, 2.0, 1.0, 3.0], [1, 1, 3, 1], width=10)
+        self.assertEqual((first.bucket, first.count, first.sum), (0, 2, 3.0))
+        self.assertEqual((first.weighted_sum, first.weight_sum), (5.0, 4.0))
+        self.assertEqual((first.first_time, first.first_value, first.last_time, first.last_value), (1, 1.0, 3, 2.0))
+        self.assertEqual((second.bucket, second.count, second.min, second.max), (1, 1, 3.0, 3.0))
+        self.assertEqual((third.bucket, third.sum, third.weight_sum), (2, 4.0, 1.0))
+
+    def test_no_samples(self):
+        self.assertEqual(aggregations.partials([], []), [])
+
+
+class WindowTests(SimpleTestCase):
+    def slide(self, windows, times, values, weights=None):
+        partials = aggregations.partials(times, values, weights)
+        return windows.slide('test', {'probe': partials})['probe']
+
+    def test_sliding_window_drops_buckets_that_left_it(self):
+        windows = aggregations.MemoryWindows()
+        width = aggregations.BUCKET_SECONDS
+        self.slide(windows, [0.0], [100.0])
+        window = self.slide(windows, [width * aggregations.BUCKETS, width * aggregations.BUCKETS + 1], [1.0, 3.0])
+        self.assertEqual(window.count, 2)
+        self.assertEqual(window.mean(), 2.0)
+        self.assertEqual(window.rate(), 2.0)
+
+    def test_window_spans_batches_and_weights(self):
+        windows = aggregations.MemoryWindows()
+        self.slide(windows, [0.0], [10.0], [1.0])
+        window = self.slide(windows, [1.0], [20.0], [3.0])
+        self.assertEqual(window.count, 2)
+        self.assertEqual(window.weighted_mean(), 17.5)
+        self.assertIsNone(aggregations.Window(1, 1.0, 1.0, 1.0, 0.0, 1.0, 0.0, 1.0).rate())
+
+    def test_tumbling_window_is_reported_once_when_the_next_one_starts(self):
+        windows = aggregations.MemoryWindows()
+
+        def tumble(times, values):
+            return windows.tumble('test', {'probe': aggregations.partials(times, values, width=60)})
+
+        self.assertEqual(tumble([1, 30], [5.0, 7.0]), {})
+        self.assertEqual(tumble([59], [1.0]), {})
+        closed = tumble([61, 130], [2.0, 3.0])['probe']
+        self.assertEqual(
+            [(window.bucket, window.count, window.sum, window.min, window.max) for window in closed],
+            [(0, 3, 13.0, 1.0, 7.0), (1, 1, 2.0, 2.0, 2.0)],
+        )
+        # Late readings for a closed window are dropped.
+        self.assertEqual(tumble([10], [100.0]), {})
+        self.assertEqual(tumble([200], [0.0])['probe'][0].sum, 3.0)
+
+
+class StreamAggregatorTests(SimpleTestCase):
+    def test_one_stats_event_per_key_and_batch(self):
+        aggregator = aggregations.StreamAggregator(aggregations.MemoryWindows())
+        samples = [({'source': 'a', 'value': value}, float(time)) for time, value in enumerate([1, 2, 3])]
+        samples.append(({'source': 'b', 'value': None}, 3.0))
+        derived = aggregator.process('sensor', samples)
+        self.assertEqual(
+            [(event.event_type, event.data['source'], event.data['mean']) for event in derived],
+            [('sensor_stats', 'a', 2.0)],
+        )
+
+    def test_closed_tumbling_window_is_broadcast(self):
+        aggregator = aggregations.StreamAggregator(aggregations.MemoryWindows())
+        width = aggregations.TUMBLING_SECONDS
+        aggregator.process('sensor', [({'source': 'a', 'value': 4}, 1.0), ({'source': 'a', 'value': 2}, 2.0)])
+        derived = aggregator.process('sensor', [({'source': 'a', 'value': 9}, width + 1)])
+        minute = [event.data for event in derived if event.event_type == 'sensor_minute']
+        self.assertEqual(
+            [(data['count'], data['mean'], data['min'], data['max']) for data in minute],
+            [(2, 3.0, 2.0, 4.0)],
+        )
+
+    def test_vwap_skips_missing_quotes(self):
+        aggregator = aggregations.StreamAggregator(aggregations.MemoryWindows())
+        samples = [
+            ({'symbol': 'X', 'price': 10, 'volume': 1}, 1.0),
+            ({'symbol': 'X', 'price': 20, 'volume': 3}, 2.0),
+            ({'symbol': 'X', 'price': 0, 'volume': 100}, 3.0),
+        ]
+        (event,) = aggregator.process('finance', samples)
+        self.assertEqual(event.data['vwap'], 17.5)
+
+    def test_failing_windows_do_not_raise(self):
+        windows = mock.Mock(**{'slide.side_effect': ConnectionError})
+        aggregator = aggregations.StreamAggregator(windows)
+        with self.assertLogs('dashboard.aggregations', 'WARNING'):
+            self.assertEqual(aggregator.process('sensor', [({'source': 'a', 'value': 1}, 1.0)]), [])
+
+
+@override_settings(CHANNEL_LAYERS=MEMORY_LAYER)
+class BatchAggregationTests(TestCase):
+    def test_a_batch_is_aggregated_once_after_it_is_stored(self):
+        events = [tasks.Incoming('probe', {'value': value}) for value in (1, 2, 3)]
+        with mock.patch.object(aggregations, 'process', return_value=[]) as process:
+            self.assertEqual(tasks.persist_events(sources.SENSOR, events), 3)
+        process.assert_called_once()
+        event_type, samples = process.call_args.args
+        self.assertEqual(event_type, 'sensor')
+        self.assertEqual([data['value'] for data, _ in samples], [1.0, 2.0, 3.0])
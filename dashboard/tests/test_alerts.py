@@ -0,0 +1,114 @@
+import json
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from .. import alerts
+
+
+class Unlimited:
+    def take(self):
+        return True
+
+
+class Spent:
+    def take(self):
+        return False
+
+
+def engine(*rules, budget=None):
+    return alerts.AlertEngine(list(rules), budget=budget or Unlimited())
+
+
+class ThresholdTests(SimpleTestCase):
+    def test_fires_once_until_the_condition_clears(self):
+        rule = {'name': 'hot', 'above': 40, 'below': -10, 'cooldown': 0}
+        fired = engine(rule).evaluate(['t'] * 6, [41, 45, 30, 50, 30, -20], [0, 1, 2, 3, 4, 5])
+        self.assertEqual([(alert.value, alert.timestamp) for alert in fired], [(41, 0), (50, 3), (-20, 5)])
+        self.assertEqual(fired[0].detail, {'above': 40, 'below': -10})
+
+    def test_trigger_state_carries_across_batches(self):
+        checker = engine({'above': 40, 'cooldown': 0})
+        self.assertEqual(len(checker.evaluate(['t'], [41], [0])), 1)
+        self.assertEqual(checker.evaluate(['t'], [42], [1]), [])
+        checker.evaluate(['t'], [20], [2])
+        self.assertEqual(len(checker.evaluate(['t'], [43], [3])), 1)
+
+    def test_cooldown_suppresses_refiring(self):
+        checker = engine({'above': 40, 'cooldown': 60})
+        fired = checker.evaluate(['t'] * 4, [41, 20, 41, 20], [0, 10, 20, 30])
+        self.assertEqual([alert.timestamp for alert in fired], [0])
+        self.assertEqual(len(checker.evaluate(['t'], [41], [61])), 1)
+
+    def test_pattern_selects_sources_and_states_are_per_source(self):
+        checker = engine({'pattern': 'sensors/temp*', 'above': 40, 'cooldown': 0})
+        fired = checker.evaluate(['sensors/temp-1', 'sensors/hum-1', 'sensors/temp-2'], [50, 50, 50], [0, 0, 0])
+        self.assertEqual([alert.source for alert in fired], ['sensors/temp-1', 'sensors/temp-2'])
+
+    def test_spent_budget_drops_alerts(self):
+        with mock.patch.object(alerts.metrics.ALERTS_SUPPRESSED, 'inc') as suppressed:
+            fired = engine({'above': 40}, budget=Spent()).evaluate(['t'], [41], [0])
+        self.assertEqual(fired, [])
+        suppressed.assert_called_once_with(1)
+
+
+class StatefulRuleTests(SimpleTestCase):
+    def test_zscore_waits_for_min_samples(self):
+        rule = {'kind': 'zscore', 'threshold': 3.0, 'alpha': 0.1, 'min_samples': 20, 'cooldown': 0}
+        values = [10.0, 11.0] * 10 + [30.0]
+        self.assertEqual(engine(rule).evaluate(['s'] * 5, [10, 11, 10, 11, 100], range(5)), [])
+        fired = engine(rule).evaluate(['s'] * len(values), values, range(len(values)))
+        self.assertEqual(len(fired), 1)
+        self.assertEqual(fired[0].value, 30.0)
+        self.assertGreater(fired[0].detail['zscore'], 3.0)
+
+    def test_ewma_band(self):
+        rule = {'kind': 'ewma', 'band': 5.0, 'alpha': 0.5, 'min_samples': 2, 'cooldown': 0}
+        fired = engine(rule).evaluate(['s'] * 5, [10, 10, 14, 20, 20], range(5))
+        self.assertEqual([alert.value for alert in fired], [20.0])
+        self.assertEqual(fired[0].detail['mean'], 16.0)
+
+    def test_statistics_match_the_recurrence_across_batches(self):
+        alpha = 0.3
+        checker = engine({'kind': 'zscore', 'alpha': alpha})
+        values = np.random.default_rng(7).normal(5, 2, 100)
+        for chunk in np.array_split(values, [1, 40, 41]):
+            checker.evaluate(['s'] * len(chunk), chunk, np.zeros(len(chunk)))
+        mean, var = values[0], 0.0
+        for value in values[1:]:
+            deviation = value - mean
+            mean += alpha * deviation
+            var = (1 - alpha) * (var + alpha * deviation ** 2)
+        state = checker._state('s')
+        self.assertAlmostEqual(state.mean[0], mean)
+        self.assertAlmostEqual(state.var[0], var)
+        self.assertEqual(state.count[0], 100)
+
+
+class DrainTests(SimpleTestCase):
+    def drain(self, refreshed):
+        client = mock.MagicMock()
+        client.set.return_value = True
+        client.pipeline.return_value.execute.return_value = [[json.dumps(['s', 1.0, 0.0])] * alerts.BATCH_SIZE, True]
+        refresh, release = mock.Mock(side_effect=refreshed), mock.Mock()
+        client.register_script.side_effect = [refresh, release]
+        with mock.patch.object(alerts, '_use_redis', return_value=True), \
+                mock.patch('dashboard.polling.get_client', return_value=client), \
+                mock.patch.object(alerts, 'evaluate_batch', return_value=[]), \
+                mock.patch.object(alerts, 'publish'):
+            evaluated = alerts.drain()
+        return evaluated, refresh, release
+
+    def test_lock_is_renewed_before_each_further_batch(self):
+        evaluated, refresh, release = self.drain([1] * alerts.MAX_BATCHES)
+        self.assertEqual(evaluated, alerts.MAX_BATCHES * alerts.BATCH_SIZE)
+        self.assertEqual(refresh.call_count, alerts.MAX_BATCHES - 1)
+        self.assertEqual(refresh.call_args.kwargs['args'][1], alerts.LOCK_SECONDS * 1000)
+        release.assert_called_once()
+
+    def test_stops_once_the_lock_is_lost(self):
+        with self.assertLogs('dashboard.alerts', 'WARNING'):
+            evaluated, refresh, release = self.drain([1, 0])
+        self.assertEqual(evaluated, 2 * alerts.BATCH_SIZE)
+        release.assert_called_once()
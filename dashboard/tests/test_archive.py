@@ -0,0 +1,62 @@
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from django.test import TestCase, override_settings
+
+from .. import archive, snapshot
+from ..models import SensorReading
+from .test_dedup import MEMORY_LAYER
+
+NOW = datetime(2025, 3, 10, 12, tzinfo=timezone.utc)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(DASHBOARD_ARCHIVE_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def reading(self, source, value, days_ago):
+        return SensorReading(source=source, payload={'value': value}, created_at=NOW - timedelta(days=days_ago))
+
+    def archive_old(self):
+        SensorReading.objects.bulk_create(
+            [
+                self.reading('a', 1.0, 3),
+                self.reading('b', 2.0, 3),
+                self.reading('a', 3.0, 2),
+                self.reading('a', 4.0, 0),
+            ]
+        )
+        return archive.archive_model('sensor', NOW - timedelta(days=1))
+
+    def test_round_trip(self):
+        self.assertEqual(self.archive_old(), 3)
+        self.assertEqual(list(SensorReading.objects.values_list('payload', flat=True)), [{'value': 4.0}])
+        table = archive.read_archive('sensor')
+        self.assertEqual(table['value'].to_pylist(), [1.0, 2.0, 3.0])
+        self.assertEqual(table['key'].to_pylist(), ['a', 'b', 'a'])
+        self.assertEqual(table['created_at'][0].as_py(), NOW - timedelta(days=3))
+
+    def test_predicates_and_columns(self):
+        self.archive_old()
+        table = archive.read_archive('sensor', keys=['a'], columns=['value'])
+        self.assertEqual(table.column_names, ['value', 'day'])
+        self.assertEqual(table['value'].to_pylist(), [1.0, 3.0])
+        table = archive.read_archive('sensor', start=NOW - timedelta(days=2, hours=1), end=NOW)
+        self.assertEqual(table['value'].to_pylist(), [3.0])
+        self.assertEqual(archive.read_archive('sensor', keys=['missing']).num_rows, 0)
+
+    def test_latest_reads_newest_days_first(self):
+        self.archive_old()
+        self.assertEqual(archive.latest('sensor', 2, columns=['value'])['value'].to_pylist(), [2.0, 3.0])
+        self.assertEqual(archive.latest('sensor', 5, before=NOW - timedelta(days=2))['value'].to_pylist(), [1.0, 2.0])
+
+    @override_settings(CHANNEL_LAYERS=MEMORY_LAYER)
+    def test_snapshot_completes_history_from_the_archive(self):
+        self.archive_old()
+        rows = snapshot.initial_payload()['sensor']
+        self.assertEqual([row['value'] for row in rows], [1.0, 2.0, 3.0, 4.0])
+        self.assertEqual([row['source'] for row in rows], ['a', 'b', 'a', 'a'])
@@ -0,0 +1,89 @@
+from dataclasses import replace
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .. import sources, tasks
+from ..integrations.mqtt import Deliveries
+from ..models import SensorReading, WeatherSnapshot
+
+MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+class MessageKeyTests(SimpleTestCase):
+    def test_message_without_identity_has_no_key(self):
+        self.assertIsNone(sources.message_key(sources.SENSOR, 'probe', {'value': 1}, received_at=0))
+
+    def test_transport_id_ignores_content_and_time(self):
+        first = sources.message_key(sources.SENSOR, 'probe', {'value': 1}, message_id='a', received_at=0)
+        other = sources.message_key(sources.SENSOR, 'other', {'value': 2}, message_id='a', received_at=3600)
+        self.assertEqual(first, other)
+
+    def test_payload_message_id_wins_over_transport(self):
+        payload = {'value': 1, sources.MESSAGE_ID_FIELD: 'm-1'}
+        self.assertEqual(
+            sources.message_key(sources.SENSOR, 'probe', payload, message_id='a'),
+            sources.message_key(sources.SENSOR, 'probe', payload, message_id='b'),
+        )
+
+    def test_polled_reading_is_keyed_on_upstream_time(self):
+        first = sources.message_key(sources.WEATHER, 'SP', {'dt': 100, 'main': {'temp': 20}}, received_at=0)
+        again = sources.message_key(sources.WEATHER, 'SP', {'dt': 100, 'main': {'temp': 20}}, received_at=3600)
+        later = sources.message_key(sources.WEATHER, 'SP', {'dt': 160, 'main': {'temp': 20}}, received_at=3600)
+        self.assertEqual(first, again)
+        self.assertNotEqual(first, later)
+
+    def test_content_hash_is_opt_in_and_windowed(self):
+        source = replace(sources.SENSOR, content_hash=True)
+        window = sources.DEDUP_WINDOW_SECONDS
+        first = sources.message_key(source, 'probe', {'value': 1}, received_at=window * 10)
+        self.assertEqual(first, sources.message_key(source, 'probe', {'value': 1}, received_at=window * 10.5))
+        self.assertNotEqual(first, sources.message_key(source, 'probe', {'value': 1}, received_at=window * 11))
+
+
+class DeliveriesTests(SimpleTestCase):
+    def message(self, mid, qos=1, dup=False):
+        return SimpleNamespace(mid=mid, qos=qos, dup=dup)
+
+    def test_redelivery_reuses_the_first_identity(self):
+        deliveries = Deliveries('session')
+        first = deliveries.identify(self.message(7))
+        self.assertEqual(deliveries.identify(self.message(7, dup=True)), first)
+
+    def test_reused_packet_id_is_a_new_message(self):
+        deliveries = Deliveries('session')
+        first = deliveries.identify(self.message(7))
+        self.assertNotEqual(deliveries.identify(self.message(7)), first)
+        self.assertNotEqual(deliveries.identify(self.message(0, qos=0)), deliveries.identify(self.message(0, qos=0)))
+
+    def test_sessions_do_not_collide(self):
+        self.assertNotEqual(Deliveries().identify(self.message(1)), Deliveries().identify(self.message(1)))
+
+
+@override_settings(CHANNEL_LAYERS=MEMORY_LAYER)
+class PersistEventTests(TestCase):
+    def test_identical_readings_are_all_stored(self):
+        self.assertTrue(tasks.persist_event(sources.SENSOR, 'probe', {'value': 1}, received_at=100.0))
+        self.assertTrue(tasks.persist_event(sources.SENSOR, 'probe', {'value': 1}, received_at=100.0))
+        self.assertEqual(SensorReading.objects.filter(source='probe').count(), 2)
+
+    def test_redelivery_is_dropped(self):
+        self.assertTrue(tasks.persist_event(sources.SENSOR, 'probe', {'value': 1}, message_id='t:0:5'))
+        self.assertFalse(tasks.persist_event(sources.SENSOR, 'probe', {'value': 1}, message_id='t:0:5'))
+        self.assertEqual(SensorReading.objects.filter(source='probe').count(), 1)
+
+    def test_batch_keeps_unkeyed_events_and_drops_repeated_keys(self):
+        events = [
+            tasks.Incoming('probe', {'value': 1}),
+            tasks.Incoming('probe', {'value': 1}),
+            tasks.Incoming('probe', {'value': 2}, message_id='t:0:1'),
+            tasks.Incoming('probe', {'value': 2}, message_id='t:0:1'),
+        ]
+        self.assertEqual(tasks.persist_events(sources.SENSOR, events), 3)
+        self.assertEqual(tasks.persist_events(sources.SENSOR, events[2:]), 0)
+
+    def test_polling_the_same_upstream_reading_stores_it_once(self):
+        payload = {'dt': 100, 'main': {'temp': 20}}
+        self.assertEqual(tasks.persist_events(sources.WEATHER, [tasks.Incoming('SP', payload)]), 1)
+        self.assertEqual(tasks.persist_events(sources.WEATHER, [tasks.Incoming('SP', payload)]), 0)
+        self.assertEqual(WeatherSnapshot.objects.count(), 1)
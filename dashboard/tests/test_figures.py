@@ -0,0 +1,93 @@
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from .. import figures, sources
+
+LOCAL_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'figures': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'figures-tests'},
+}
+
+
+def weather_store(count=3):
+    return {
+        'weather': [
+            {'id': index, 'location': 'SP', 'timestamp': f'2025-03-10T00:0{index}:00', 'temperature': 20 + index,
+             'humidity': 50}
+            for index in range(count)
+        ]
+    }
+
+
+class BuildFigureTests(SimpleTestCase):
+    def test_traces_follow_the_chart_spec(self):
+        figure = figures.build_figure(sources.WEATHER, weather_store(), with_template=False)
+        temperature, humidity = figure['data']
+        self.assertEqual(temperature['x'], ['2025-03-10T00:00:00', '2025-03-10T00:01:00', '2025-03-10T00:02:00'])
+        self.assertEqual(temperature['y'], [20, 21, 22])
+        self.assertEqual((temperature['mode'], temperature['line']), ('lines+markers', {'color': '#1f77b4'}))
+        self.assertEqual(humidity['yaxis'], 'y2')
+        self.assertEqual(figure['layout']['yaxis2']['side'], 'right')
+        self.assertNotIn('template', figure['layout'])
+
+    def test_categorical_chart_with_latest_overlay_per_key(self):
+        store = {
+            'finance': [{'id': 1, 'symbol': 'AAPL', 'price': 10}, {'id': 2, 'symbol': 'MSFT', 'price': 20}],
+            'finance_vwap': [{'symbol': 'AAPL', 'vwap': 9}, {'symbol': 'AAPL', 'vwap': 11}],
+        }
+        bars, vwap = figures.build_figure(sources.FINANCE, store, with_template=False)['data']
+        self.assertEqual((bars['type'], bars['x'], bars['y']), ('bar', ['AAPL', 'MSFT'], [10, 20]))
+        self.assertNotIn('mode', bars)
+        self.assertEqual((vwap['x'], vwap['y']), (['AAPL'], [11]))
+
+    def test_empty_bucket_has_no_traces(self):
+        figure = figures.build_figure(sources.TRAFFIC, {}, with_template=False)
+        self.assertEqual(figure, {'data': [], 'layout': {'title': {'text': 'Traffic Congestion'}}})
+
+    def test_plotly_accepts_the_dict(self):
+        import plotly.graph_objects as go
+
+        go.Figure(figures.build_figure(sources.WEATHER, weather_store()))
+
+
+class DataVersionTests(SimpleTestCase):
+    def test_changes_with_new_rows_and_overlays(self):
+        store = weather_store()
+        version = figures.data_version(sources.WEATHER, store)
+        self.assertEqual(version, figures.data_version(sources.WEATHER, weather_store()))
+        self.assertNotEqual(version, figures.data_version(sources.WEATHER, weather_store(4)))
+        sensor = {'sensor': [{'id': 1, 'value': 1}]}
+        before = figures.data_version(sources.SENSOR, sensor)
+        sensor['sensor_stats'] = [{'timestamp': 't', 'mean': 1}]
+        self.assertNotEqual(before, figures.data_version(sources.SENSOR, sensor))
+
+    def test_rows_without_ids_use_the_content(self):
+        first = figures.data_version(sources.TRAFFIC, {'traffic': [{'congestion_index': 0.1}]})
+        second = figures.data_version(sources.TRAFFIC, {'traffic': [{'congestion_index': 0.2}]})
+        self.assertNotEqual(first, second)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class CachedFigureTests(SimpleTestCase):
+    def setUp(self):
+        figures.local.clear()
+        caches[figures.CACHE_ALIAS].clear()
+        self.addCleanup(figures.local.clear)
+
+    def test_sessions_share_one_figure_per_version(self):
+        first = figures.cached_figure(sources.WEATHER, weather_store())
+        self.assertIs(figures.cached_figure(sources.WEATHER, weather_store()), first)
+        self.assertIsNot(figures.cached_figure(sources.WEATHER, weather_store(4)), first)
+        self.assertIn('template', first['layout'])
+
+    def test_shared_cache_stores_figures_without_the_template(self):
+        store = weather_store()
+        built = figures.cached_figure(sources.WEATHER, store)
+        key = f'dashboard:figure:weather:{figures.data_version(sources.WEATHER, store)}'
+        shared = caches[figures.CACHE_ALIAS].get(key)
+        self.assertNotIn('template', shared['layout'])
+        figures.local.clear()
+        self.assertEqual(figures.cached_figure(sources.WEATHER, store)['data'], built['data'])
+
+    def test_missing_store_renders_an_empty_figure(self):
+        self.assertEqual(figures.cached_figure(sources.SENSOR, None)['data'], [])
@@ -0,0 +1,62 @@
+import time
+from datetime import datetime
+from unittest import mock
+
+from django.test import SimpleTestCase
+from django.utils.timezone import localtime
+
+from .. import hotstore
+
+
+class HotStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.store = hotstore.HotStore()
+
+    def record(self, key, timestamp, row_id, value):
+        self.store.record('sensor', key, timestamp, row_id, {'value': value})
+
+    def test_covers_only_after_start(self):
+        now = time.time()
+        self.record('a', now, 1, 1.0)
+        self.assertFalse(self.store.covers('sensor', 1))
+        self.store.start()
+        self.record('a', time.time() + 1, 2, 2.0)
+        self.assertTrue(self.store.covers('sensor', 1))
+        self.assertFalse(self.store.covers('sensor', 2))
+
+    def test_invalidate_drops_coverage_of_earlier_rows(self):
+        with mock.patch('dashboard.hotstore.time') as clock:
+            clock.time.return_value = 1000.0
+            self.store.start()
+            self.record('a', 1001.0, 1, 1.0)
+            self.assertTrue(self.store.covers('sensor', 1))
+            clock.time.return_value = 1002.0
+            self.store.invalidate()
+            self.assertFalse(self.store.covers('sensor', 1))
+            self.record('a', 1003.0, 2, 2.0)
+            self.assertTrue(self.store.covers('sensor', 1))
+            self.assertFalse(self.store.covers('sensor', 2))
+
+    def test_eviction_drops_coverage_of_older_rows(self):
+        store = self.store = hotstore.HotStore(max_rows=hotstore.INITIAL_CAPACITY)
+        store.start()
+        now = time.time()
+        self.record('a', now + 1, 1, 1.0)
+        self.assertTrue(store.covers('sensor', 1))
+        self.record('b', now + 2, 2, 2.0)
+        self.assertEqual(store.keys('sensor'), ['b'])
+        self.assertTrue(store.covers('sensor', 1))
+        self.assertFalse(store.covers('sensor', 2))
+
+    def test_recent_rows_are_the_latest_in_time_order(self):
+        now = time.time()
+        self.record('a', now - 3, 1, 1.0)
+        self.record('b', now - 1, 3, float('nan'))
+        self.record('a', now - 2, 2, 2.0)
+        rows = self.store.recent_rows('sensor', 2)
+        self.assertEqual([row['id'] for row in rows], [2, 3])
+        self.assertEqual([row['source'] for row in rows], ['a', 'b'])
+        self.assertIsNone(rows[1]['value'])
+        timestamp = datetime.fromisoformat(rows[0]['timestamp'])
+        self.assertAlmostEqual(timestamp.timestamp(), now - 2, places=5)
+        self.assertEqual(timestamp.utcoffset(), localtime(timestamp).utcoffset())
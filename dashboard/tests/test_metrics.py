@@ -0,0 +1,27 @@
+from django.test import TestCase, override_settings
+
+
+@override_settings(DASHBOARD_METRICS_ALLOWED_IPS=['127.0.0.1'], DASHBOARD_METRICS_TOKEN='secret')
+class MetricsAccessTests(TestCase):
+    def test_allowlisted_address_is_served(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    def test_forged_forwarded_for_is_rejected(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.5', HTTP_X_FORWARDED_FOR='127.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(DASHBOARD_TRUSTED_PROXIES=['10.0.0.1'])
+    def test_forwarded_for_is_read_through_trusted_proxies_only(self):
+        forged = self.client.get('/metrics', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='127.0.0.1, 203.0.113.5')
+        self.assertEqual(forged.status_code, 403)
+        proxied = self.client.get('/metrics', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='127.0.0.1')
+        self.assertEqual(proxied.status_code, 200)
+
+    @override_settings(ASGI_PROXY_HEADERS=True)
+    def test_allowlist_is_ignored_with_proxy_headers(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    def test_bearer_token(self):
+        remote = {'REMOTE_ADDR': '203.0.113.5'}
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret', **remote).status_code, 200)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong', **remote).status_code, 403)
@@ -0,0 +1,133 @@
+from fnmatch import fnmatchcase
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from .. import polling
+
+
+class HashClient:
+    """The handful of Redis commands the scheduler uses, in memory."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.strings = {}
+
+    def hgetall(self, key):
+        return {field: str(value) for field, value in self.hashes.get(key, {}).items()}
+
+    def hget(self, key, field):
+        return self.hgetall(key).get(field)
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    def hincrby(self, key, field, amount):
+        fields = self.hashes.setdefault(key, {})
+        fields[field] = int(fields.get(field, 0)) + amount
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.strings:
+            return False
+        self.strings[key] = value
+        return True
+
+    def scan_iter(self, pattern, count=None):
+        return [key for key in self.strings if fnmatchcase(key, pattern)]
+
+    def mget(self, keys):
+        return [self.strings.get(key) for key in keys]
+
+
+class SchedulerTests(SimpleTestCase):
+    def setUp(self):
+        self.client = HashClient()
+        self.client.set('dashboard:viewers:web:1', 2)
+        self.scheduler = polling.AdaptiveScheduler(
+            {'api': {'interval': 30, 'min': 10, 'max': 600}}, client=self.client, idle_factor=8
+        )
+
+    def release(self):
+        self.client.strings.pop('dashboard:poll:api:claim', None)
+
+    def test_due_claims_once_per_interval(self):
+        self.assertEqual(self.scheduler.due(now=1000), ['api'])
+        self.release()
+        self.assertEqual(self.scheduler.due(now=1010), [])
+        self.assertEqual(self.scheduler.due(now=1031), ['api'])
+
+    def test_overlapping_ticks_do_not_claim_twice(self):
+        self.assertEqual(self.scheduler.due(now=1000), ['api'])
+        self.client.hset('dashboard:poll:api', {'last_run': 0})
+        self.assertEqual(self.scheduler.due(now=1000), [])
+
+    def test_interval_follows_the_change_rate_within_bounds(self):
+        self.scheduler.due(now=0)
+        for step in range(1, 8):
+            self.scheduler.observe('api', data={'value': step})
+            self.release()
+            self.scheduler.due(now=step * 1000)
+        self.assertEqual(self.scheduler.state('api')['interval'], 10)
+        for step in range(8, 30):
+            self.scheduler.observe('api', data={'value': 7})
+            self.release()
+            self.scheduler.due(now=step * 10000)
+        self.assertEqual(self.scheduler.state('api')['interval'], 600)
+
+    def test_delay_backs_off_on_errors_and_without_viewers(self):
+        state = self.scheduler.state('api')
+        self.assertEqual(self.scheduler.delay('api', state, viewers=1), 30)
+        self.assertEqual(self.scheduler.delay('api', state, viewers=0), 240)
+        self.scheduler.observe_error('api')
+        self.scheduler.observe_error('api')
+        self.assertEqual(self.scheduler.delay('api', self.scheduler.state('api'), viewers=1), 120)
+        self.assertEqual(self.scheduler.viewers(), 2)
+
+    def test_spent_quota_blocks_until_reset(self):
+        with mock.patch.object(polling.time, 'time', return_value=1000):
+            self.scheduler.observe('api', headers={'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '500'})
+        self.assertEqual(self.scheduler.due(now=1499), [])
+        self.assertEqual(self.scheduler.due(now=1500), ['api'])
+
+
+class RateLimitTests(SimpleTestCase):
+    def test_retry_after_seconds_and_dates(self):
+        self.assertEqual(polling.rate_limit({'Retry-After': '30'}, 100), {'blocked_until': 130})
+        hints = polling.rate_limit({'Retry-After': 'Thu, 01 Jan 1970 00:01:40 GMT'}, 40)
+        self.assertEqual(hints, {'blocked_until': 100})
+
+    def test_remaining_quota_spaces_requests(self):
+        hints = polling.rate_limit({'X-RateLimit-Remaining': '10', 'X-RateLimit-Reset': '60'}, 1000)
+        self.assertEqual(hints, {'spacing': 6})
+
+
+class PollSourcesTests(SimpleTestCase):
+    @override_settings(DASHBOARD_POLL_SOURCES={'finance': {'max': 300}})
+    def test_registered_intervals_with_overrides(self):
+        configured = polling.poll_sources()
+        self.assertEqual(set(configured), {'finance', 'traffic', 'weather'})
+        self.assertEqual(configured['finance'], {'interval': 20, 'min': 12, 'max': 300})
+        self.assertEqual(configured['traffic'], {'interval': 15, 'min': 5, 'max': 300})
+
+
+class ViewerCounterTests(SimpleTestCase):
+    def test_publishes_on_change_and_waits_after_a_failure(self):
+        counter = polling.ViewerCounter()
+        counter.change(1)
+        self.assertTrue(counter.due(0))
+        client = mock.Mock()
+        client.set.side_effect = ConnectionError('redis down')
+        with mock.patch.object(polling, 'get_client', return_value=client), \
+                mock.patch.object(polling.time, 'monotonic', return_value=100), \
+                self.assertLogs('dashboard.polling', 'WARNING'):
+            counter.publish()
+        self.assertFalse(counter.due(100 + polling.VIEWER_RETRY - 1))
+        self.assertTrue(counter.due(100 + polling.VIEWER_RETRY))
+        client.set.side_effect = None
+        with mock.patch.object(polling, 'get_client', return_value=client):
+            counter.publish()
+        self.assertEqual(client.set.call_args.args[1], 1)
+        self.assertFalse(counter.due(counter.published + 1))
+        counter.change(-5)
+        self.assertEqual(counter.count, 0)
+        self.assertTrue(counter.due(counter.published + 1))
@@ -0,0 +1,50 @@
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from .. import profiling
+from ..models import ProfilingSession, SensorReading
+from .test_dedup import MEMORY_LAYER
+
+
+@profiling.profiled('bench')
+def work():
+    return sum(range(100))
+
+
+@mock.patch('dashboard.profiling.bump')
+class ProfilingSessionTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings = override_settings(DASHBOARD_PROFILE_DIR=str(self.directory))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(profiling._apply, [])
+
+    def test_session_profiles_its_target_and_writes_on_stop(self, bump):
+        ProfilingSession.objects.create(target='bench', mode='cprofile', pid=os.getpid())
+        profiling._apply(profiling._load_sessions())
+        self.assertEqual(work(), 4950)
+        collector = profiling.collector_for('bench')
+        self.assertEqual(collector.calls, 1)
+        self.assertIsNone(profiling.collector_for('other'))
+
+        profiling._apply([])
+        self.assertIsNone(profiling.collector_for('bench'))
+        self.assertEqual([path.suffix for path in self.directory.iterdir()], ['.prof'])
+
+    def test_sessions_for_other_processes_are_ignored(self, bump):
+        ProfilingSession.objects.create(target='bench', pid=os.getpid() + 1)
+        ProfilingSession.objects.create(target='bench', hostname='elsewhere.invalid')
+        self.assertEqual(profiling._load_sessions(), [])
+        self.assertEqual(bump.call_count, 2)
+
+    @override_settings(CHANNEL_LAYERS=MEMORY_LAYER)
+    def test_saving_a_reading_does_not_start_the_refresher(self, bump):
+        SensorReading.objects.create(source='probe', payload={'value': 1})
+        self.assertFalse(profiling._refresher_started)
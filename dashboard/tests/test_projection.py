@@ -0,0 +1,61 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .. import rawdocs, sources, tasks
+from ..models import RawDocument, WeatherSnapshot
+from .test_dedup import MEMORY_LAYER
+
+DOCUMENT = {
+    'name': 'Sao Paulo',
+    'dt': 100,
+    'main': {'temp': 21.5, 'humidity': 60, 'feels_like': 22},
+    'weather': [{'description': 'clear sky'}],
+    'run_id': 'load-1',
+}
+
+
+class ProjectionTests(SimpleTestCase):
+    def test_keeps_declared_paths_and_message_identity(self):
+        self.assertEqual(
+            sources.WEATHER.project(DOCUMENT),
+            {'name': 'Sao Paulo', 'dt': 100, 'main': {'temp': 21.5, 'humidity': 60}, 'run_id': 'load-1'},
+        )
+
+    def test_missing_paths_are_skipped(self):
+        self.assertEqual(sources.WEATHER.project({'main': 'n/a', 'wind': {}}), {})
+
+    def test_sources_without_keep_store_everything(self):
+        self.assertIs(sources.SENSOR.project(DOCUMENT), DOCUMENT)
+        self.assertEqual(sources.WEATHER.project(['not', 'a', 'dict']), ['not', 'a', 'dict'])
+
+    def test_projected_payload_keeps_the_metrics(self):
+        self.assertEqual(sources.WEATHER.extract(sources.WEATHER.project(DOCUMENT)), sources.WEATHER.extract(DOCUMENT))
+
+
+@override_settings(CHANNEL_LAYERS=MEMORY_LAYER)
+class RawDocumentTests(TestCase):
+    def test_round_trip_and_one_copy_per_content(self):
+        key = rawdocs.store(DOCUMENT)
+        self.assertEqual(rawdocs.store(dict(reversed(DOCUMENT.items()))), key)
+        self.assertEqual(RawDocument.objects.count(), 1)
+        self.assertEqual(rawdocs.load(key), DOCUMENT)
+        self.assertIsNone(rawdocs.load(None))
+        self.assertIsNone(rawdocs.load('missing'))
+
+    def test_persist_links_the_row_to_its_raw_document(self):
+        with mock.patch.object(rawdocs, 'ENABLED', True):
+            tasks.persist_event(sources.WEATHER, 'SP', DOCUMENT)
+        row = WeatherSnapshot.objects.get()
+        self.assertNotIn('weather', row.payload)
+        self.assertEqual(rawdocs.load(row.raw_digest), DOCUMENT)
+
+    def test_prune_keeps_referenced_documents(self):
+        kept = rawdocs.store(DOCUMENT)
+        rawdocs.store({'orphan': True})
+        WeatherSnapshot.objects.create(location='SP', payload={}, raw_digest=kept)
+        RawDocument.objects.update(created_at=timezone.now() - timedelta(days=30))
+        self.assertEqual(rawdocs.prune(timezone.now() - timedelta(days=1)), 1)
+        self.assertEqual(list(RawDocument.objects.values_list('digest', flat=True)), [kept])
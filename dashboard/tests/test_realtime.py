@@ -0,0 +1,83 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+from prometheus_client import REGISTRY
+
+from .. import realtime, replay
+
+
+class FlakyLayer:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+
+    async def group_send(self, group, message):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('channel layer down')
+        self.sent.append(message)
+
+
+def _count(name):
+    return REGISTRY.get_sample_value(name, {'event_type': 'probe'}) or 0.0
+
+
+class BroadcasterTests(SimpleTestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(replay, '_log', replay.MemoryReplayLog()),
+            mock.patch.object(realtime.time, 'sleep'),
+            mock.patch.object(realtime.ResilientBroadcaster, '_ensure_flusher'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.broadcaster = realtime.ResilientBroadcaster(buffer_size=3)
+
+    def send(self, layer, row_id):
+        message = realtime.DashboardEvent('probe', {'id': row_id}).to_message()
+        self.broadcaster.send('probe', layer, message)
+        return message
+
+    def test_failed_event_is_buffered_and_replayed_in_order_with_its_seq(self):
+        layer = FlakyLayer(failures=2)
+        failures, retries = _count('dashboard_broadcast_failures_total'), _count('dashboard_broadcast_retries_total')
+        first = self.send(layer, 1)
+        self.send(layer, 2)
+        self.assertEqual(len(self.broadcaster.buffer), 2)
+        self.assertEqual(first['data']['seq'], 1)
+
+        with mock.patch.object(realtime, 'get_channel_layer', return_value=layer):
+            with self.assertLogs('dashboard.realtime', 'WARNING'):
+                self.assertEqual(self.broadcaster.flush(), 2)
+        self.assertEqual([message['data']['data']['id'] for message in layer.sent], [1, 2])
+        self.assertEqual([message['data']['seq'] for message in layer.sent], [1, 2])
+        self.assertEqual(replay.get_log().current(), 2)
+        self.assertEqual(_count('dashboard_broadcast_failures_total') - failures, 2)
+        self.assertEqual(_count('dashboard_broadcast_retries_total') - retries, 1)
+
+    def test_breaker_opens_after_repeated_failures(self):
+        layer = FlakyLayer(failures=realtime.BREAKER_THRESHOLD)
+        with self.assertLogs('dashboard.realtime', 'WARNING'):
+            for row_id in range(realtime.BREAKER_THRESHOLD):
+                self.assertEqual(self.broadcaster.open_until, 0.0)
+                self.send(layer, row_id)
+                self.broadcaster.buffer.clear()
+        self.assertGreater(self.broadcaster.open_until, realtime.time.monotonic())
+
+        # While open, events are buffered without touching the layer...
+        self.send(layer, 9)
+        self.assertEqual((layer.sent, len(self.broadcaster.buffer)), ([], 1))
+        # ...and the flusher closes it again once a send succeeds.
+        with mock.patch.object(realtime, 'get_channel_layer', return_value=layer):
+            self.assertEqual(self.broadcaster.flush(), 1)
+        self.assertEqual((self.broadcaster.failures, self.broadcaster.open_until), (0, 0.0))
+
+    def test_full_buffer_drops_the_oldest_but_not_the_one_in_flight(self):
+        messages = [self.send(None, row_id) for row_id in range(3)]
+        self.broadcaster._in_flight = messages[0]
+        self.send(None, 3)
+        self.assertEqual([message['data']['data']['id'] for _, message in self.broadcaster.buffer], [0, 2, 3])
+        self.broadcaster._in_flight = None
+        self.send(None, 4)
+        self.assertEqual([message['data']['data']['id'] for _, message in self.broadcaster.buffer], [2, 3, 4])
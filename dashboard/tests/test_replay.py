@@ -0,0 +1,52 @@
+import json
+
+from dash.exceptions import PreventUpdate
+from django.test import SimpleTestCase
+
+from .. import snapshot
+from ..dash_apps.real_time import on_websocket_message
+
+
+def _event(seq, row_id, event_type='sensor'):
+    return {'event_type': event_type, 'seq': seq, 'data': {'id': row_id, 'source': 'probe', 'value': row_id}}
+
+
+class WebsocketMessageTests(SimpleTestCase):
+    def receive(self, store, event):
+        return on_websocket_message({'data': json.dumps(event)}, store)
+
+    def test_snapshot_replaces_the_store(self):
+        state = {'sensor': [], 'seq': 7}
+        self.assertEqual(self.receive({'seq': 3}, {'type': 'snapshot', 'data': state}), state)
+
+    def test_in_order_events_advance_seq(self):
+        store = self.receive({'seq': 0}, _event(1, 10))
+        store = self.receive(store, _event(2, 11))
+        self.assertEqual(store['seq'], 2)
+        self.assertEqual(store['seen'], [])
+        self.assertEqual([row['id'] for row in store['sensor']], [10, 11])
+
+    def test_out_of_order_event_is_kept_and_gap_closes(self):
+        store = self.receive({'seq': 1}, _event(3, 12))
+        self.assertEqual((store['seq'], store['seen']), (1, [3]))
+        store = self.receive(store, _event(2, 11))
+        self.assertEqual((store['seq'], store['seen']), (3, []))
+        self.assertEqual([row['id'] for row in store['sensor']], [12, 11])
+
+    def test_already_applied_seq_is_ignored(self):
+        store = self.receive({'seq': 0}, _event(1, 10))
+        with self.assertRaises(PreventUpdate):
+            self.receive(store, _event(1, 10))
+
+    def test_replay_skips_rows_already_in_the_snapshot(self):
+        store = {'seq': 4, 'sensor': [{'id': 10}]}
+        store = self.receive(store, {'type': 'replay', 'events': [_event(5, 10), _event(6, 11)]})
+        self.assertEqual(store['seq'], 6)
+        self.assertEqual([row['id'] for row in store['sensor']], [10, 11])
+
+    def test_gap_is_given_up_once_the_window_is_full(self):
+        store = {'seq': 0}
+        events = [_event(seq, seq) for seq in range(2, snapshot.SEEN_WINDOW + 3)]
+        store = self.receive(store, {'type': 'replay', 'events': events})
+        self.assertEqual(store['seq'], snapshot.SEEN_WINDOW + 2)
+        self.assertEqual(store['seen'], [])
@@ -0,0 +1,67 @@
+from dataclasses import replace
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .. import sources, tasks
+from ..models import FinancialMetric, WeatherSnapshot
+from .test_dedup import MEMORY_LAYER
+
+
+class RegistryTests(SimpleTestCase):
+    def test_specific_topic_patterns_win_over_the_catch_all(self):
+        self.assertIs(sources.for_topic('finance/AAPL'), sources.FINANCE)
+        self.assertIs(sources.for_topic('weather/SP'), sources.WEATHER)
+        self.assertIs(sources.for_topic('factory/line-1'), sources.SENSOR)
+
+    def test_key_from_topic_strips_the_pattern_prefix(self):
+        self.assertEqual(sources.FINANCE.key_from_topic('finance/AAPL'), 'AAPL')
+        self.assertEqual(sources.FINANCE.key_from_topic('finance/'), 'finance/')
+        self.assertEqual(sources.SENSOR.key_from_topic('factory/line-1'), 'factory/line-1')
+
+    def test_lookups_by_event_type_and_model(self):
+        self.assertIs(sources.get('traffic'), sources.TRAFFIC)
+        self.assertIs(sources.for_model(FinancialMetric), sources.FINANCE)
+        self.assertEqual(sources.names()[:4], ['sensor', 'finance', 'traffic', 'weather'])
+
+    def test_on_register_sees_existing_and_later_sources(self):
+        seen = []
+        extra = replace(sources.SENSOR, event_type='probe', model=object())
+        with mock.patch.object(sources, '_listeners', []), \
+                mock.patch.dict(sources._registry), mock.patch.dict(sources._by_model):
+            sources.on_register(lambda source: seen.append(source.event_type))
+            sources.register(extra)
+        self.assertEqual(seen, ['sensor', 'finance', 'traffic', 'weather', 'probe'])
+        self.assertIsNone(sources.get('probe'))
+
+    def test_row_extracts_the_declared_metrics(self):
+        row = sources.WEATHER.row(3, 'SP', '2025-03-10T00:00:00', {'main': {'temp': '21.5', 'humidity': None}})
+        self.assertEqual(
+            row, {'id': 3, 'location': 'SP', 'timestamp': '2025-03-10T00:00:00', 'temperature': 21.5, 'humidity': None}
+        )
+
+
+class RoutingTests(SimpleTestCase):
+    def test_kafka_producers_can_name_the_stream(self):
+        payload, stream, key = tasks._kafka_payload({'stream': 'finance', 'key': 'AAPL', '05. price': 1})
+        self.assertEqual((payload, stream, key), ({'05. price': 1}, 'finance', 'AAPL'))
+        self.assertIs(tasks._route('anything', stream), sources.FINANCE)
+        self.assertIs(tasks._route('finance/AAPL'), sources.FINANCE)
+
+    def test_unknown_stream_falls_back_to_the_topic(self):
+        message = {'stream': 'nope', 'value': 1}
+        self.assertEqual(tasks._kafka_payload(message), (message, None, None))
+
+
+@override_settings(CHANNEL_LAYERS=MEMORY_LAYER)
+class FetchTests(TestCase):
+    def test_fetch_goes_through_the_registered_source(self):
+        def fetch(location):
+            yield location, {'dt': 100, 'name': location, 'main': {'temp': 20}}
+            yield location, {'dt': 100, 'name': location, 'main': {'temp': 20}}
+
+        with mock.patch.dict(sources._registry, {'weather': replace(sources.WEATHER, fetch=fetch)}):
+            self.assertEqual(tasks.fetch_source.run('weather', location='SP'), 1)
+            with self.assertRaises(ValueError):
+                tasks.fetch_source.run('sensor')
+        self.assertEqual(list(WeatherSnapshot.objects.values_list('location', flat=True)), ['SP'])
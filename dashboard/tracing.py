@@ -0,0 +1,145 @@
+"""Optional per-event tracing across the ingest pipeline hops.
+
+When ``DASHBOARD_TRACING=1`` every event carries a small ``{stage: epoch}``
+dictionary that is stamped by the MQTT/Kafka bridges, the Celery task, the
+post_save signal, ``broadcast_event`` and finally ``DashboardConsumer``.
+
+Each hop is observed once per event: ``broadcast_event`` records the
+producer-side stages (up to ``broadcast``) and, in every web process, a
+single consumer records the ``delivered`` hop, however many viewers the
+event fans out to. That consumer also appends the full trace of a sampled
+subset of events to a local JSONL file; the file is written by a background
+thread so the event loop never blocks on disk.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+TRACE_KEY = '_trace'
+STAGES = ('received', 'task_started', 'saved', 'broadcast', 'delivered')
+
+ENABLED = os.environ.get('DASHBOARD_TRACING', '0') == '1'
+SAMPLE_RATE = float(os.environ.get('DASHBOARD_TRACE_SAMPLE_RATE', '0.01'))
+TRACE_FILE = os.environ.get('DASHBOARD_TRACE_FILE', 'logs/traces.jsonl')
+
+Trace = Dict[str, float]
+
+WRITE_QUEUE_SIZE = 1000
+
+_records: Optional[queue.Queue] = None
+_writer_lock = threading.Lock()
+
+
+def start(stage: str = 'received') -> Optional[Trace]:
+    """Open a trace at ``stage`` or return ``None`` when tracing is off."""
+
+    if not ENABLED:
+        return None
+    return {stage: time.time()}
+
+
+def stamp(trace: Optional[Trace], stage: str) -> Optional[Trace]:
+    if trace is not None:
+        trace[stage] = time.time()
+    return trace
+
+
+def stage_latencies(trace: Trace) -> Dict[str, float]:
+    """Return the time spent reaching each stage from the previous one."""
+
+    latencies: Dict[str, float] = {}
+    previous: Optional[float] = None
+    for stage in STAGES:
+        stamped = trace.get(stage)
+        if stamped is None:
+            continue
+        if previous is not None:
+            latencies[stage] = max(stamped - previous, 0.0)
+        previous = stamped
+    return latencies
+
+
+def strip(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy a ``DashboardEvent`` message without the trace sent to browsers."""
+
+    data = {key: value for key, value in message.get('data', {}).items() if key != TRACE_KEY}
+    return {**message, 'data': data}
+
+
+def record(trace: Optional[Trace], event_type: str) -> None:
+    """Observe the producer-side stages of ``trace`` (everything before delivery)."""
+
+    if trace is None:
+        return
+    for stage, seconds in stage_latencies(trace).items():
+        metrics.STAGE_LATENCY_SECONDS.labels(stage=stage).observe(seconds)
+
+
+def delivered(trace: Trace, event_type: str) -> None:
+    """Observe the ``delivered`` hop and sample the full trace to the file."""
+
+    trace = stamp(dict(trace), 'delivered')
+    latencies = stage_latencies(trace)
+    if 'delivered' in latencies:
+        metrics.STAGE_LATENCY_SECONDS.labels(stage='delivered').observe(latencies['delivered'])
+    if SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE:
+        _dump({'event_type': event_type, 'stages': trace, 'latencies': latencies})
+
+
+def _dump(record: Dict[str, Any]) -> None:
+    try:
+        _writer().put_nowait(record)
+    except queue.Full:
+        pass  # the disk is behind; samples are optional
+
+
+def _writer() -> queue.Queue:
+    global _records
+    if _records is None:
+        with _writer_lock:
+            if _records is None:
+                records: queue.Queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+                threading.Thread(target=_write_forever, args=(records,), name='trace-writer', daemon=True).start()
+                _records = records
+    return _records
+
+
+def _write_forever(records: queue.Queue) -> None:  # pragma: no cover - background thread
+    while True:
+        lines = [json.dumps(records.get())]
+        while True:
+            try:
+                lines.append(json.dumps(records.get_nowait()))
+            except queue.Empty:
+                break
+        try:
+            directory = os.path.dirname(TRACE_FILE)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(TRACE_FILE, 'a', encoding='utf-8') as handle:
+                handle.write('\n'.join(lines) + '\n')
+        except OSError as exc:
+            logger.warning('Unable to write trace sample to %s: %s', TRACE_FILE, exc)
+
+
+def _after_fork() -> None:
+    # The writer thread does not survive fork.
+    global _records, _writer_lock
+
+    _records = None
+    _writer_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
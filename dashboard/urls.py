@@ -6,4 +6,5 @@ app_name = 'dashboard'
 
 urlpatterns = [
     path('', views.DashboardView.as_view(), name='home'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
@@ -1,5 +1,75 @@
+import hmac
+import ipaddress
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
 from django.views.generic import TemplateView
 
+from . import metrics
+
 
 class DashboardView(TemplateView):
     template_name = 'dashboard/dashboard.html'
+
+
+@lru_cache(maxsize=8)
+def _networks(values):
+    return tuple(ipaddress.ip_network(value, strict=False) for value in values)
+
+
+def _address(value):
+    try:
+        return ipaddress.ip_address(value.strip())
+    except ValueError:
+        return None
+
+
+def _in(address, values) -> bool:
+    return address is not None and any(address in network for network in _networks(tuple(values)))
+
+
+def client_address(request):
+    """The client address, following X-Forwarded-For only through trusted proxies.
+
+    The header is read right to left, the entries each trusted proxy appended,
+    and the first address that is not a trusted proxy is the client. Without a
+    trusted peer the header is ignored: any client can send one.
+    """
+
+    address = _address(request.META.get('REMOTE_ADDR', ''))
+    if not _in(address, settings.DASHBOARD_TRUSTED_PROXIES):
+        return address
+    for value in reversed(request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')):
+        address = _address(value)
+        if not _in(address, settings.DASHBOARD_TRUSTED_PROXIES):
+            return address
+    return address
+
+
+def _token_allowed(request) -> bool:
+    token = settings.DASHBOARD_METRICS_TOKEN
+    scheme, _, value = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(value.strip(), token)
+
+
+def metrics_allowed(request) -> bool:
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    if _token_allowed(request):
+        return True
+    # With ASGI_PROXY_HEADERS Daphne already replaced REMOTE_ADDR with the
+    # first X-Forwarded-For entry, which the client controls when the proxy
+    # appends to the header: the allowlist cannot be trusted then.
+    if settings.ASGI_PROXY_HEADERS:
+        return False
+    return _in(client_address(request), settings.DASHBOARD_METRICS_ALLOWED_IPS)
+
+
+@require_GET
+def metrics_view(request):
+    if not metrics_allowed(request):
+        return HttpResponseForbidden('Metrics are restricted to DASHBOARD_METRICS_ALLOWED_IPS, DASHBOARD_METRICS_TOKEN and staff users.')
+    content, content_type = metrics.render_latest()
+    return HttpResponse(content, content_type=content_type)
@@ -53,22 +53,43 @@ if [[ "${CHANNEL_LAYER_BACKEND}" != "memory" ]] && [[ "${SKIP_REDIS_LAUNCH:-0}"
     echo "[run_dashboard] Launching redis-server..."
     redis-server --save "" --appendonly no &
     pids+=($!)
+    # Extra local instances (ports 6380, 6381, ...) shard the channel layer.
+    if [[ "${REDIS_SHARDS:-1}" -gt 1 ]] && [[ -z "${CHANNEL_REDIS_HOSTS:-}" ]]; then
+        CHANNEL_REDIS_HOSTS="127.0.0.1:6379"
+        for ((shard = 1; shard < REDIS_SHARDS; shard++)); do
+            redis-server --port "$((6379 + shard))" --save "" --appendonly no &
+            pids+=($!)
+            CHANNEL_REDIS_HOSTS="${CHANNEL_REDIS_HOSTS},127.0.0.1:$((6379 + shard))"
+        done
+        export CHANNEL_REDIS_HOSTS
+    fi
     sleep 1
 fi
 
-echo "[run_dashboard] Starting Celery worker..."
-celery -A DjangoProject worker --loglevel=info &
+echo "[run_dashboard] Starting Celery ingest worker..."
+DASHBOARD_HEADLESS=1 celery -A DjangoProject worker --loglevel=info -n ingest@%h -Q ingest \
+    -P prefork -c "${INGEST_CONCURRENCY:-4}" --prefetch-multiplier "${INGEST_PREFETCH:-4}" &
+pids+=($!)
+
+echo "[run_dashboard] Starting Celery fetch worker..."
+DASHBOARD_HEADLESS=1 celery -A DjangoProject worker --loglevel=info -n fetch@%h -Q fetch,celery \
+    -P threads -c "${FETCH_CONCURRENCY:-8}" --prefetch-multiplier 1 &
 pids+=($!)
 
 echo "[run_dashboard] Starting Celery beat..."
-celery -A DjangoProject beat --loglevel=info &
+DASHBOARD_HEADLESS=1 celery -A DjangoProject beat --loglevel=info &
 pids+=($!)
 
 if [[ "${ENABLE_STREAM_BRIDGES:-0}" == "1" ]]; then
     echo "[run_dashboard] Starting stream bridges..."
-    "${PYTHON_BIN}" manage.py start_stream_bridges &
+    DASHBOARD_HEADLESS=1 "${PYTHON_BIN}" manage.py start_stream_bridges &
     pids+=($!)
 fi
 
-echo "[run_dashboard] Running Django development server (Ctrl+C to stop)..."
-"${PYTHON_BIN}" manage.py runserver 0.0.0.0:8000
+if [[ "${ASGI_WORKERS:-0}" -gt 0 ]]; then
+    echo "[run_dashboard] Running ${ASGI_WORKERS} Daphne workers on :8000 (Ctrl+C to stop)..."
+    "${PYTHON_BIN}" manage.py serve_asgi --workers "${ASGI_WORKERS}" --port 8000
+else
+    echo "[run_dashboard] Running Django development server (Ctrl+C to stop)..."
+    "${PYTHON_BIN}" manage.py runserver 0.0.0.0:8000
+fi